@@ -247,11 +247,68 @@ DEFAULT_FROM_EMAIL = "noreply@aum.com"
 # absorbed into neighbours.  Higher = fewer, longer blocks (cleaner for
 # radio shows).  Lower = finer granularity.  Recommended range: 10-30.
 SEGMENT_MIN_DURATION = 15.0
+# CNN precision: "float32" (reference), "int8" (quantized) or "float16".
+# Reduced precision needs the ONNX snapshot (SEGMENTER_SNAPSHOT_PATH) and
+# cuts CPU per stream at some boundary accuracy -- measure it first with
+# python radios/analysis/tune.py labels.json --precision int8 float16
+SEGMENT_MODEL_PRECISION = "float32"
+# Files longer than this (seconds) are segmented in chunks with bounded
+# memory instead of being decoded whole.  0 = always decode whole.
+SEGMENT_STREAMING_THRESHOLD = 3600
+# Cache each recording's CNN labels, energy and spectral flux in a sidecar
+# file (<recording>.seg.npz, keyed by file hash + model version), so
+# re-segmenting only re-runs consolidation and boundary refinement.
+SEGMENT_CACHE = True
+# Keep the cache files in this directory instead of next to the recordings.
+SEGMENT_CACHE_DIR = None
+# segment_recordings worker processes (one CNN each); 1 = single process.
+SEGMENT_WORKERS = 1
+# segment_recordings recordings per shared CNN call (segment_audio_batch); 1 = one at a time.
+SEGMENT_BATCH_SIZE = 1
+
+# ONNX snapshot of the segmentation CNN (python manage.py export_segmenter_model).
+# When present and onnxruntime is installed, segmentation never imports TensorFlow.
+SEGMENTER_SNAPSHOT_PATH = BASE_DIR / "models" / "ina_smn.onnx"
 
 # Legacy webrtcvad settings (only used if rolling back to segmenter_webrtcvad.py)
 SILENCE_THRESHOLD_DB = -40      # dB — below this = silence (vs music)
 VAD_AGGRESSIVENESS = 2          # webrtcvad 0 (permissive) to 3 (strict)
 
+# Real-time pipeline (record_and_segment): all streams share one CNN.
+# Pending 10 s windows are classified together as one batch, dispatched
+# when MAX_BATCH windows are waiting or the oldest has waited MAX_LATENCY s.
+STREAM_INFERENCE_MAX_BATCH = 32
+STREAM_INFERENCE_MAX_LATENCY = 1.0
+# Lock-free PCM ring buffer (opt-in): the ffmpeg reader thread never waits
+# on classifier/encoder reads.  Check the buffer's overrun counters before
+# and after enabling it.
+STREAM_PCM_BUFFER_LOCK_FREE = False
+# Sliding-context classification (opt-in): seconds of already classified
+# audio prepended to each window so the CNN sees both sides of edge
+# boundaries.  0 = each window classified in isolation.
+STREAM_CLASSIFY_CONTEXT = 0.0
+# Boundary refinement (opt-in): snap each finalized stream boundary to the
+# nearby spectral-flux peak (flux tracked incrementally as audio arrives).
+STREAM_REFINE_BOUNDARIES = False
+# Finalized segments are encoded/saved by a shared thread pool; segments of
+# one recording stay in order. None = half the CPU cores.
+STREAM_ENCODER_WORKERS = None
+STREAM_ENCODER_QUEUE_SIZE = 64
+# PCM ingestion: "threads" (reader + classifier thread per stream) or
+# "selector" (one shared selector/dispatch loop for all streams).
+STREAM_INGEST_MODE = "threads"
+# record_and_segment worker processes (streams sharded by id); 1 = single process.
+STREAM_SHARDS = 1
+# Seconds shard workers get on shutdown (stop streams, drain queued MP3
+# encodes) before the supervisor SIGKILLs them.
+STREAM_SHARD_STOP_TIMEOUT = 300
+
+# Audio codec service (radios.analysis.audio_codec): "auto" uses in-process
+# PyAV when installed, else one ffmpeg subprocess per operation.
+AUDIO_CODEC_BACKEND = "auto"
+# Concurrent codec operations per process. None = CPU cores.
+AUDIO_CODEC_MAX_CONCURRENCY = None
+
 # Transcription backend: "local" (faster-whisper), "openai" (OpenAI Whisper API), or "anthropic" (Claude audio)
 TRANSCRIPTION_BACKEND = "local"
 WHISPER_MODEL_SIZE = "medium"   # tiny | base | small | medium | large-v3
@@ -280,4 +337,22 @@ TRANSCRIPTION_LLM_MODEL = "claude-sonnet-4-20250514"
 ANALYZE_POLL_INTERVAL = 30   # seconds between daemon polling cycles
 
 
-FINGERPRINT_SLEEP_SECONDS = 1
\ No newline at end of file
+# Shazam fingerprinting: concurrent segments per fingerprint_recordings
+# daemon, and the request rate shared by all fingerprinting processes
+FINGERPRINT_CONCURRENCY = 8
+FINGERPRINT_RATE_LIMIT = 1.0         # requests/s, host-wide (halved on each 429)
+FINGERPRINT_RATE_BURST = 3
+FINGERPRINT_RATE_STATE_FILE = None   # token bucket state; None = <tmpdir>/aum_fingerprint_rate.json
+
+# Local landmark-hash index of identified songs, checked before Shazam
+FINGERPRINT_INDEX = True
+FINGERPRINT_INDEX_PATH = BASE_DIR / "models" / "fingerprint_index.npz"
+
+# Send Shazam signatures computed locally instead of uploading audio, and
+# cache them per (segment, window) for retries; None = no cache
+FINGERPRINT_SIGNATURES = True
+FINGERPRINT_SIGNATURE_CACHE_DIR = BASE_DIR / "models" / "signatures"
+
+# Predict song changes inside music segments (spectral novelty) and send
+# one window per predicted track instead of walking in fixed steps
+FINGERPRINT_TRACK_BOUNDARIES = True
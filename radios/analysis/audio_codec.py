@@ -0,0 +1,551 @@
+"""
+Shared audio codec service: MP3 encode, PCM decode, probe, cut, slice.
+
+Every ffmpeg-shaped operation in the analysis pipeline goes through here
+instead of spawning its own process:
+
+    stream_processor   StreamSegmentEncoder  → encode_mp3()
+    segmenter          _load_pcm / _get_duration / _save_segment
+                                             → decode_pcm() / probe_duration() / cut()
+                       _save_segments_to_disk → split()
+    transcriber        _extract_audio_slice  → extract_slice()
+    fingerprinter      _SegmentAudio         → decode_pcm()
+
+Backends
+--------
+pyav    In-process libav bindings (PyAV >= 9).  No fork/exec and no codec
+        start-up per call — the main saving on a node encoding and cutting
+        segments all day.  Used when the ``av`` package is importable.
+ffmpeg  One ffmpeg/ffprobe subprocess per call (the previous behaviour).
+        Always available as the fallback.
+
+An ffmpeg process is one filter graph: independent encodes cannot be
+multiplexed through a long-lived ffmpeg worker and split apart again, so
+the "persistent" backend is the in-process one.
+
+Pooling and health
+------------------
+- At most CODEC_MAX_CONCURRENCY operations run at once (a semaphore shared
+  by all threads); callers beyond that wait for a slot.
+- A failing in-process call is retried once on ffmpeg.  After
+  CODEC_MAX_FAILURES consecutive failures the in-process backend is taken
+  out of service; after CODEC_RESTART_INTERVAL seconds a health check
+  (encode + decode a short tone) decides whether it comes back.
+
+Django settings
+---------------
+AUDIO_CODEC_BACKEND          "auto" (default), "pyav" or "ffmpeg"
+AUDIO_CODEC_MAX_CONCURRENCY  concurrent codec operations (default None: CPU cores)
+"""
+
+import bisect
+import glob
+import io
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+import wave
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("broadcast_analysis")
+
+SAMPLE_RATE = 16000               # analysis sample rate (mono int16)
+MP3_BITRATE = "64k"               # stream segment MP3 bitrate
+CODEC_MAX_CONCURRENCY = os.cpu_count() or 2
+CODEC_MAX_FAILURES = 3            # consecutive in-process failures before disabling
+CODEC_RESTART_INTERVAL = 60.0     # seconds before a disabled backend is re-checked
+
+
+def _bitrate_bps(bitrate: str) -> int:
+    """'64k' → 64000."""
+    bitrate = bitrate.strip().lower()
+    if bitrate.endswith("k"):
+        return int(float(bitrate[:-1]) * 1000)
+    return int(bitrate)
+
+
+def _wav_bytes(pcm_int16: np.ndarray, sample_rate: int) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.ascontiguousarray(pcm_int16, dtype=np.int16).tobytes())
+    return buf.getvalue()
+
+
+# -----------------------------------------------------------------------
+# Backends — methods raise on failure; AudioCodec turns that into None/False
+# -----------------------------------------------------------------------
+
+class _FFmpegBackend:
+    """One ffmpeg / ffprobe subprocess per operation."""
+
+    name = "ffmpeg"
+
+    def encode_mp3(self, pcm_int16: np.ndarray, sample_rate: int, bitrate: str) -> bytes:
+        # Byte view of the samples: no tobytes() copy of the whole segment
+        pcm_bytes = memoryview(np.ascontiguousarray(pcm_int16, dtype=np.int16)).cast("B")
+        cmd = [
+            "ffmpeg",
+            "-y", "-hide_banner", "-loglevel", "warning",
+            "-f", "s16le", "-ar", str(sample_rate), "-ac", "1",
+            "-i", "pipe:0",
+            "-c:a", "libmp3lame", "-b:a", bitrate,
+            "-f", "mp3", "pipe:1",
+        ]
+        result = subprocess.run(cmd, input=pcm_bytes, capture_output=True, timeout=60)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg MP3 encode failed: {result.stderr[:500]!r}")
+        return result.stdout
+
+    def decode_pcm(self, path: str, sample_rate: int,
+                   start: Optional[float], end: Optional[float]) -> np.ndarray:
+        cmd = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "warning"]
+        if start:
+            cmd += ["-ss", str(start)]
+        if end is not None:
+            cmd += ["-t", str(end - (start or 0.0))]
+        cmd += [
+            "-i", path,
+            "-ar", str(sample_rate), "-ac", "1", "-f", "s16le",
+            "pipe:1",
+        ]
+        result = subprocess.run(cmd, check=True, capture_output=True, timeout=120)
+        return np.frombuffer(result.stdout, dtype=np.int16)
+
+    def probe_duration(self, path: str) -> float:
+        cmd = [
+            "ffprobe", "-v", "quiet", "-print_format", "json",
+            "-show_format", path,
+        ]
+        r = subprocess.run(cmd, capture_output=True, text=True, timeout=30, check=True)
+        return float(json.loads(r.stdout)["format"]["duration"])
+
+    def cut(self, src_path: str, start: float, end: float, out_path: str) -> None:
+        cmd = [
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", "warning",
+            "-ss", str(start),
+            "-to", str(end),
+            "-i", src_path,
+            "-c", "copy",
+            out_path,
+        ]
+        subprocess.run(cmd, check=True, capture_output=True, timeout=120)
+
+    def split(self, src_path: str, cut_times: list, out_dir: str, ext: str) -> list:
+        prefix = os.path.join(out_dir, f".split_{os.getpid()}_{threading.get_ident()}_")
+        cmd = [
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", "warning",
+            "-i", src_path,
+            "-f", "segment",
+            "-segment_times", ",".join(f"{t:.3f}" for t in cut_times),
+            "-reset_timestamps", "1",
+            "-c", "copy",
+            f"{prefix}%04d{ext}",
+        ]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True, timeout=300)
+        except Exception:
+            for path in glob.glob(f"{glob.escape(prefix)}*"):
+                os.unlink(path)
+            raise
+        # Piece k is <prefix><k><ext>, numbered in cut order by the segment
+        # muxer; intervals it wrote no file for stay None
+        pieces = [None] * (len(cut_times) + 1)
+        for path in glob.glob(f"{glob.escape(prefix)}*{ext}"):
+            number = path[len(prefix):len(path) - len(ext)]
+            k = int(number) if number.isdigit() else -1
+            if 0 <= k < len(pieces):
+                pieces[k] = path
+            else:
+                os.unlink(path)
+        return pieces
+
+    def extract_slice(self, src_path: str, start: float, end: float,
+                      out_path: str, fmt: str) -> None:
+        duration = end - start
+        codec_args = ["-ar", str(SAMPLE_RATE), "-ac", "1"]
+        if fmt == "wav":
+            codec_args += ["-f", "wav"]
+        else:
+            codec_args += ["-codec:a", "libmp3lame", "-q:a", "4"]
+
+        cmd = [
+            "ffmpeg", "-y",
+            "-ss", str(start),
+            "-i", src_path,
+            "-t", str(duration),
+            "-avoid_negative_ts", "make_zero"
+        ] + codec_args + [out_path]
+
+        timeout = min(600, duration * 2 + 30)
+        proc = subprocess.run(cmd, capture_output=True, timeout=timeout)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.decode(errors="replace")[-500:])
+
+
+class _PyAVBackend:
+    """In-process encode/decode via PyAV (libav*), no subprocesses."""
+
+    name = "pyav"
+
+    def __init__(self):
+        import av  # noqa: F401 — fail fast if PyAV is missing
+        self._av = av
+
+    def encode_mp3(self, pcm_int16: np.ndarray, sample_rate: int, bitrate: str) -> bytes:
+        av = self._av
+        buf = io.BytesIO()
+        with av.open(buf, mode="w", format="mp3") as out:
+            stream = out.add_stream("libmp3lame", rate=sample_rate, layout="mono")
+            stream.bit_rate = _bitrate_bps(bitrate)
+            frame = av.AudioFrame.from_ndarray(
+                np.ascontiguousarray(pcm_int16, dtype=np.int16).reshape(1, -1),
+                format="s16", layout="mono",
+            )
+            frame.sample_rate = sample_rate
+            for packet in stream.encode(frame):
+                out.mux(packet)
+            for packet in stream.encode(None):
+                out.mux(packet)
+        return buf.getvalue()
+
+    def decode_pcm(self, path: str, sample_rate: int,
+                   start: Optional[float], end: Optional[float]) -> np.ndarray:
+        av = self._av
+        chunks = []
+        first_time = None
+        with av.open(path) as container:
+            stream = container.streams.audio[0]
+            if start:
+                container.seek(int(start * av.time_base))  # nearest earlier keyframe
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+            for frame in container.decode(stream):
+                t = float(frame.pts * frame.time_base) if frame.pts is not None else None
+                if end is not None and t is not None and t >= end:
+                    break
+                if first_time is None:
+                    first_time = t or 0.0
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+            for out in resampler.resample(None):
+                chunks.append(out.to_ndarray().reshape(-1))
+
+        pcm = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+        # Trim the keyframe pre-roll and anything past *end*
+        offset = start or 0.0
+        if first_time is not None and offset > first_time:
+            pcm = pcm[int(round((offset - first_time) * sample_rate)):]
+        if end is not None:
+            pcm = pcm[:int(round((end - offset) * sample_rate))]
+        return pcm
+
+    def probe_duration(self, path: str) -> float:
+        av = self._av
+        with av.open(path) as container:
+            if container.duration is None:
+                raise ValueError("container reports no duration")
+            return container.duration / av.time_base
+
+    def cut(self, src_path: str, start: float, end: float, out_path: str) -> None:
+        av = self._av
+        with av.open(src_path) as inp, self._open_copy(out_path) as out:
+            istream = inp.streams.audio[0]
+            add_template = getattr(out, "add_stream_from_template", None)
+            ostream = (
+                add_template(istream) if add_template else out.add_stream(template=istream)
+            )
+            tb = istream.time_base
+            inp.seek(int(start / tb), stream=istream)
+            base = None
+            for packet in inp.demux(istream):
+                if packet.pts is None:
+                    continue   # flush packet
+                t = float(packet.pts * tb)
+                if t < start:
+                    continue
+                if t >= end:
+                    break
+                if base is None:
+                    base = packet.pts
+                packet.pts -= base
+                if packet.dts is not None:
+                    packet.dts -= base
+                packet.stream = ostream
+                out.mux(packet)
+
+    def split(self, src_path: str, cut_times: list, out_dir: str, ext: str) -> list:
+        av = self._av
+        prefix = os.path.join(out_dir, f".split_{os.getpid()}_{threading.get_ident()}_")
+        bounds = [0.0] + list(cut_times)
+        pieces = [None] * len(bounds)
+        out = ostream = base = None
+        current = -1
+        try:
+            with av.open(src_path) as inp:
+                istream = inp.streams.audio[0]
+                tb = istream.time_base
+                for packet in inp.demux(istream):
+                    if packet.pts is None:
+                        continue   # flush packet
+                    k = bisect.bisect_right(bounds, float(packet.pts * tb)) - 1
+                    if k != current:
+                        if out is not None:
+                            out.close()
+                        current = k
+                        pieces[k] = f"{prefix}{k:04d}{ext}"
+                        out = self._open_copy(pieces[k])
+                        add_template = getattr(out, "add_stream_from_template", None)
+                        ostream = (
+                            add_template(istream) if add_template
+                            else out.add_stream(template=istream)
+                        )
+                        base = packet.pts
+                    packet.pts -= base
+                    if packet.dts is not None:
+                        packet.dts -= base
+                    packet.stream = ostream
+                    out.mux(packet)
+        except Exception:
+            for path in pieces:
+                if path and os.path.exists(path):
+                    os.unlink(path)
+            raise
+        finally:
+            if out is not None:
+                out.close()
+        return pieces
+
+    def _open_copy(self, path: str):
+        """
+        Output container for stream-copied packets.
+
+        MP3 output gets no Xing header: it would repeat the source's encoder
+        delay and padding, and decoders would trim that from every piece.
+        """
+        options = {"write_xing": "0"} if path.lower().endswith(".mp3") else {}
+        return self._av.open(path, mode="w", options=options)
+
+    def extract_slice(self, src_path: str, start: float, end: float,
+                      out_path: str, fmt: str) -> None:
+        pcm = self.decode_pcm(src_path, SAMPLE_RATE, start, end)
+        if fmt == "wav":
+            data = _wav_bytes(pcm, SAMPLE_RATE)
+        else:
+            data = self.encode_mp3(pcm, SAMPLE_RATE, MP3_BITRATE)
+        with open(out_path, "wb") as f:
+            f.write(data)
+
+
+# -----------------------------------------------------------------------
+# Service
+# -----------------------------------------------------------------------
+
+class AudioCodec:
+    """
+    Pooled codec front-end with in-process primary and ffmpeg fallback.
+
+    Thread-safe; share one instance per process (see get_codec()).
+    """
+
+    def __init__(self, backend: str = "auto", max_concurrency: int = CODEC_MAX_CONCURRENCY):
+        self._slots = threading.BoundedSemaphore(max(1, int(max_concurrency)))
+        self._fallback = _FFmpegBackend()
+        self._primary = None
+        if backend in ("auto", "pyav"):
+            try:
+                self._primary = _PyAVBackend()
+            except ImportError:
+                if backend == "pyav":
+                    logger.warning("AUDIO_CODEC_BACKEND='pyav' but PyAV is not installed")
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._disabled_until = 0.0
+
+    @property
+    def backend(self) -> str:
+        """Name of the backend new operations will use."""
+        return self._active().name
+
+    def health(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self._active().name,
+                "in_process": self._primary is not None,
+                "consecutive_failures": self._failures,
+                "disabled": self._disabled_until > time.monotonic(),
+            }
+
+    # -- public operations -----------------------------------------------------
+
+    def encode_mp3(self, pcm_int16: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                   bitrate: str = MP3_BITRATE) -> Optional[bytes]:
+        """Encode mono int16 PCM to MP3 bytes, or None on failure."""
+        return self._call("encode_mp3", (pcm_int16, sample_rate, bitrate), None,
+                          "MP3 encode")
+
+    def decode_pcm(self, path: str, sample_rate: int = SAMPLE_RATE,
+                   start: Optional[float] = None,
+                   end: Optional[float] = None) -> Optional[np.ndarray]:
+        """Decode *path* (optionally [start, end) seconds) to mono int16 PCM."""
+        return self._call("decode_pcm", (path, sample_rate, start, end), None,
+                          f"PCM decode of {path}")
+
+    def probe_duration(self, path: str) -> float:
+        """Container duration in seconds, or 0.0 on failure."""
+        return self._call("probe_duration", (path,), 0.0, f"Duration probe of {path}")
+
+    def cut(self, src_path: str, start: float, end: float, out_path: str) -> bool:
+        """Stream-copy [start, end] of *src_path* into *out_path* (no re-encode)."""
+        return self._call("cut", (src_path, start, end, out_path), False,
+                          f"Cut of {out_path}", ok=True)
+
+    def split(self, src_path: str, cut_times: list, out_dir: str,
+              ext: str = ".mp3") -> Optional[list]:
+        """
+        Stream-copy *src_path* into consecutive pieces split at *cut_times*.
+
+        Piece k covers [bounds[k], bounds[k + 1]) with bounds = [0] + cut_times;
+        returns the piece paths (None where no audio fell in that interval),
+        or None on failure.  Pieces are temp files in *out_dir*: rename or
+        delete them.
+        """
+        return self._call("split", (src_path, cut_times, out_dir, ext), None,
+                          f"Split of {src_path}")
+
+    def extract_slice(self, src_path: str, start: float, end: float,
+                      out_path: str, fmt: str = "wav") -> bool:
+        """Re-encode [start, end) of *src_path* to 16 kHz mono *fmt* ('wav' or 'mp3')."""
+        return self._call("extract_slice", (src_path, start, end, out_path, fmt), False,
+                          f"Slice extraction {src_path} [{start:.1f}-{end:.1f}]", ok=True)
+
+    # -- health / fallback -----------------------------------------------------
+
+    def health_check(self) -> bool:
+        """Round-trip a short tone through the in-process backend."""
+        if self._primary is None:
+            return False
+        tone = (np.sin(np.arange(SAMPLE_RATE // 10) * 0.1) * 8000).astype(np.int16)
+        try:
+            data = self._primary.encode_mp3(tone, SAMPLE_RATE, MP3_BITRATE)
+            return len(data) > 0
+        except Exception:
+            logger.exception("Audio codec health check failed")
+            return False
+
+    def _active(self):
+        if self._primary is None or self._disabled_until > time.monotonic():
+            return self._fallback
+        return self._primary
+
+    def _call(self, op: str, args: tuple, failed, what: str, ok=None):
+        with self._slots:
+            backend = self._maybe_restart()
+            if backend is self._primary:
+                try:
+                    result = getattr(backend, op)(*args)
+                except Exception as exc:
+                    self._record_failure(op, exc)
+                else:
+                    self._record_success()
+                    return result if ok is None else ok
+
+            try:
+                result = getattr(self._fallback, op)(*args)
+            except Exception as exc:
+                logger.error("%s failed: %s", what, exc)
+                return failed
+            return result if ok is None else ok
+
+    def _maybe_restart(self):
+        """Return the backend to use, re-admitting a disabled primary if healthy."""
+        with self._lock:
+            if self._primary is None:
+                return self._fallback
+            if not self._disabled_until or self._disabled_until > time.monotonic():
+                return self._active()
+            self._disabled_until = 0.0
+        if self.health_check():
+            logger.info("In-process audio codec back in service")
+            with self._lock:
+                self._failures = 0
+            return self._primary
+        with self._lock:
+            self._disabled_until = time.monotonic() + CODEC_RESTART_INTERVAL
+        return self._fallback
+
+    def _record_failure(self, op: str, exc: Exception):
+        logger.warning("In-process %s failed (%s); retrying with ffmpeg", op, exc)
+        with self._lock:
+            self._failures += 1
+            if self._failures >= CODEC_MAX_FAILURES:
+                self._disabled_until = time.monotonic() + CODEC_RESTART_INTERVAL
+                logger.error(
+                    "In-process audio codec disabled for %.0fs after %d consecutive failures",
+                    CODEC_RESTART_INTERVAL, self._failures,
+                )
+
+    def _record_success(self):
+        if self._failures:
+            with self._lock:
+                self._failures = 0
+
+
+# -----------------------------------------------------------------------
+# Process-wide instance
+# -----------------------------------------------------------------------
+
+_codec_instance: Optional[AudioCodec] = None
+_codec_lock = threading.Lock()
+
+
+def get_codec() -> AudioCodec:
+    """Return the lazily-created process-wide AudioCodec."""
+    global _codec_instance
+
+    if _codec_instance is None:
+        from django.conf import settings
+
+        with _codec_lock:
+            if _codec_instance is None:
+                _codec_instance = AudioCodec(
+                    backend=getattr(settings, "AUDIO_CODEC_BACKEND", "auto"),
+                    max_concurrency=getattr(
+                        settings, "AUDIO_CODEC_MAX_CONCURRENCY", None,
+                    ) or CODEC_MAX_CONCURRENCY,
+                )
+                logger.info("Audio codec ready (backend=%s)", _codec_instance.backend)
+    return _codec_instance
+
+
+def encode_mp3(pcm_int16: np.ndarray, sample_rate: int = SAMPLE_RATE,
+               bitrate: str = MP3_BITRATE) -> Optional[bytes]:
+    return get_codec().encode_mp3(pcm_int16, sample_rate, bitrate)
+
+
+def decode_pcm(path: str, sample_rate: int = SAMPLE_RATE, start: Optional[float] = None,
+               end: Optional[float] = None) -> Optional[np.ndarray]:
+    return get_codec().decode_pcm(path, sample_rate, start, end)
+
+
+def probe_duration(path: str) -> float:
+    return get_codec().probe_duration(path)
+
+
+def cut(src_path: str, start: float, end: float, out_path: str) -> bool:
+    return get_codec().cut(src_path, start, end, out_path)
+
+
+def split(src_path: str, cut_times: list, out_dir: str, ext: str = ".mp3") -> Optional[list]:
+    return get_codec().split(src_path, cut_times, out_dir, ext)
+
+
+def extract_slice(src_path: str, start: float, end: float, out_path: str,
+                  fmt: str = "wav") -> bool:
+    return get_codec().extract_slice(src_path, start, end, out_path, fmt)
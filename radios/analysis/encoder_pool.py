@@ -0,0 +1,180 @@
+"""
+Shared segment-encoding worker pool for the real-time pipeline.
+
+Finalizing a segment means an MP3 encode plus a Django file save — seconds
+of work for a 15-minute segment.  Done inline, it blocks the classifier
+thread of that stream.  The pool moves it off the hot path:
+
+    SegmentStateMachine ─ finalized ─→ submit(recording_id, encoder, segment)
+                                              │
+                               worker = hash(recording_id) % workers
+                                              │
+                     bounded FIFO per worker ─→ encoder.encode_and_save()
+
+Guarantees:
+    - Segments of one recording always go to the same worker, so they are
+      encoded and saved in finalization order.
+    - Queues are bounded (queue_size per worker): when encoders fall that
+      far behind, submit() blocks the producer rather than piling up work.
+    - stop() drains every queued job before the workers exit.
+
+One pool is shared by all StreamProcessors; record_and_segment sizes it
+from STREAM_ENCODER_WORKERS / STREAM_ENCODER_QUEUE_SIZE.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger("stream_processor")
+
+ENCODER_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # default: half the cores
+ENCODER_QUEUE_SIZE = 64                               # pending segments per worker
+
+_STOP = object()  # worker shutdown sentinel
+
+
+class _Job:
+    __slots__ = ("encoder", "segment", "future", "submitted")
+
+    def __init__(self, encoder, segment):
+        self.encoder = encoder
+        self.segment = segment
+        self.future = Future()
+        self.submitted = time.monotonic()
+
+
+class SegmentEncoderPool:
+    """
+    Fixed set of encoder threads shared by all streams.
+
+    Thread-safe: any number of classifier threads may call submit().
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: int = ENCODER_QUEUE_SIZE):
+        self.workers = max(1, int(workers or ENCODER_WORKERS))
+        self.queue_size = max(1, int(queue_size))
+        self._queues: list = []
+        self._threads: list = []
+        self._lock = threading.Lock()
+        self._running = False
+
+        # Metrics
+        self.encoded = 0
+        self.failed = 0
+        self.last_encode_seconds = 0.0
+        self.max_encode_seconds = 0.0
+        self.max_wait_seconds = 0.0   # time a job sat in the queue before starting
+
+    # -- lifecycle -------------------------------------------------------------
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._queues = [queue.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+            self._threads = [
+                threading.Thread(
+                    target=self._run, args=(q,), name=f"segment-encoder-{i}", daemon=True,
+                )
+                for i, q in enumerate(self._queues)
+            ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(
+            "Segment encoder pool started (workers=%d, queue_size=%d)",
+            self.workers, self.queue_size,
+        )
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop accepting work, finish every queued job, then join the workers."""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+        for q in self._queues:
+            q.put(_STOP)   # queued after any pending jobs: drain first
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        logger.info("Segment encoder pool stopped: %s", self.stats())
+
+    # -- producer API ----------------------------------------------------------
+
+    def submit(self, recording_id, encoder, segment) -> Future:
+        """
+        Queue encoder.encode_and_save(segment).
+
+        Jobs with the same *recording_id* run in submission order.  Blocks
+        while the target worker's queue is full.  The returned Future
+        resolves once the segment has been saved (or failed).
+        """
+        job = _Job(encoder, segment)
+        with self._lock:
+            if not self._running:
+                job.future.set_exception(RuntimeError("Segment encoder pool not running"))
+                return job.future
+            q = self._queues[hash(recording_id) % self.workers]
+        q.put(job)
+        return job.future
+
+    @property
+    def pending(self) -> int:
+        """Segments queued but not yet started, across all workers."""
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "encoded": self.encoded,
+            "failed": self.failed,
+            "last_encode_seconds": round(self.last_encode_seconds, 3),
+            "max_encode_seconds": round(self.max_encode_seconds, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+        }
+
+    # -- worker threads --------------------------------------------------------
+
+    def _run(self, q: queue.Queue):
+        try:
+            while True:
+                job = q.get()
+                if job is _STOP:
+                    return
+                self._run_job(job)
+        finally:
+            # Worker threads own their DB connection; don't leak it
+            connection.close()
+
+    def _run_job(self, job: _Job):
+        close_old_connections()
+        t0 = time.monotonic()
+        try:
+            job.encoder.encode_and_save(job.segment)
+        except Exception as exc:
+            logger.exception(
+                "Segment encode failed [%.1f-%.1fs]", job.segment.start, job.segment.end,
+            )
+            with self._lock:
+                self.failed += 1
+            job.future.set_exception(exc)
+            return
+
+        elapsed = time.monotonic() - t0
+        with self._lock:
+            self.encoded += 1
+            self.last_encode_seconds = elapsed
+            self.max_encode_seconds = max(self.max_encode_seconds, elapsed)
+            self.max_wait_seconds = max(self.max_wait_seconds, t0 - job.submitted)
+        logger.debug(
+            "Encoded segment [%.1f-%.1fs] in %.2fs (%d pending)",
+            job.segment.start, job.segment.end, elapsed, self.pending,
+        )
+        job.future.set_result(None)
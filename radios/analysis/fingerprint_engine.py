@@ -0,0 +1,236 @@
+"""
+Concurrent Shazam fingerprinting on one long-lived asyncio event loop.
+
+fingerprint_segment_sliding() handles one window at a time and starts a
+fresh event loop (asyncio.run) for every clip, so a process spends most of
+its time waiting on a single HTTP round trip.  FingerprintEngine keeps one
+loop running on a background thread and walks many segments at once:
+
+    engine = FingerprintEngine(concurrency=8)
+    engine.start()
+    future = engine.submit(source_path, start, end, segment_id)   # any thread
+    results = future.result()                         # list[FingerprintResult]
+    engine.stop()
+
+Windows of one segment stay sequential (each step depends on the previous
+match; see fingerprinter._plan_windows), segments run side by side.  Each
+segment is decoded once -- for the track-boundary scan -- and its clips are
+sliced from memory (fingerprinter._SegmentAudio).  At most *concurrency*
+clips are in flight (decode + local lookup + Shazam request); all Shazam
+requests share one aiohttp session and draw from the host-wide token
+bucket in rate_limiter.py.  A 429 answer halves the shared rate and pauses
+every worker (rate_limiter.SharedTokenBucket.on_rate_limited) instead of
+being retried blindly by shazamio's own retry client.  Clips already in the
+local fingerprint index (fingerprint_index.py) never reach Shazam; the
+others are sent as signatures computed here in batches (signatures.py).
+
+Dependencies: shazamio (which brings aiohttp)
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Optional
+
+from radios.analysis import fingerprint_index
+from radios.analysis.audio_codec import _wav_bytes
+from radios.analysis.fingerprinter import (
+    _RETRY_ATTEMPTS, _RETRY_BASE_DELAY, FingerprintResult, _index_new_songs, _parse_track,
+    _plan_windows, _SegmentAudio, _window_signer,
+)
+from radios.analysis.signatures import Signature
+from radios.analysis.rate_limiter import RateLimited, get_rate_limiter
+
+logger = logging.getLogger("broadcast_analysis")
+
+CONCURRENCY_DEFAULT = 8
+REQUEST_TIMEOUT = 60.0     # per Shazam HTTP request (s)
+STOP_TIMEOUT = 10.0        # grace period for in-flight work on stop() (s)
+
+
+def _retry_after(value) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds form only)."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class _RateLimitedHTTPClient:
+    """
+    shazamio HTTP client sharing one aiohttp session, without retries.
+
+    429 raises RateLimited (so the engine can back off host-wide), other
+    error statuses raise aiohttp.ClientResponseError.
+    """
+
+    def __init__(self, session):
+        self._session = session
+
+    async def request(self, method: str, url: str, *args, **kwargs):
+        async with self._session.request(method.upper(), url, **kwargs) as resp:
+            if resp.status == 429:
+                raise RateLimited(_retry_after(resp.headers.get("Retry-After")))
+            resp.raise_for_status()
+            content_type = args[0] if args else "application/json"
+            return await resp.json(content_type=content_type)
+
+
+class FingerprintEngine:
+    """Runs fingerprinting coroutines for many segments on a background event loop."""
+
+    def __init__(self, concurrency: int = CONCURRENCY_DEFAULT, limiter=None):
+        if concurrency < 1:
+            raise ValueError("concurrency must be >= 1")
+        self.concurrency = concurrency
+        self._limiter = limiter
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._session = None
+        self._shazam = None
+
+    # -- lifecycle (caller's thread) --
+
+    def start(self):
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="fingerprint-engine", daemon=True,
+        )
+        self._thread.start()
+        logger.info("Fingerprint engine started (concurrency=%d)", self.concurrency)
+
+    def submit(self, source_path: str, start: float, end: float,
+               segment_id=None) -> concurrent.futures.Future:
+        """Schedule fingerprint() for a segment; returns a thread-safe Future."""
+        if self._loop is None:
+            raise RuntimeError("FingerprintEngine.start() has not been called")
+        return asyncio.run_coroutine_threadsafe(
+            self.fingerprint(source_path, start, end, segment_id), self._loop,
+        )
+
+    def stop(self, timeout: float = STOP_TIMEOUT):
+        """Cancel outstanding work, close the HTTP session and stop the loop."""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout)
+        except Exception as exc:
+            logger.warning("Fingerprint engine did not shut down cleanly: %s", exc)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+        self._loop = self._thread = None
+        logger.info("Fingerprint engine stopped")
+
+    async def _shutdown(self):
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+        self._session = self._shazam = None
+
+    # -- coroutines (engine loop) --
+
+    async def fingerprint(self, source_path: str, start: float, end: float,
+                          segment_id=None) -> list:
+        """Sliding-window identification of [start, end) seconds of source_path."""
+        audio, window = await asyncio.to_thread(_plan_windows, source_path, start, end)
+        signer = await asyncio.to_thread(_window_signer, audio, window, segment_id)
+        while True:
+            step = window.next_window()
+            if step is None:
+                break
+            pos, clip_duration = step
+            async with self._slots:
+                result = await self._extract_and_recognize(audio, pos, clip_duration, signer)
+            window.record(result)
+        await asyncio.to_thread(_index_new_songs, source_path, window.results, audio)
+        if signer is not None:
+            await asyncio.to_thread(signer.finish, window.results)
+        return window.results
+
+    async def _extract_and_recognize(self, audio: _SegmentAudio, pos, clip_duration, signer=None):
+        # Decoding and hashing are numpy/codec work: keep them off the loop
+        pcm = await asyncio.to_thread(audio.clip, pos, clip_duration)
+        if pcm is None:
+            return None
+        local = await asyncio.to_thread(fingerprint_index.lookup, pcm, audio.sample_rate)
+        if local:
+            return local
+        if signer is not None:
+            sig = await signer.signature(pos, clip_duration, pcm)
+            if sig is not None:
+                return await self._recognize(sig)
+        return await self._recognize(_wav_bytes(pcm, audio.sample_rate))
+
+    async def _recognize(self, audio) -> Optional[FingerprintResult]:
+        """
+        Recognize one clip (Signature, path or WAV bytes), pacing requests
+        through the shared rate limiter.
+
+        A 429 slows every worker down (on_rate_limited) before the retry;
+        other failures are retried with exponential back-off, like
+        fingerprinter._recognize_sync().
+        """
+        limiter = self._limiter or get_rate_limiter()
+        delay = _RETRY_BASE_DELAY
+        for attempt in range(1, _RETRY_ATTEMPTS + 1):
+            wait = limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await self._request(audio)
+            except RateLimited as exc:
+                limiter.on_rate_limited(exc.retry_after)
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if attempt == _RETRY_ATTEMPTS:
+                    logger.error(
+                        "Shazam recognition failed after %d attempts: %s", _RETRY_ATTEMPTS, exc,
+                    )
+                    return None
+                logger.warning(
+                    "Shazam recognition failed (attempt %d/%d), retrying in %.0fs: %s",
+                    attempt, _RETRY_ATTEMPTS, delay, exc,
+                )
+                await asyncio.sleep(delay)
+                delay *= 2
+                continue
+            limiter.on_success()
+            return _parse_track(response)
+
+        logger.error("Shazam kept rate limiting us -- giving up on this clip")
+        return None
+
+    async def _request(self, audio) -> dict:
+        shazam = await self._get_shazam()
+        if isinstance(audio, Signature):
+            request = shazam.send_recognize_request_v2(audio.request())
+        else:
+            request = shazam.recognize(audio)
+        return await asyncio.wait_for(request, REQUEST_TIMEOUT)
+
+    async def _get_shazam(self):
+        if self._shazam is None:
+            import aiohttp
+            from shazamio import Shazam
+
+            self._session = aiohttp.ClientSession()
+            try:
+                self._shazam = Shazam(http_client=_RateLimitedHTTPClient(self._session))
+            except TypeError:
+                # shazamio < 0.6 has no pluggable HTTP client: 429s are
+                # retried inside shazamio, requests are still paced here
+                self._shazam = Shazam()
+        return self._shazam
@@ -0,0 +1,391 @@
+"""
+Local acoustic fingerprint index of already-identified songs.
+
+Stations rotate a few hundred songs, so most music segments contain a
+track Shazam has already named for us.  Every clip Shazam identifies is
+hashed into this index, and every clip is looked up here before a remote
+request is made: repeat plays are recognized locally (no network, no rate
+limit) and only genuinely new tracks reach Shazam.
+
+Fingerprints are landmark hashes (Wang 2003, the scheme behind Shazam):
+
+    1. log-magnitude spectrogram of the clip at 8 kHz
+    2. spectral peaks -- local maxima, the strongest PEAKS_PER_SECOND per second
+    3. each peak paired with the next FAN_OUT peaks up to MAX_DT frames later;
+       (f1, f2, dt) packed into a 24-bit hash, stored with the anchor time
+
+A query clip matches a reference clip when many of its hashes occur there
+at one consistent time offset.  Peaks survive noise, loudness changes and
+MP3 re-encoding, and the offset check makes chance hash collisions
+irrelevant.
+
+The index is one compressed .npz file (FINGERPRINT_INDEX_PATH) holding
+sorted hash/reference/time arrays and the song metadata of each reference
+clip, so a local match returns a complete FingerprintResult without the
+database.  Processes sharing the file merge their additions under flock()
+and pick up each other's saves.  Seed it from existing SongOccurrences with
+`python manage.py build_fingerprint_index`; FINGERPRINT_INDEX = False
+turns it off.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import fcntl
+except ImportError:   # not POSIX: concurrent savers may drop each other's additions
+    fcntl = None
+
+logger = logging.getLogger("broadcast_analysis")
+
+INDEX_FORMAT = 2
+SAMPLE_RATE = 8000           # fingerprint analysis rate (Hz)
+N_FFT = 1024                 # 128 ms window -> 512 frequency bins (9 bits)
+HOP = 512                    # 64 ms frames
+PEAK_FREQ_RADIUS = 12        # local-maximum neighbourhood (bins)
+PEAK_TIME_RADIUS = 4         # local-maximum neighbourhood (frames)
+PEAKS_PER_SECOND = 20
+FAN_OUT = 5                  # peaks paired with each anchor
+MAX_DT = 63                  # max anchor-target distance (frames, 6 bits)
+MIN_ALIGNED = 20             # aligned hashes needed for a match
+MATCH_MARGIN = 2.0           # best song must beat the runner-up song by this factor
+CONFIDENT_ALIGNED = 60       # aligned hashes that count as score 1.0
+MAX_REFS_PER_SONG = 3        # reference clips kept per song
+INDEX_SPAN = 60.0            # seconds of an identified song indexed per reference clip
+RELOAD_INTERVAL = 60.0       # seconds between checks for saves by other processes
+
+
+def enabled() -> bool:
+    from django.conf import settings
+
+    return bool(getattr(settings, "FINGERPRINT_INDEX", True))
+
+
+# -----------------------------------------------------------------------
+# Landmark hashes
+# -----------------------------------------------------------------------
+
+def _resample(pcm: np.ndarray, sample_rate: int) -> np.ndarray:
+    x = np.asarray(pcm, dtype=np.float32)
+    if np.issubdtype(np.asarray(pcm).dtype, np.integer):
+        x /= 32768.0
+    if sample_rate == SAMPLE_RATE:
+        return x
+    if sample_rate % SAMPLE_RATE == 0:
+        # Box-filter decimation (16 kHz clips -> 8 kHz): cheap, and the same
+        # path for reference and query clips
+        factor = sample_rate // SAMPLE_RATE
+        n = len(x) // factor * factor
+        return x[:n].reshape(-1, factor).mean(axis=1)
+    n_out = int(len(x) * SAMPLE_RATE / sample_rate)
+    return np.interp(
+        np.arange(n_out) * (sample_rate / SAMPLE_RATE), np.arange(len(x)), x,
+    ).astype(np.float32)
+
+
+def _max_filter(s: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (radius, radius)
+    padded = np.pad(s, pad, constant_values=-np.inf)
+    return sliding_window_view(padded, 2 * radius + 1, axis=axis).max(axis=-1)
+
+
+def _peaks(pcm: np.ndarray, sample_rate: int) -> np.ndarray:
+    """(time frame, frequency bin) of the spectral peaks, sorted by time."""
+    x = _resample(pcm, sample_rate)
+    if len(x) < N_FFT:
+        return np.zeros((0, 2), dtype=np.int32)
+    frames = sliding_window_view(x, N_FFT)[::HOP] * np.hanning(N_FFT).astype(np.float32)
+    spec = 20 * np.log10(np.abs(np.fft.rfft(frames, axis=1))[:, :N_FFT // 2] + 1e-6)
+
+    local_max = _max_filter(_max_filter(spec, PEAK_FREQ_RADIUS, 1), PEAK_TIME_RADIUS, 0)
+    is_peak = (spec == local_max) & (spec > np.median(spec) + 10.0)
+    t, f = np.nonzero(is_peak)
+
+    # Keep the strongest peaks of each second so loud passages don't crowd out the rest
+    block = max(1, SAMPLE_RATE // HOP)
+    strength = spec[t, f]
+    order = np.lexsort((-strength, t // block))
+    t, f, blocks = t[order], f[order], (t // block)[order]
+    first = np.searchsorted(blocks, blocks)
+    keep = np.arange(len(t)) - first < PEAKS_PER_SECOND
+    peaks = np.stack([t[keep], f[keep]], axis=1).astype(np.int32)
+    return peaks[np.lexsort((peaks[:, 1], peaks[:, 0]))]
+
+
+def landmarks(pcm: np.ndarray, sample_rate: int) -> tuple:
+    """(hashes uint32, anchor frames int32) of a mono PCM clip."""
+    peaks = _peaks(pcm, sample_rate)
+    hashes, times = [], []
+    for k in range(1, FAN_OUT + 1):
+        a, b = peaks[:-k], peaks[k:]
+        dt = b[:, 0] - a[:, 0]
+        ok = (dt >= 1) & (dt <= MAX_DT)
+        a, b, dt = a[ok], b[ok], dt[ok]
+        hashes.append((a[:, 1].astype(np.uint32) << 15) | (b[:, 1].astype(np.uint32) << 6) | dt.astype(np.uint32))
+        times.append(a[:, 0])
+    if not hashes:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32)
+    return np.concatenate(hashes), np.concatenate(times).astype(np.int32)
+
+
+# -----------------------------------------------------------------------
+# Index
+# -----------------------------------------------------------------------
+
+_RESULT_FIELDS = ("title", "artist", "shazam_key", "genres", "album_name",
+                  "release_year", "album_cover_url")
+
+
+class FingerprintIndex:
+    """
+    Landmark-hash index persisted at *path* (None = in memory only).
+
+    lookup() and add() are thread-safe.  Additions are written by save(),
+    which merges them into whatever other processes saved meanwhile.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = str(path) if path else None
+        self._lock = threading.Lock()
+        self._empty()
+        self._pending = []          # (meta, hashes, times) not yet saved
+        self._loaded_mtime = None
+        self._checked = 0.0
+        if self.path and os.path.exists(self.path):
+            self._load()
+
+    def _empty(self):
+        self._hashes = np.zeros(0, dtype=np.uint32)
+        self._refs = np.zeros(0, dtype=np.int32)
+        self._times = np.zeros(0, dtype=np.int32)
+        self._meta = []             # per reference clip: FingerprintResult fields
+
+    def __len__(self):
+        return len(self._meta) + len(self._pending)
+
+    def song_refs(self, shazam_key: str) -> int:
+        """Reference clips held for the song *shazam_key*."""
+        metas = self._meta + [meta for meta, _h, _t in self._pending]
+        return sum(1 for meta in metas if meta.get("shazam_key") == shazam_key)
+
+    # -- lookup --
+
+    def lookup(self, pcm: np.ndarray, sample_rate: int):
+        """FingerprintResult for the song in the clip, or None if it is not indexed."""
+        from radios.analysis.fingerprinter import FingerprintResult
+
+        self._maybe_reload()
+        q_hashes, q_times = landmarks(pcm, sample_rate)
+        if not len(q_hashes) or not len(self):
+            return None
+
+        with self._lock:
+            tables = [(self._hashes, self._refs, self._times)]
+            n_base = len(self._meta)
+            for k, (_meta, hashes, times) in enumerate(self._pending):
+                order = np.argsort(hashes, kind="stable")
+                tables.append((hashes[order], np.full(len(hashes), n_base + k, dtype=np.int32),
+                               times[order]))
+            metas = self._meta + [meta for meta, _h, _t in self._pending]
+
+        ref_ids, deltas = [], []
+        for hashes, refs, times in tables:
+            lo = np.searchsorted(hashes, q_hashes, side="left")
+            counts = np.searchsorted(hashes, q_hashes, side="right") - lo
+            total = int(counts.sum())
+            if not total:
+                continue
+            # Expand every (query hash, matching entry) pair
+            starts = np.cumsum(counts) - counts
+            idx = np.repeat(lo - starts, counts) + np.arange(total)
+            ref_ids.append(refs[idx])
+            deltas.append(times[idx] - np.repeat(q_times, counts))
+        if not ref_ids:
+            return None
+        ref_ids = np.concatenate(ref_ids).astype(np.int64)
+        deltas = np.concatenate(deltas).astype(np.int64)
+
+        # Votes per (reference clip, time offset); a match lines up in one offset
+        keys, votes = np.unique(ref_ids * (1 << 20) + deltas + (1 << 19), return_counts=True)
+        best_per_song = {}
+        order = np.argsort(-votes, kind="stable")
+        for key, n in zip(keys[order], votes[order]):
+            ref = int(key >> 20)
+            best_per_song.setdefault(metas[ref]["shazam_key"], (int(n), ref))
+            if len(best_per_song) == 2:
+                break
+        ranked = sorted(best_per_song.values(), reverse=True)
+        aligned, ref = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0
+        if aligned < MIN_ALIGNED or aligned < MATCH_MARGIN * runner_up:
+            return None
+
+        meta = metas[ref]
+        return FingerprintResult(
+            **{name: meta.get(name) for name in _RESULT_FIELDS},
+            score=min(1.0, aligned / CONFIDENT_ALIGNED),
+            estimated_start=0.0,
+            estimated_end=0.0,
+            source="local",
+        )
+
+    # -- additions --
+
+    def add(self, result, pcm: np.ndarray, sample_rate: int) -> bool:
+        """
+        Index a clip identified as *result* (a FingerprintResult).
+
+        Returns False if the song already has MAX_REFS_PER_SONG clips or
+        the clip yields no landmarks.  Call save() to persist.
+        """
+        if not result.shazam_key or self.song_refs(result.shazam_key) >= MAX_REFS_PER_SONG:
+            return False
+        hashes, times = landmarks(pcm, sample_rate)
+        if not len(hashes):
+            return False
+        meta = {name: getattr(result, name) for name in _RESULT_FIELDS}
+        meta["genres"] = list(meta["genres"] or [])
+        with self._lock:
+            self._pending.append((meta, hashes, times))
+        return True
+
+    def save(self):
+        """Merge pending additions into the index file (atomic, flock-guarded)."""
+        if not self.path:
+            self._merge_pending()
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.path) and os.path.getmtime(self.path) != self._loaded_mtime:
+                    self._load()    # another process saved: merge into its version
+                self._merge_pending()
+                with self._lock:
+                    hashes, refs, times, meta = self._hashes, self._refs, self._times, self._meta
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "wb") as f:
+                    np.savez_compressed(
+                        f,
+                        format=np.int32(INDEX_FORMAT),
+                        hashes=hashes, refs=refs, times=times,
+                        meta=np.str_(json.dumps(meta)),
+                    )
+                os.replace(tmp, self.path)
+                self._loaded_mtime = os.path.getmtime(self.path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        logger.info("Fingerprint index saved: %d clips, %d hashes", len(meta), len(hashes))
+
+    def _merge_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            meta = list(self._meta)
+            hashes, refs, times = [self._hashes], [self._refs], [self._times]
+            for entry_meta, entry_hashes, entry_times in pending:
+                key = entry_meta["shazam_key"]
+                if sum(1 for m in meta if m["shazam_key"] == key) >= MAX_REFS_PER_SONG:
+                    continue
+                hashes.append(entry_hashes)
+                refs.append(np.full(len(entry_hashes), len(meta), dtype=np.int32))
+                times.append(entry_times)
+                meta.append(entry_meta)
+            hashes, refs, times = np.concatenate(hashes), np.concatenate(refs), np.concatenate(times)
+            order = np.argsort(hashes, kind="stable")
+            self._hashes, self._refs, self._times = hashes[order], refs[order], times[order]
+            self._meta = meta
+
+    # -- persistence --
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data["format"]) != INDEX_FORMAT:
+                    logger.warning("Ignoring fingerprint index %s with format %s",
+                                   self.path, int(data["format"]))
+                    return
+                hashes, refs, times = data["hashes"], data["refs"], data["times"]
+                meta = json.loads(str(data["meta"]))
+        except Exception as exc:
+            logger.warning("Cannot read fingerprint index %s: %s", self.path, exc)
+            return
+        with self._lock:
+            self._hashes, self._refs, self._times, self._meta = hashes, refs, times, meta
+        self._loaded_mtime = mtime
+        logger.info("Fingerprint index loaded: %d clips from %s", len(meta), self.path)
+
+    def _maybe_reload(self):
+        """Pick up saves from other processes (checked every RELOAD_INTERVAL)."""
+        now = time.monotonic()
+        if not self.path or now - self._checked < RELOAD_INTERVAL:
+            return
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self._load()
+
+
+_index: Optional[FingerprintIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> FingerprintIndex:
+    """The process-wide FingerprintIndex at FINGERPRINT_INDEX_PATH."""
+    global _index
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from django.conf import settings
+
+                _index = FingerprintIndex(getattr(settings, "FINGERPRINT_INDEX_PATH", None))
+    return _index
+
+
+def lookup(pcm: Optional[np.ndarray], sample_rate: int):
+    """Local match for a clip, or None (index disabled, empty, or no match)."""
+    if pcm is None or not enabled():
+        return None
+    try:
+        result = get_index().lookup(pcm, sample_rate)
+    except Exception:
+        logger.exception("Fingerprint index lookup failed")
+        return None
+    if result:
+        logger.info("Local fingerprint match: %s — %s (score=%.2f)",
+                    result.artist, result.title, result.score)
+    return result
+
+
+def wants(result) -> bool:
+    """True if a clip of *result*'s song would be added to the index."""
+    return bool(result.shazam_key) and get_index().song_refs(result.shazam_key) < MAX_REFS_PER_SONG
+
+
+def remember(result, pcm: Optional[np.ndarray], sample_rate: int):
+    """Index a clip Shazam identified as *result*, and save the index."""
+    if pcm is None or result is None or not enabled():
+        return
+    try:
+        index = get_index()
+        if index.add(result, pcm, sample_rate):
+            index.save()
+    except Exception:
+        logger.exception("Cannot add %s to the fingerprint index", result.shazam_key)
+
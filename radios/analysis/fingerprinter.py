@@ -1,10 +1,21 @@
 """
 Shazam-based music fingerprinting via ShazamIO.
 
-Extracts clips from the source audio with ffmpeg, then uses the Shazam
-recognition API (reverse-engineered, no API key required) to identify them.
+Decodes each music segment once to PCM (audio_codec), slices the window
+clips from that buffer in memory, then uses the Shazam recognition API
+(reverse-engineered, no API key required) to identify them.
 
 Supports sliding window to detect multiple songs within long music segments.
+When the song changes inside a segment can be predicted from the audio
+(track_boundaries.py), one window is placed inside each predicted track
+instead (_TrackWindows), retried at most _PROBES_PER_TRACK times.
+fingerprint_segment_sliding() walks one segment at a time; the daemon uses
+FingerprintEngine (fingerprint_engine.py) to run many segments concurrently
+on one event loop.  Both draw from the same host-wide rate limiter, and
+both check every clip against the local fingerprint index
+(fingerprint_index.py) first, so only tracks not heard before reach Shazam.
+What reaches Shazam is a recognition signature computed here from the PCM
+(signatures.py), not the audio itself.
 
 Previous implementation used AcoustID/MusicBrainz — see fingerprinter_acoustid.py.
 """
@@ -12,17 +23,22 @@ Previous implementation used AcoustID/MusicBrainz — see fingerprinter_acoustid
 import asyncio
 import dataclasses
 import logging
-import os
-import subprocess
-import tempfile
 import time
 from typing import Optional
 import threading
 
+import numpy as np
+
+from radios.analysis import fingerprint_index, signatures, track_boundaries
+from radios.analysis.rate_limiter import get_rate_limiter
+
 logger = logging.getLogger("broadcast_analysis")
 
 _MIN_DURATION = 10.0   # Shazam needs ~5s; 10s gives a safe margin
 _MAX_CLIP = 60.0
+_CLIP_SAMPLE_RATE = 16000   # Shazam signatures are computed at 16 kHz
+_DECODE_BLOCK = 300.0       # seconds of a segment decoded at a time
+_RETAIN_MAX = 1200.0        # segments up to this long stay decoded after the boundary scan
 _BOUNDARY_TRIM = 3.0   # Trim 3s from each edge to avoid fade-in/out noise
 
 # Sliding window constants
@@ -30,9 +46,14 @@ _WINDOW = 15.0             # Clip size for each Shazam call
 _DEFAULT_TRACK_DUR = 240.0 # 4 min assumed track length
 _FAIL_STEP = 8.0          # Advance on no match (was 30s, smaller = more attempts)
 _MAX_ATTEMPTS = 20         # Safety cap per segment
+_SIGNATURE_BATCH = 4       # Windows signed together: the current one + the next misses
+
+# Track-boundary windows (track_boundaries.py)
+_PROBE_OFFSET = 30.0       # First window this far into a predicted track (past intro / crossfade)
+_PROBES_PER_TRACK = 3      # Windows tried per predicted track before moving on
+_MAX_TRACK_DUR = 480.0     # Longer predicted tracks are split (missed boundaries)
 
-# Rate limiting
-_INTER_REQUEST_DELAY = 2.0   # Seconds to wait between Shazam API calls
+# Rate limiting: requests are paced by rate_limiter.get_rate_limiter()
 _RETRY_ATTEMPTS = 3          # Retries on transient failure (covers 429s)
 _RETRY_BASE_DELAY = 10.0     # Initial retry wait in seconds (doubled each retry)
 
@@ -52,6 +73,8 @@ class FingerprintResult:
     album_cover_url: str
     estimated_start: float  # absolute offset in recording
     estimated_end: float    # absolute offset in recording
+    source: str = "shazam"  # "shazam" or "local" (fingerprint_index match)
+    matched_at: Optional[float] = None  # absolute offset of the window that matched
 
 
 def get_shazam_client(shazam_cls):
@@ -83,12 +106,14 @@ def fingerprint_segment_sliding(
     source_path: str,
     start: float,
     end: float,
+    segment_id=None,
 ) -> list[FingerprintResult]:
     """
     Identify all songs in [start, end) seconds of source_path using a sliding window.
 
     Trims _BOUNDARY_TRIM from each edge, then advances through the segment
     in steps, calling Shazam for each window. Deduplicates by shazam_key.
+    With a *segment_id*, window signatures are cached across runs.
     """
     try:
         from shazamio import Shazam
@@ -96,136 +121,517 @@ def fingerprint_segment_sliding(
         logger.error("shazamio is not installed — cannot fingerprint")
         return []
 
-    trimmed_start = start + _BOUNDARY_TRIM
-    trimmed_end = end - _BOUNDARY_TRIM
-    duration = trimmed_end - trimmed_start
+    audio, window = _plan_windows(source_path, start, end)
+    signer = _window_signer(audio, window, segment_id)
+    while True:
+        step = window.next_window()
+        if step is None:
+            break
+        pos, clip_duration = step
+        window.record(_extract_and_recognize(Shazam, audio, pos, clip_duration, signer))
 
-    if duration < _MIN_DURATION:
-        logger.debug(
-            "Segment too short to fingerprint after boundary trim (%.1fs)", duration,
-        )
-        return []
+    _index_new_songs(source_path, window.results, audio)
+    if signer is not None:
+        signer.finish(window.results)
+    return window.results
 
-    results = []
-    seen_keys = set()
-    pos = trimmed_start
-    attempts = 0
 
-    while pos + _MIN_DURATION <= trimmed_end and attempts < _MAX_ATTEMPTS:
-        attempts += 1
+def _index_new_songs(source_path: str, results: list, audio=None):
+    """
+    Add the songs Shazam identified in a segment to the local fingerprint index.
 
-        # Skip if pos falls inside an already-identified song's range
-        skip = False
-        for r in results:
-            if r.estimated_start <= pos < r.estimated_end:
-                pos = r.estimated_end
-                skip = True
-                break
-        if skip:
+    Clips are sliced from *audio* (the segment's _SegmentAudio) when it still
+    holds them, decoded from source_path otherwise.
+    """
+    if not fingerprint_index.enabled():
+        return
+    from radios.analysis.audio_codec import decode_pcm
+
+    for result in results:
+        if result.source != "shazam" or not fingerprint_index.wants(result):
             continue
+        start, end = _index_span(result)
+        pcm = audio.peek(start, end - start) if audio is not None else None
+        if pcm is None:
+            pcm = decode_pcm(source_path, _CLIP_SAMPLE_RATE, start, end)
+        fingerprint_index.remember(result, pcm, _CLIP_SAMPLE_RATE)
 
-        clip_duration = min(_WINDOW, _MAX_CLIP, trimmed_end - pos)
-        if clip_duration < _MIN_DURATION:
-            break
 
-        result = _extract_and_recognize(Shazam, source_path, pos, clip_duration)
+def _index_span(result: FingerprintResult) -> tuple:
+    """
+    The INDEX_SPAN seconds of a song to index: from the window that matched,
+    moved back if needed to stay inside [estimated_start, estimated_end].
+    """
+    pos = result.estimated_start if result.matched_at is None else result.matched_at
+    start = max(result.estimated_start,
+                min(pos, result.estimated_end - fingerprint_index.INDEX_SPAN))
+    return start, min(result.estimated_end, start + fingerprint_index.INDEX_SPAN)
+
+
+class _SlidingWindow:
+    """
+    Window positions for one segment, driven by the recognition results.
+
+    Trims _BOUNDARY_TRIM from each edge; after a match the window jumps
+    _DEFAULT_TRACK_DUR ahead, after a miss _FAIL_STEP.  Shared by
+    fingerprint_segment_sliding() and the async FingerprintEngine:
 
-        # Throttle: wait between API calls to avoid rate limiting
-        if pos + _MIN_DURATION <= trimmed_end and attempts < _MAX_ATTEMPTS:
-            time.sleep(_INTER_REQUEST_DELAY)
+        window = _SlidingWindow(start, end)
+        while (step := window.next_window()) is not None:
+            window.record(recognize(*step))
+    """
+
+    def __init__(self, start: float, end: float):
+        self.trimmed_start = start + _BOUNDARY_TRIM
+        self.trimmed_end = end - _BOUNDARY_TRIM
+        self.results: list[FingerprintResult] = []
+        self._seen_keys = set()
+        self._pos = self.trimmed_start
+        self._attempts = 0
+
+        duration = self.trimmed_end - self.trimmed_start
+        if duration < _MIN_DURATION:
+            logger.debug(
+                "Segment too short to fingerprint after boundary trim (%.1fs)", duration,
+            )
 
+    def next_window(self) -> Optional[tuple]:
+        """(pos, clip_duration) of the next clip to recognize, or None when done."""
+        while self._pos + _MIN_DURATION <= self.trimmed_end and self._attempts < _MAX_ATTEMPTS:
+            self._attempts += 1
+
+            # Skip if pos falls inside an already-identified song's range
+            for r in self.results:
+                if r.estimated_start <= self._pos < r.estimated_end:
+                    self._pos = r.estimated_end
+                    break
+            else:
+                clip_duration = min(_WINDOW, _MAX_CLIP, self.trimmed_end - self._pos)
+                if clip_duration < _MIN_DURATION:
+                    return None
+                return self._pos, clip_duration
+        return None
+
+    def record(self, result: Optional[FingerprintResult]):
+        """Feed back the recognition result for the window last returned."""
+        pos = self._pos
         if result:
-            if result.shazam_key and result.shazam_key in seen_keys:
+            if result.shazam_key and result.shazam_key in self._seen_keys:
                 # Same song still playing — advance past it
-                pos += _DEFAULT_TRACK_DUR
+                self._pos += _DEFAULT_TRACK_DUR
                 logger.debug(
                     "Duplicate shazam_key %s at %.1fs, skipping",
-                    result.shazam_key, pos,
+                    result.shazam_key, self._pos,
                 )
             else:
                 # New song found
                 result.estimated_start = pos
+                result.matched_at = pos
                 track_dur = _DEFAULT_TRACK_DUR
-                result.estimated_end = min(pos + track_dur, trimmed_end)
+                result.estimated_end = min(pos + track_dur, self.trimmed_end)
                 if result.shazam_key:
-                    seen_keys.add(result.shazam_key)
-                results.append(result)
+                    self._seen_keys.add(result.shazam_key)
+                self.results.append(result)
                 logger.info(
                     "Identified [%.1f-%.1fs]: %s — %s (key=%s)",
                     result.estimated_start, result.estimated_end,
                     result.artist, result.title, result.shazam_key,
                 )
-                pos += track_dur
+                self._pos += track_dur
         else:
-            pos += _FAIL_STEP
+            self._pos += _FAIL_STEP
+
+    def upcoming(self, pos: float, count: int) -> list:
+        """The next *count* windows after the one at *pos*, should it and they all miss."""
+        windows = []
+        for k in range(1, count + 1):
+            ahead = pos + k * _FAIL_STEP
+            duration = min(_WINDOW, _MAX_CLIP, self.trimmed_end - ahead)
+            if duration < _MIN_DURATION:
+                break
+            windows.append((ahead, duration))
+        return windows
+
 
-    return results
+class _TrackWindows:
+    """
+    Window positions for a segment split into predicted tracks.
+
+    Same interface as _SlidingWindow.  Each track (between two predicted
+    boundaries, see track_boundaries.py) is probed _PROBE_OFFSET into it,
+    then at up to _PROBES_PER_TRACK - 1 later points while it keeps
+    missing; a match moves on to the next track and spans the whole
+    predicted track.  A match with the same song as the track just before
+    extends that occurrence instead (a boundary predicted inside a song).
+    Extra probes never take the attempt budget (at least _MAX_ATTEMPTS)
+    away from the first probe of a later track.
+    """
 
+    def __init__(self, start: float, end: float, boundaries: list):
+        self.trimmed_start = start + _BOUNDARY_TRIM
+        self.trimmed_end = end - _BOUNDARY_TRIM
+        self.results: list[FingerprintResult] = []
+        self._seen_keys = set()
+
+        edges = [self.trimmed_start]
+        edges += [b for b in boundaries
+                  if self.trimmed_start + _MIN_DURATION < b < self.trimmed_end - _MIN_DURATION]
+        edges.append(self.trimmed_end)
+        self.tracks = []
+        for a, b in zip(edges, edges[1:]):
+            parts = 1
+            if b - a > _MAX_TRACK_DUR:
+                parts = int(np.ceil((b - a) / _DEFAULT_TRACK_DUR))
+            step = (b - a) / parts
+            self.tracks += [(a + k * step, a + (k + 1) * step) for k in range(parts)]
+        self._probes = [_track_probes(a, b) for a, b in self.tracks]
+
+        self._track = 0             # index into tracks
+        self._probe = -1            # index into _probes[_track] of the window last returned
+        self._matched_track = None  # track index of results[-1]
+        self._attempts = 0
+        self._budget = max(_MAX_ATTEMPTS, len(self.tracks))
+        logger.debug(
+            "Segment [%.1f-%.1fs] split into %d predicted track(s)",
+            self.trimmed_start, self.trimmed_end, len(self.tracks),
+        )
 
-def _extract_and_recognize(shazam_cls, source_path, pos, clip_duration):
-    """Extract a clip and run Shazam recognition on it."""
-    tmp_path = None
-    try:
-        tmp_dir = "/dev/shm" if os.path.exists("/dev/shm") else None
-        tmp_file = tempfile.NamedTemporaryFile(
-            suffix=".wav", delete=False, dir=tmp_dir,
+    def next_window(self) -> Optional[tuple]:
+        """(pos, clip_duration) of the next clip to recognize, or None when done."""
+        while self._track < len(self.tracks) and self._attempts < self._budget:
+            probe = self._probe + 1
+            later_tracks = len(self.tracks) - self._track - 1
+            if probe < len(self._probes[self._track]) and (
+                probe == 0 or self._budget - self._attempts > later_tracks
+            ):
+                self._probe = probe
+                self._attempts += 1
+                return self._probes[self._track][probe]
+            self._next_track()
+        return None
+
+    def record(self, result: Optional[FingerprintResult]):
+        """Feed back the recognition result for the window last returned."""
+        if not result:
+            return
+        track_start, track_end = self.tracks[self._track]
+        previous = self.results[-1] if self.results else None
+        if (previous is not None and result.shazam_key
+                and result.shazam_key == previous.shazam_key
+                and self._matched_track == self._track - 1):
+            previous.estimated_end = track_end
+            self._matched_track = self._track
+            logger.debug(
+                "Same song %s continues into [%.1f-%.1fs]",
+                result.shazam_key, track_start, track_end,
+            )
+        elif result.shazam_key and result.shazam_key in self._seen_keys:
+            logger.debug(
+                "Duplicate shazam_key %s at %.1fs, skipping", result.shazam_key, track_start,
+            )
+        else:
+            result.estimated_start = track_start
+            result.estimated_end = track_end
+            result.matched_at = self._probes[self._track][self._probe][0]
+            if result.shazam_key:
+                self._seen_keys.add(result.shazam_key)
+            self.results.append(result)
+            self._matched_track = self._track
+            logger.info(
+                "Identified [%.1f-%.1fs]: %s — %s (key=%s)",
+                result.estimated_start, result.estimated_end,
+                result.artist, result.title, result.shazam_key,
+            )
+        self._next_track()
+
+    def upcoming(self, pos: float, count: int) -> list:
+        """The next *count* windows after the one last returned, should it and they all miss."""
+        if self._track >= len(self.tracks):
+            return []
+        windows = list(self._probes[self._track][self._probe + 1:])
+        for probes in self._probes[self._track + 1:]:
+            if len(windows) >= count:
+                break
+            windows += probes
+        return windows[:count]
+
+    def _next_track(self):
+        self._track += 1
+        self._probe = -1
+
+
+def _track_probes(start: float, end: float) -> list:
+    """(pos, clip_duration) windows for one predicted track, in order."""
+    clip_duration = min(_WINDOW, _MAX_CLIP)
+    usable = end - start - clip_duration
+    if usable <= 0:
+        return [(start, end - start)] if end - start >= _MIN_DURATION else []
+    first = min(_PROBE_OFFSET, usable / 2)
+    offsets = [first]
+    for k in range(1, _PROBES_PER_TRACK):
+        offset = first + (usable - first) * k / _PROBES_PER_TRACK
+        if offset - offsets[-1] >= clip_duration:
+            offsets.append(offset)
+    return [(start + offset, clip_duration) for offset in offsets]
+
+
+def _plan_windows(source_path: str, start: float, end: float) -> tuple:
+    """
+    (audio, window) for one segment: its _SegmentAudio, and _TrackWindows
+    over the predicted tracks, or a _SlidingWindow when boundary prediction
+    is off or the audio cannot be analysed.
+    """
+    audio = _SegmentAudio(source_path, start + _BOUNDARY_TRIM, end - _BOUNDARY_TRIM)
+    if track_boundaries.enabled():
+        boundaries = track_boundaries.find_track_boundaries(
+            audio.blocks(), audio.sample_rate, audio.start,
         )
-        tmp_path = tmp_file.name
-        tmp_file.close()
-
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-ss", str(pos),
-            "-t", str(clip_duration),
-            "-i", source_path,
-            "-ac", "1",
-            "-ar", "44100",
-            "-f", "wav",
-            tmp_path,
-        ]
-        logger.debug("Running ffmpeg: %s", " ".join(cmd))
-        proc = subprocess.run(cmd, capture_output=True, timeout=120)
-        if proc.returncode != 0:
+        if boundaries is not None:
+            return audio, _TrackWindows(start, end, boundaries)
+    return audio, _SlidingWindow(start, end)
+
+
+class _SegmentAudio:
+    """
+    The PCM of one segment, decoded once and sliced into window clips in memory.
+
+    Decodes forward in _DECODE_BLOCK pieces as the sliding window advances
+    (windows only move forward), so every sample is decoded exactly once and
+    an hour-long DJ set never sits in memory whole.  Replaces one ffmpeg
+    seek + decode + temp file per window.
+
+    blocks() decodes the whole segment up front for the track-boundary
+    scan; a segment up to _RETAIN_MAX seconds long is then kept, and its
+    window clips, signatures and index clips are all sliced from that one
+    decode.
+    """
+
+    def __init__(self, source_path: str, start: float, end: float,
+                 sample_rate: int = _CLIP_SAMPLE_RATE):
+        self.source_path = source_path
+        self.sample_rate = sample_rate
+        self._start = start
+        self._end = end
+        self._buf = np.zeros(0, dtype=np.int16)
+        self._buf_offset = 0       # sample index of _buf[0], relative to start
+        self._exhausted = False    # decoder returned no more audio
+        self._retained = False     # whole segment held since blocks()
+
+    @property
+    def start(self) -> float:
+        return self._start
+
+    def blocks(self):
+        """
+        Yield the segment's PCM in consecutive _DECODE_BLOCK pieces, decoding it all.
+
+        Segments up to _RETAIN_MAX seconds are kept in memory afterwards, so
+        clip() and peek() never decode them again; longer ones are dropped
+        block by block (clip() decodes them again as the windows advance).
+        """
+        from radios.analysis.audio_codec import decode_pcm
+
+        sr = self.sample_rate
+        keep = self._end - self._start <= _RETAIN_MAX
+        kept = []
+        decoded = 0
+        while decoded < (self._end - self._start) * sr:
+            block_start = self._start + decoded / sr
+            block_end = min(block_start + _DECODE_BLOCK, self._end)
+            pcm = decode_pcm(self.source_path, sr, block_start, block_end)
+            if pcm is None or not len(pcm):
+                break
+            decoded += len(pcm)
+            if keep:
+                kept.append(pcm)
+            yield pcm
+        if kept:
+            self._buf = np.concatenate(kept)
+            self._buf_offset = 0
+            self._exhausted = self._retained = True
+
+    def clip(self, pos: float, duration: float) -> Optional[np.ndarray]:
+        """Mono int16 samples of [pos, pos + duration), or None if too little audio."""
+        from radios.analysis.audio_codec import decode_pcm
+
+        sr = self.sample_rate
+        lo, hi = self._bounds(pos, duration)
+        if lo < self._buf_offset:
+            # Windows move forward; a step back means re-decoding from there
+            self._buf, self._buf_offset, self._exhausted = self._buf[:0], lo, False
+
+        # Drop what earlier windows consumed, then decode until hi is covered
+        drop = 0 if self._retained else min(len(self._buf), max(0, lo - self._buf_offset))
+        self._buf = self._buf[drop:]
+        self._buf_offset += drop
+        if not len(self._buf):
+            self._buf_offset = lo
+        while self._buf_offset + len(self._buf) < hi and not self._exhausted:
+            block_start = self._start + (self._buf_offset + len(self._buf)) / sr
+            block_end = min(block_start + _DECODE_BLOCK, self._end)
+            pcm = decode_pcm(self.source_path, sr, block_start, block_end)
+            if pcm is None or not len(pcm):
+                self._exhausted = True
+                break
+            self._buf = np.concatenate([self._buf, pcm])
+
+        clip = self._buf[lo - self._buf_offset:hi - self._buf_offset]
+        if len(clip) < _MIN_DURATION * sr:
             logger.error(
-                "ffmpeg slice failed for %s [%.1f+%.1fs]: %s",
-                source_path, pos, clip_duration,
-                proc.stderr.decode(errors="replace"),
+                "Could not decode %s [%.1f+%.1fs] (%d samples)",
+                self.source_path, pos, duration, len(clip),
             )
             return None
+        return clip
+
+    def peek(self, pos: float, duration: float) -> Optional[np.ndarray]:
+        """Like clip(), but only from audio already decoded: None unless all of it is."""
+        lo, hi = self._bounds(pos, duration)
+        if lo < self._buf_offset or hi > self._buf_offset + len(self._buf):
+            return None
+        if hi - lo < _MIN_DURATION * self.sample_rate:
+            return None
+        return self._buf[lo - self._buf_offset:hi - self._buf_offset]
 
-        return _recognize_sync(shazam_cls, tmp_path)
+    def _bounds(self, pos: float, duration: float) -> tuple:
+        """Sample range of [pos, pos + duration), relative to the segment start."""
+        sr = self.sample_rate
+        lo = int(round((pos - self._start) * sr))
+        hi = int(round((min(pos + duration, self._end) - self._start) * sr))
+        return lo, hi
 
-    finally:
-        if tmp_path:
-            try:
-                os.unlink(tmp_path)
-            except OSError:
-                pass
 
+class _WindowSigner:
+    """
+    Shazam signatures of one segment's windows (see signatures.py).
+
+    A window not signed yet is signed together with the next
+    _SIGNATURE_BATCH - 1 windows the sliding window reaches if it keeps
+    missing (window.upcoming()), as far as their audio is already decoded.
+    Signatures are read from and written to the segment's SignatureCache
+    when there is one.
+    """
+
+    def __init__(self, audio: _SegmentAudio, window, cache=None):
+        self._audio = audio
+        self._window = window
+        self._cache = cache
+        self._signed: dict = {}   # (pos, duration) -> Signature
+
+    def cached(self, pos: float, duration: float):
+        sig = self._signed.get((round(pos, 2), round(duration, 2)))
+        if sig is None and self._cache is not None:
+            sig = self._cache.get(pos, duration)
+        return sig
+
+    def batch(self, pos: float, duration: float, pcm: np.ndarray) -> list:
+        """(pos, duration, pcm) of the windows to sign along with this one."""
+        jobs = [(pos, duration, pcm)]
+        for ahead, ahead_duration in self._window.upcoming(pos, _SIGNATURE_BATCH - 1):
+            if self.cached(ahead, ahead_duration) is not None:
+                continue
+            clip = self._audio.peek(ahead, ahead_duration)
+            if clip is None:
+                break
+            jobs.append((ahead, ahead_duration, clip))
+        return jobs
+
+    def store(self, jobs: list, sigs: list):
+        for (pos, duration, _pcm), sig in zip(jobs, sigs):
+            if sig is None:
+                continue
+            self._signed[(round(pos, 2), round(duration, 2))] = sig
+            if self._cache is not None:
+                self._cache.put(pos, duration, sig)
+        if self._cache is not None:
+            self._cache.save()
+
+    def signature_sync(self, pos: float, duration: float, pcm: np.ndarray):
+        """The window's Signature, signing a batch if needed; None if signing failed."""
+        sig = self.cached(pos, duration)
+        if sig is None:
+            jobs = self.batch(pos, duration, pcm)
+            sigs = signatures.sign([clip for _p, _d, clip in jobs], self._audio.sample_rate)
+            self.store(jobs, sigs)
+            sig = sigs[0]
+        return sig
+
+    async def signature(self, pos: float, duration: float, pcm: np.ndarray):
+        """signature_sync() for FingerprintEngine's event loop."""
+        sig = self.cached(pos, duration)
+        if sig is None:
+            jobs = self.batch(pos, duration, pcm)
+            sigs = await signatures.sign_batch(
+                [clip for _p, _d, clip in jobs], self._audio.sample_rate,
+            )
+            await asyncio.to_thread(self.store, jobs, sigs)
+            sig = sigs[0]
+        return sig
+
+    def finish(self, results: list):
+        """Keep the cache for a segment that may be retried; drop it once songs were found."""
+        if self._cache is None:
+            return
+        if results:
+            self._cache.discard()
+        else:
+            self._cache.save()
+
+
+def _window_signer(audio: _SegmentAudio, window, segment_id=None):
+    """A _WindowSigner for the segment, or None when clips are uploaded as audio."""
+    if not signatures.enabled():
+        return None
+    return _WindowSigner(audio, window, signatures.get_cache(segment_id, audio.source_path))
+
+
+def _extract_and_recognize(shazam_cls, audio: _SegmentAudio, pos, clip_duration, signer=None):
+    """Slice a clip from the decoded segment, look it up locally, else ask Shazam."""
+    from radios.analysis.audio_codec import _wav_bytes
+
+    pcm = audio.clip(pos, clip_duration)
+    if pcm is None:
+        return None
+    local = fingerprint_index.lookup(pcm, audio.sample_rate)
+    if local:
+        return local
+    if signer is not None:
+        sig = signer.signature_sync(pos, clip_duration, pcm)
+        if sig is not None:
+            return _recognize_sync(shazam_cls, sig)
+    return _recognize_sync(shazam_cls, _wav_bytes(pcm, audio.sample_rate))
 
-def _recognize_sync(shazam_cls, audio_path: str) -> Optional[FingerprintResult]:
+
+def _recognize_sync(shazam_cls, audio) -> Optional[FingerprintResult]:
     """
     Run ShazamIO's async recognize() from synchronous code.
 
-    Retries up to _RETRY_ATTEMPTS times with exponential back-off on any
-    exception (covers HTTP 429 / transient network errors from Shazam).
+    *audio* is a signatures.Signature, a file path or in-memory WAV bytes.
+
+    Every attempt first waits for a token from the host-wide rate limiter
+    (see rate_limiter.py), so all fingerprinting processes together stay
+    under FINGERPRINT_RATE_LIMIT.  Retries up to _RETRY_ATTEMPTS times with
+    exponential back-off on any exception (transient network errors).
     """
     try:
         loop = asyncio.get_running_loop()
     except RuntimeError:
         loop = None
 
+    limiter = get_rate_limiter()
     delay = _RETRY_BASE_DELAY
     for attempt in range(1, _RETRY_ATTEMPTS + 1):
+        wait = limiter.reserve()
+        if wait > 0:
+            time.sleep(wait)
         try:
             if loop and loop.is_running():
                 import concurrent.futures
                 with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
-                    future = pool.submit(asyncio.run, _recognize(shazam_cls, audio_path))
+                    future = pool.submit(asyncio.run, _recognize(shazam_cls, audio))
                     return future.result(timeout=120)
             else:
-                return asyncio.run(_recognize(shazam_cls, audio_path))
+                return asyncio.run(_recognize(shazam_cls, audio))
         except Exception as exc:
             if attempt == _RETRY_ATTEMPTS:
                 logger.error(
@@ -242,15 +648,22 @@ def _recognize_sync(shazam_cls, audio_path: str) -> Optional[FingerprintResult]:
     return None  # unreachable, satisfies type checker
 
 
-async def _recognize(shazam_cls, audio_path: str) -> Optional[FingerprintResult]:
-    """Call Shazam recognition and parse the response into a FingerprintResult."""
+async def _recognize(shazam_cls, audio) -> Optional[FingerprintResult]:
+    """Call Shazam recognition on a signature, a path or WAV bytes and parse the response."""
     shazam = get_shazam_client(shazam_cls)
     try:
-        response = await shazam.recognize(audio_path)
+        if isinstance(audio, signatures.Signature):
+            response = await shazam.send_recognize_request_v2(audio.request())
+        else:
+            response = await shazam.recognize(audio)
     except Exception as exc:
         logger.error("Shazam recognition failed: %s", exc)
         return None
+    return _parse_track(response)
+
 
+def _parse_track(response: dict) -> Optional[FingerprintResult]:
+    """Build a FingerprintResult from a Shazam recognize response (None = no match)."""
     track = response.get("track")
     if not track:
         return None
@@ -0,0 +1,216 @@
+"""
+Shared CNN inference scheduler for the real-time pipeline.
+
+Without it, every StreamProcessor classifier thread calls the CNN on its
+own 10 s window: N small batches that compete for the GIL and for
+TensorFlow's intra-op thread pool.  The scheduler instead owns the model:
+
+    StreamProcessor A ─┐
+    StreamProcessor B ─┼─ submit(window) ─→ per-stream queues
+    StreamProcessor C ─┘                         │
+                                     round-robin batch assembly
+                                                 │
+                         classify_features_batch() — one stacked tensor
+                                                 │
+                                 Future.set_result(labels) per window
+
+Batching policy:
+    - A batch is dispatched when MAX_BATCH windows are pending, or when the
+      oldest pending window has waited MAX_LATENCY seconds.
+    - Batches are assembled round-robin across streams (one window per
+      stream per round), so a stream with a backlog cannot starve others.
+
+Mel features are computed by the submitting thread, so the scheduler
+thread spends its time in the model only.
+
+Both limits are configurable per instance; record_and_segment reads them
+from the STREAM_INFERENCE_MAX_BATCH / STREAM_INFERENCE_MAX_LATENCY
+settings.
+"""
+
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+import numpy as np
+
+from radios.analysis.segmenter import _pcm_features, classify_features_batch
+
+logger = logging.getLogger("stream_processor")
+
+MAX_BATCH = 32       # windows per CNN call
+MAX_LATENCY = 1.0    # seconds a window may wait for batch-mates
+
+
+class _Request:
+    __slots__ = ("feats", "start_sec", "future", "submitted")
+
+    def __init__(self, feats: tuple, start_sec: float):
+        self.feats = feats
+        self.start_sec = start_sec
+        self.future = Future()
+        self.submitted = time.monotonic()
+
+
+class InferenceScheduler:
+    """
+    Single-threaded owner of the segmentation CNN, shared by all streams.
+
+    Thread-safe: any number of producer threads may call submit() or
+    classify(); inference itself always runs on the scheduler thread.
+    """
+
+    def __init__(self, max_batch: int = MAX_BATCH, max_latency: float = MAX_LATENCY):
+        self.max_batch = max(1, int(max_batch))
+        self.max_latency = max(0.0, float(max_latency))
+        self._queues: "collections.OrderedDict[object, collections.deque]" = (
+            collections.OrderedDict()
+        )
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        # Metrics
+        self.batches_run = 0
+        self.windows_classified = 0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+
+    # -- lifecycle -------------------------------------------------------------
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="inference-scheduler", daemon=True,
+        )
+        self._thread.start()
+        logger.info(
+            "Inference scheduler started (max_batch=%d, max_latency=%.2fs)",
+            self.max_batch, self.max_latency,
+        )
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the scheduler; pending requests are failed, not dropped silently."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+        with self._cond:
+            leftovers = [req for q in self._queues.values() for req in q]
+            self._queues.clear()
+            self._pending = 0
+        for req in leftovers:
+            req.future.set_exception(RuntimeError("Inference scheduler stopped"))
+
+    # -- producer API ----------------------------------------------------------
+
+    def submit(self, stream_key, samples: np.ndarray, start_sec: float = 0.0) -> Future:
+        """
+        Queue a PCM window for classification.
+
+        Returns a Future resolving to the (label, start, end) list that
+        classify_pcm() would have produced for the same window.
+        """
+        return self.submit_features(stream_key, _pcm_features(samples), start_sec)
+
+    def submit_features(self, stream_key, feats: tuple, start_sec: float = 0.0) -> Future:
+        """Queue precomputed (mspec, loge, difflen) features for classification."""
+        req = _Request(feats, start_sec)
+        with self._cond:
+            if not self._running:
+                req.future.set_exception(RuntimeError("Inference scheduler not running"))
+                return req.future
+            self._queues.setdefault(stream_key, collections.deque()).append(req)
+            self._pending += 1
+            self._cond.notify()
+        return req.future
+
+    def classify(self, stream_key, samples: np.ndarray, start_sec: float = 0.0,
+                 timeout: Optional[float] = None) -> list:
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(stream_key, samples, start_sec).result(timeout=timeout)
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return self._pending
+
+    # -- scheduler thread ------------------------------------------------------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._batch_ready():
+                    self._cond.wait(timeout=self._wait_timeout())
+                if not self._running:
+                    return
+                batch = self._take_batch()
+
+            self._run_batch(batch)
+
+    def _oldest_age(self) -> float:
+        now = time.monotonic()
+        return max(
+            (now - q[0].submitted for q in self._queues.values() if q),
+            default=0.0,
+        )
+
+    def _batch_ready(self) -> bool:
+        if self._pending == 0:
+            return False
+        return self._pending >= self.max_batch or self._oldest_age() >= self.max_latency
+
+    def _wait_timeout(self) -> Optional[float]:
+        if self._pending == 0:
+            return None
+        return max(0.0, self.max_latency - self._oldest_age())
+
+    def _take_batch(self) -> list:
+        """Round-robin one window per stream until the batch is full (lock held)."""
+        batch = []
+        while len(batch) < self.max_batch and self._pending:
+            for key in list(self._queues):
+                q = self._queues[key]
+                if q:
+                    batch.append(q.popleft())
+                    self._pending -= 1
+                # Rotate so the next batch starts with a different stream
+                self._queues.move_to_end(key)
+                if not q:
+                    del self._queues[key]
+                if len(batch) >= self.max_batch:
+                    break
+        return batch
+
+    def _run_batch(self, batch: list):
+        t0 = time.monotonic()
+        try:
+            results = classify_features_batch([(r.feats, r.start_sec) for r in batch])
+        except Exception as exc:
+            logger.exception("Inference batch of %d window(s) failed", len(batch))
+            for req in batch:
+                req.future.set_exception(exc)
+            return
+
+        for req, labels in zip(batch, results):
+            req.future.set_result(labels)
+
+        elapsed = time.monotonic() - t0
+        self.batches_run += 1
+        self.windows_classified += len(batch)
+        self.last_batch_size = len(batch)
+        self.last_batch_seconds = elapsed
+        logger.debug(
+            "Inference batch: %d window(s) in %.2fs (%d pending)",
+            len(batch), elapsed, self.pending,
+        )
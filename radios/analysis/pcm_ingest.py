@@ -0,0 +1,256 @@
+"""
+Multi-stream PCM ingestion with a constant number of threads.
+
+In the default mode every StreamProcessor owns two threads (PCM reader +
+classifier), so 200 streams cost 400 threads.  PCMIngestLoop replaces both
+for all registered processors:
+
+    ffmpeg stdout ─┐
+    ffmpeg stdout ─┼─ selector thread ─→ RollingPCMBuffer.append() per stream
+    ffmpeg stdout ─┘
+                        dispatch thread ─→ every CLASSIFY_INTERVAL per stream:
+                               │            cut window, compute features,
+                               │            InferenceScheduler.submit_*()
+                               └───────────← completions (Future callbacks)
+                                             → state machine feed
+
+    - The selector thread only moves bytes: non-blocking os.read() on
+      every readable pipe, no Python work beyond the ring-buffer append.
+    - The dispatch thread never waits on inference: windows are submitted
+      asynchronously and their results come back through a queue, so one
+      thread keeps any number of streams' windows in flight in the shared
+      CNN batch.  At most one window per stream is in flight, which keeps
+      each state machine fed in order.
+
+Per-stream throughput counters (bytes, reads, KiB/s) are kept and logged
+every STATS_INTERVAL seconds.
+
+Used by record_and_segment --ingest selector.
+"""
+
+import logging
+import os
+import queue
+import selectors
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger("stream_processor")
+
+READ_CHUNK_BYTES = 64 * 1024   # max bytes per os.read() (pipe buffer size)
+DISPATCH_INTERVAL = 0.5        # seconds between classification scans
+STATS_INTERVAL = 60.0          # seconds between throughput log lines
+UNREGISTER_TIMEOUT = 5.0       # max wait for the selector thread to drop a pipe
+
+
+class _StreamCounters:
+    __slots__ = ("bytes", "reads", "since", "window_bytes", "window_since")
+
+    def __init__(self):
+        now = time.monotonic()
+        self.bytes = 0
+        self.reads = 0
+        self.since = now
+        self.window_bytes = 0      # bytes since the last stats report
+        self.window_since = now
+
+    def add(self, n: int):
+        self.bytes += n
+        self.reads += 1
+        self.window_bytes += n
+
+    def snapshot(self, reset_window: bool = False) -> dict:
+        now = time.monotonic()
+        elapsed = max(now - self.window_since, 1e-9)
+        snap = {
+            "bytes": self.bytes,
+            "reads": self.reads,
+            "kib_per_sec": round(self.window_bytes / elapsed / 1024, 1),
+        }
+        if reset_window:
+            self.window_bytes = 0
+            self.window_since = now
+        return snap
+
+
+class PCMIngestLoop:
+    """
+    One selector thread + one dispatch thread shared by all StreamProcessors.
+
+    Processors call register() once their ffmpeg is running and
+    unregister() before tearing it down.
+    """
+
+    def __init__(self, dispatch_interval: float = DISPATCH_INTERVAL):
+        self.dispatch_interval = dispatch_interval
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+        self._lock = threading.Lock()
+        self._ops: list = []                # (op, processor, fd, done_event) for the selector thread
+        self._processors: dict = {}         # processor -> fd
+        self._counters: dict = {}           # stream key -> _StreamCounters
+        self._completions: queue.Queue = queue.Queue()
+        self._running = False
+        self._io_thread: Optional[threading.Thread] = None
+        self._dispatch_thread: Optional[threading.Thread] = None
+        self._last_stats = time.monotonic()
+
+    # -- lifecycle -------------------------------------------------------------
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._io_thread = threading.Thread(target=self._io_loop, name="pcm-ingest", daemon=True)
+        self._dispatch_thread = threading.Thread(
+            target=self._dispatch_loop, name="pcm-dispatch", daemon=True,
+        )
+        self._io_thread.start()
+        self._dispatch_thread.start()
+        logger.info("PCM ingest loop started")
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            self._running = False
+        self._wake()
+        self._completions.put(None)
+        for thread in (self._io_thread, self._dispatch_thread):
+            if thread and thread.is_alive():
+                thread.join(timeout=timeout)
+        self._selector.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    # -- registration ----------------------------------------------------------
+
+    def register(self, processor):
+        """Start reading *processor*'s ffmpeg stdout and scheduling its windows."""
+        fd = processor._ingest_fileno()
+        os.set_blocking(fd, False)
+        with self._lock:
+            self._processors[processor] = fd
+            self._counters[processor.stream.pk] = _StreamCounters()
+            self._ops.append(("register", processor, fd, None))
+        self._wake()
+
+    def unregister(self, processor):
+        """Stop reading/dispatching for *processor*; returns once the pipe is dropped."""
+        done = threading.Event()
+        with self._lock:
+            fd = self._processors.pop(processor, None)
+            if fd is None:
+                return
+            self._counters.pop(processor.stream.pk, None)
+            if not self._running:
+                done.set()
+            self._ops.append(("unregister", processor, fd, done))
+        self._wake()
+        if not done.wait(timeout=UNREGISTER_TIMEOUT):
+            logger.warning("PCM ingest loop did not drop pipe of %s in time", processor.stream)
+
+    def stats(self) -> dict:
+        """Per-stream throughput counters, keyed by stream id."""
+        with self._lock:
+            return {key: c.snapshot() for key, c in self._counters.items()}
+
+    # -- selector thread -------------------------------------------------------
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b"\0")
+        except OSError:
+            pass  # already signalled (pipe full) or loop stopped
+
+    def _apply_ops(self):
+        with self._lock:
+            ops, self._ops = self._ops, []
+        for op, processor, fd, done in ops:
+            if op == "register":
+                try:
+                    self._selector.register(fd, selectors.EVENT_READ, processor)
+                except (KeyError, ValueError, OSError):
+                    logger.exception("PCM ingest loop could not watch %s", processor.stream)
+            else:
+                try:
+                    self._selector.unregister(fd)
+                except (KeyError, ValueError):
+                    pass
+                done.set()
+
+    def _io_loop(self):
+        while True:
+            with self._lock:
+                if not self._running:
+                    break
+            for key, _mask in self._selector.select(timeout=1.0):
+                processor = key.data
+                if processor is None:
+                    try:
+                        while os.read(self._wake_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._read(key.fd, processor)
+            self._apply_ops()
+        self._apply_ops()   # release any unregister() waiters
+
+    def _read(self, fd: int, processor):
+        try:
+            data = os.read(fd, READ_CHUNK_BYTES)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            # ffmpeg exited; the processor's tick() notices and restarts it
+            self._selector.unregister(fd)
+            return
+        counters = self._counters.get(processor.stream.pk)
+        if counters is not None:
+            counters.add(len(data))
+        processor._ingest(data)
+
+    # -- dispatch thread -------------------------------------------------------
+
+    def _dispatch_loop(self):
+        while True:
+            deadline = time.monotonic() + self.dispatch_interval
+            # Drain completions until the next scan is due
+            while True:
+                try:
+                    item = self._completions.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    return
+                processor, window, future = item
+                processor._complete_window(window, future)
+
+            with self._lock:
+                if not self._running:
+                    return
+                processors = list(self._processors)
+            for processor in processors:
+                processor._dispatch_window(self._completions)
+
+            self._maybe_log_stats()
+
+    def _maybe_log_stats(self):
+        now = time.monotonic()
+        if now - self._last_stats < STATS_INTERVAL:
+            return
+        self._last_stats = now
+        with self._lock:
+            snaps = {key: c.snapshot(reset_window=True) for key, c in self._counters.items()}
+        if snaps:
+            logger.info(
+                "PCM ingest: %d stream(s), %.1f KiB/s total; per stream: %s",
+                len(snaps), sum(s["kib_per_sec"] for s in snaps.values()), snaps,
+            )
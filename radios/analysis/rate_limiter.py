@@ -0,0 +1,152 @@
+"""
+Host-wide token bucket for the Shazam API, with adaptive 429 backoff.
+
+Every fingerprinting process on the host (fingerprint_recordings workers,
+analyze_recordings) draws from one bucket whose state lives in a small
+JSON file guarded by flock(), so together they stay under
+FINGERPRINT_RATE_LIMIT requests/s no matter how many workers run:
+
+    reserve()          take a token; returns how long to wait before sending
+    on_success()       a request went through: creep back up to the limit
+    on_rate_limited()  HTTP 429: halve the rate, back off exponentially,
+                       and block every worker until the backoff has passed
+
+The rate adapts AIMD-style (additive increase, multiplicative decrease),
+so the workers settle just under whatever rate Shazam currently accepts
+instead of idling on a fixed delay.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:   # not POSIX: the bucket is per process only
+    fcntl = None
+
+logger = logging.getLogger("broadcast_analysis")
+
+RATE_LIMIT_DEFAULT = 1.0      # requests/s across all workers
+BURST_DEFAULT = 3             # requests that may go out back to back
+MIN_RATE_FRACTION = 0.05      # adaptive rate floor, as a fraction of the limit
+RECOVERY_FRACTION = 0.05      # rate regained per successful request
+BACKOFF_BASE = 10.0           # first 429 pause (s), doubled per further 429
+BACKOFF_MAX = 300.0           # 429 pause cap (s)
+STATE_FILENAME = "aum_fingerprint_rate.json"
+
+
+class RateLimited(Exception):
+    """The API answered HTTP 429."""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__(f"rate limited (retry after {retry_after}s)" if retry_after else "rate limited")
+        self.retry_after = retry_after
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state is shared through *path* by all processes.
+
+    State: tokens (negative = requests already queued), the current
+    adaptive rate, the current 429 backoff and the time until which all
+    requests are held back.  Wall-clock time is used so every process
+    agrees on it.
+    """
+
+    def __init__(self, path: str, rate: float = RATE_LIMIT_DEFAULT, burst: int = BURST_DEFAULT):
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.path = path
+        self.max_rate = rate
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns the seconds to wait before sending the request."""
+        def take(state, now):
+            state["tokens"] -= 1
+            wait = max(0.0, -state["tokens"] / state["rate"])
+            return max(wait, state["blocked_until"] - now)
+        return self._update(take)
+
+    def on_success(self) -> None:
+        def recover(state, now):
+            state["rate"] = min(self.max_rate, state["rate"] + self.max_rate * RECOVERY_FRACTION)
+            state["backoff"] = 0.0
+        self._update(recover)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """Record a 429; returns the pause now imposed on every worker."""
+        def slow_down(state, now):
+            state["rate"] = max(self.max_rate * MIN_RATE_FRACTION, state["rate"] / 2)
+            state["backoff"] = min(BACKOFF_MAX, max(BACKOFF_BASE, state["backoff"] * 2))
+            pause = max(state["backoff"], retry_after or 0.0)
+            state["blocked_until"] = max(state["blocked_until"], now + pause)
+            state["tokens"] = min(state["tokens"], 0.0)
+            return pause
+        pause = self._update(slow_down)
+        logger.warning("Shazam rate limit hit -- all fingerprint workers pause %.0fs", pause)
+        return pause
+
+    def state(self) -> dict:
+        return self._update(lambda state, now: dict(state))
+
+    def _update(self, fn):
+        """Apply fn(state, now) to the refilled shared state under the file lock."""
+        with self._lock, open(self.path, "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.time()
+                rate = min(self.max_rate, state.get("rate", self.max_rate))
+                elapsed = max(0.0, now - state.get("updated", now))
+                state = {
+                    "tokens": min(self.burst, state.get("tokens", self.burst) + elapsed * rate),
+                    "rate": rate,
+                    "backoff": state.get("backoff", 0.0),
+                    "blocked_until": state.get("blocked_until", 0.0),
+                    "updated": now,
+                }
+                result = fn(state, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return result
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_limiter: Optional[SharedTokenBucket] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> SharedTokenBucket:
+    """The process-wide SharedTokenBucket configured from the Django settings."""
+    global _limiter
+
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                from django.conf import settings
+
+                path = getattr(settings, "FINGERPRINT_RATE_STATE_FILE", None) or os.path.join(
+                    tempfile.gettempdir(), STATE_FILENAME,
+                )
+                _limiter = SharedTokenBucket(
+                    str(path),
+                    rate=getattr(settings, "FINGERPRINT_RATE_LIMIT", RATE_LIMIT_DEFAULT),
+                    burst=getattr(settings, "FINGERPRINT_RATE_BURST", BURST_DEFAULT),
+                )
+    return _limiter
@@ -0,0 +1,161 @@
+"""
+Sidecar cache of the expensive half of segmentation.
+
+segment_audio() has two halves: decode + CNN + energy + spectral flux,
+which take seconds to minutes per recording, and consolidation +
+boundary refinement, which take milliseconds and are what
+SEGMENT_MIN_DURATION, tune.py's grid search and most code changes affect.
+The first half's output -- the raw CNN labels with their energy, and the
+unsmoothed flux envelope -- is stored per recording in a compressed .npz
+file, so re-segmenting (--retry-failed, a parameter change, every
+tune.py grid combination) skips straight to the second half.
+
+An entry is only used if it matches:
+    - the recording's content hash (BLAKE2b of the file bytes), so a
+      re-recorded or edited file is classified again;
+    - the model version (inaSpeechSegmenter release + CNN precision);
+    - the flux frame grid (FLUX_HOP_SEC / FLUX_WIN_SEC) and CACHE_FORMAT.
+
+Files live next to the recording (<recording>.seg.npz) or, with
+SEGMENT_CACHE_DIR set, in that directory as <hash>.npz.  SEGMENT_CACHE =
+False turns the cache off.  Whoever deletes a recording file calls
+discard() first, so its entry does not outlive it.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("broadcast_analysis")
+
+CACHE_FORMAT = 1
+SIDECAR_SUFFIX = ".seg.npz"
+HASH_BLOCK_BYTES = 1 << 20
+
+_digests: dict = {}        # (path, size, mtime_ns) -> hex digest
+_digests_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    from django.conf import settings
+
+    return bool(getattr(settings, "SEGMENT_CACHE", True))
+
+
+def file_digest(path: str) -> str:
+    """BLAKE2b-128 of the file's bytes (memoized per size and mtime)."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        with _digests_lock:
+            _digests[key] = digest
+    return digest
+
+
+def cache_path(audio_path: str, digest: str) -> str:
+    from django.conf import settings
+
+    cache_dir = getattr(settings, "SEGMENT_CACHE_DIR", None)
+    if cache_dir:
+        return os.path.join(str(cache_dir), f"{digest}.npz")
+    return f"{audio_path}{SIDECAR_SUFFIX}"
+
+
+def load(audio_path: str, model_version: str, grid: str) -> Optional[tuple]:
+    """
+    Cached (labels, flux, duration) for *audio_path*, or None on a miss.
+
+    *labels* is a list of (label, start, end, energy_db) tuples, *flux*
+    the unsmoothed spectral flux.  *grid* describes the flux frame grid.
+    """
+    try:
+        digest = file_digest(audio_path)
+    except OSError:
+        return None
+    path = cache_path(audio_path, digest)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if (int(data["format"]) != CACHE_FORMAT or str(data["digest"]) != digest
+                    or str(data["model"]) != model_version or str(data["grid"]) != grid):
+                return None
+            names = [str(n) for n in data["label_names"]]
+            labels = [
+                (names[k], float(s), float(e), float(db))
+                for k, s, e, db in zip(data["labels"], data["starts"], data["ends"], data["energy_db"])
+            ]
+            flux = data["flux"]
+            duration = float(data["duration"])
+    except Exception as exc:
+        logger.warning("Ignoring unreadable segmentation cache %s: %s", path, exc)
+        return None
+    logger.info("Segmentation cache hit for %s", audio_path)
+    return labels, flux, duration
+
+
+def store(audio_path: str, labels: list, flux: np.ndarray, duration: float,
+          model_version: str, grid: str) -> Optional[str]:
+    """
+    Write the cache entry for *audio_path* (same data as load() returns).
+
+    Written atomically; failures are logged and ignored.  Returns the
+    cache file path, or None if nothing was written.
+    """
+    try:
+        digest = file_digest(audio_path)
+        path = cache_path(audio_path, digest)
+        names = sorted({label for label, _s, _e, _db in labels})
+        index = {name: k for k, name in enumerate(names)}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f,
+                format=np.int32(CACHE_FORMAT),
+                digest=np.str_(digest),
+                model=np.str_(model_version),
+                grid=np.str_(grid),
+                duration=np.float64(duration),
+                label_names=np.array(names, dtype=str),
+                labels=np.array([index[lab] for lab, _s, _e, _db in labels], dtype=np.uint8),
+                starts=np.array([s for _l, s, _e, _db in labels], dtype=np.float64),
+                ends=np.array([e for _l, _s, e, _db in labels], dtype=np.float64),
+                energy_db=np.array([db for _l, _s, _e, db in labels], dtype=np.float64),
+                flux=np.asarray(flux, dtype=np.float64),   # 4 values per second
+            )
+        os.replace(tmp, path)
+    except OSError as exc:
+        logger.warning("Cannot write segmentation cache for %s: %s", audio_path, exc)
+        return None
+    return path
+
+
+def discard(audio_path: str):
+    """Remove the cache entry of *audio_path* (call before deleting the recording file)."""
+    from django.conf import settings
+
+    paths = [f"{audio_path}{SIDECAR_SUFFIX}"]
+    if getattr(settings, "SEGMENT_CACHE_DIR", None):
+        try:
+            paths.append(cache_path(audio_path, file_digest(audio_path)))
+        except OSError:
+            pass
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.warning("Cannot remove segmentation cache %s: %s", path, exc)
@@ -60,18 +60,25 @@ SEGMENT_MIN_DURATION  (float, default 15.0)
     if you need finer granularity.  Recommended range: 10 -- 30.
 
 Dependencies: inaSpeechSegmenter, tensorflow-cpu, numpy, ffmpeg (+ ffprobe)
+(onnxruntime instead of tensorflow-cpu once a model snapshot is exported,
+see segmenter_snapshot.py)
+(decode / probe / cut go through audio_codec, which uses PyAV when installed)
 """
 
+import concurrent.futures
 import dataclasses
-import json
+import heapq
+import importlib.metadata
 import logging
 import os
-import subprocess
-import tempfile
+import threading
 from typing import List, Optional
 
 import numpy as np
 
+from radios.analysis import audio_codec, segment_cache
+from radios.analysis.segmenter_snapshot import ina_module
+
 logger = logging.getLogger("broadcast_analysis")
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "1"   # suppress INFO
@@ -112,6 +119,10 @@ FLUX_WIN_SEC = 0.5
 # Range: 0.5–4.0 s.  Larger = smoother but less precise boundary location.
 FLUX_SMOOTH_SEC = 1.0
 
+# Frames per batched FFT call.  Small enough for a block (~4 MB of float64
+# frames at 64) to stay in cache, large enough to amortise per-call overhead.
+FLUX_BLOCK_FRAMES = 64
+
 # -- Boundary refinement -------------------------------------------------
 
 # Search radius around each consolidated boundary (seconds).
@@ -128,11 +139,42 @@ REFINE_SEARCH_RADIUS = 10.0
 # Range: 1.0–10.0 s.
 PROXIMITY_SIGMA = 5.0
 
+# -- Long files ----------------------------------------------------------
+
+# Files longer than this (seconds) are decoded and classified in chunks so
+# peak memory does not grow with the file length (~80 MB at 10 min chunks
+# versus ~1.4 GB for a 6 h file decoded whole).
+# Overridable via Django setting SEGMENT_STREAMING_THRESHOLD; 0 disables.
+STREAMING_THRESHOLD_DEFAULT = 3600.0
+
+# Lowest bitrate (bit/s) expected of a recording.  A file too small to last
+# SEGMENT_STREAMING_THRESHOLD seconds even at this rate is classified whole
+# without probing its duration (one ffprobe run saved per file).
+STREAMING_MIN_BITRATE = 16000
+
+# Chunk length (seconds) classified per CNN call in chunked mode.
+STREAMING_CHUNK_SEC = 600.0
+
+# Audio (seconds) added on each side of a chunk so the CNN sees across the
+# chunk edge; only labels inside the chunk itself are kept.
+STREAMING_CHUNK_CONTEXT = 5.0
+
+# -- Batch segmentation (segment_audio_batch) ------------------------------
+
+# Audio (seconds) whose CNN patches are stacked into one model call.
+# Stacked patches take on the order of 1 GB per hour of audio, so this
+# bounds peak memory.
+BATCH_MAX_SECONDS = 3600.0
+
+# Threads decoding files and computing their features in parallel.
+BATCH_FEATURE_WORKERS = min(8, os.cpu_count() or 2)
+
 # -----------------------------------------------------------------------
 
 # Lazy-loaded singleton -- the Segmenter is expensive to initialise
 # (loads CNN weights), so we create it once and reuse across calls.
 _segmenter_instance = None
+_segmenter_lock = threading.Lock()   # prefetch threads look up the cache too
 
 
 @dataclasses.dataclass
@@ -151,6 +193,7 @@ class AudioSegment:
 def segment_audio(
     audio_path: str,
     save_dir: Optional[str] = None,
+    pcm_samples: Optional[np.ndarray] = None,
 ) -> List[AudioSegment]:
     """
     Segment an audio file into speech / music / noise / noEnergy.
@@ -165,28 +208,210 @@ def segment_audio(
         also unset or empty, segments are not written to disk.
         Within *save_dir* a sub-directory named after the source file stem is
         created automatically (e.g. ``<save_dir>/test_1/``).
+    pcm_samples : ndarray or None
+        The file already decoded by decode_for_segmentation() (e.g. by a
+        prefetch thread); skips the decode.
+
+    The file is decoded to 16 kHz PCM exactly once; that buffer feeds the
+    CNN, the energy and the boundary refinement, and its length is the
+    duration.  Files longer than SEGMENT_STREAMING_THRESHOLD seconds are
+    decoded and classified chunk by chunk instead (see _classify_chunked),
+    keeping peak memory independent of the file length.
+
+    The classification (CNN labels, energy, spectral flux) is cached in a
+    sidecar file (see segment_cache.py); re-segmenting an unchanged file
+    only re-runs consolidation and boundary refinement.
     """
+    result = _cached_result(audio_path)
+    if result is None:
+        if pcm_samples is not None:
+            result = _classify_whole(audio_path, pcm_samples)
+        elif _use_chunked(audio_path):
+            result = _classify_chunked(audio_path)
+        else:
+            result = _classify_whole(audio_path)
+        if result is None:
+            return []
+        _store_result(audio_path, result)
+    return _finish_segments(audio_path, result, save_dir)
+
+
+def segment_audio_batch(
+    audio_paths: List[str],
+    save_dir: Optional[str] = None,
+    max_batch_seconds: float = BATCH_MAX_SECONDS,
+    workers: int = BATCH_FEATURE_WORKERS,
+) -> List[List[AudioSegment]]:
+    """
+    Segment several files, sharing CNN calls between them.
+
+    Files are grouped so that one group holds at most *max_batch_seconds*
+    of audio.  Per group, decoding and feature extraction run on *workers*
+    threads, the CNN patches of every file are stacked into one
+    classify_features_batch() call (large model batches instead of one
+    small batch per file), and the labels are split back per file.  Each
+    file then gets the same post-processing as in segment_audio().
+
+    Files above SEGMENT_STREAMING_THRESHOLD go through segment_audio()
+    on their own (chunked), as do files with a cached classification.
+    Returns one segment list per input path, in order ([] for files that
+    failed).
+    """
+    results: List[List[AudioSegment]] = [[] for _ in audio_paths]
+    if not audio_paths:
+        return results
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="segment-features",
+    ) as pool:
+        durations = list(pool.map(_get_duration, audio_paths))
+
+        groups: List[list] = []
+        group_seconds = max_batch_seconds
+        for i, (path, duration) in enumerate(zip(audio_paths, durations)):
+            if duration <= 0:
+                continue   # unreadable: segment_audio() would fail too
+            cached = _cached_result(path)
+            if cached is not None:
+                results[i] = _finish_segments(path, cached, save_dir)
+                continue
+            if _is_long(duration):
+                results[i] = segment_audio(path, save_dir=save_dir)
+                continue
+            if group_seconds + duration > max_batch_seconds:
+                groups.append([])
+                group_seconds = 0.0
+            groups[-1].append(i)
+            group_seconds += duration
+
+        for group in groups:
+            prepared = list(pool.map(_decode_with_features, (audio_paths[i] for i in group)))
+            ok = [(i, p) for i, p in zip(group, prepared) if p is not None]
+            if not ok:
+                continue
+            try:
+                labels = classify_features_batch([(feats, 0.0) for _i, (_pcm, feats) in ok])
+            except Exception as exc:
+                logger.error(
+                    "inaSpeechSegmenter batch of %d file(s) failed: %s", len(ok), exc,
+                )
+                continue
+            logger.info(
+                "Batch-classified %d file(s) (%.0fs of audio) in one CNN pass",
+                len(ok), sum(durations[i] for i, _p in ok),
+            )
+            for (i, (pcm, _feats)), raw in zip(ok, labels):
+                result = _whole_result(raw, pcm)
+                if result is not None:
+                    _store_result(audio_paths[i], result)
+                    results[i] = _finish_segments(audio_paths[i], result, save_dir)
+    return results
+
+
+def _decode_with_features(audio_path: str) -> Optional[tuple]:
+    """Worker thread: (pcm, CNN features) for *audio_path*, or None on failure."""
+    pcm = _load_pcm(audio_path)
+    if pcm is None:
+        return None
+    return pcm, _pcm_features(pcm)
+
+
+def _finish_segments(audio_path: str, result: tuple, save_dir: Optional[str]) -> List[AudioSegment]:
+    """Consolidate, refine, optionally save and log a classified file."""
     from django.conf import settings
 
-    duration = _get_duration(audio_path)
-    if duration <= 0:
-        return []
+    segments, flux, duration = result
+    if len(flux):
+        flux = _smooth_flux(flux)
 
-    # --- Run inaSpeechSegmenter CNN ---
-    segmenter = _get_segmenter()
+    # --- Consolidate into broadcast-scale blocks ---
+    min_seg = getattr(settings, "SEGMENT_MIN_DURATION", SEGMENT_MIN_DURATION_DEFAULT)
+    segments = _consolidate_segments(segments, min_dur=min_seg)
+
+    # --- Refine boundaries using spectral flux ---
+    segments = _refine_boundaries(
+        segments, None, search_radius=REFINE_SEARCH_RADIUS, flux=flux,
+    )
+
+    # --- Optionally save segments to disk ---
+    effective_save_dir = save_dir or getattr(settings, "SEGMENT_SAVE_DIR", None)
+    if effective_save_dir:
+        segments = _save_segments_to_disk(segments, audio_path, effective_save_dir)
+
+    _log_summary(audio_path, duration, segments)
+    return segments
+
+
+def decode_for_segmentation(audio_path: str) -> Optional[np.ndarray]:
+    """
+    Decode *audio_path* for a later segment_audio(audio_path, pcm_samples=...).
+
+    Returns None for files segment_audio() would process in chunks (longer
+    than SEGMENT_STREAMING_THRESHOLD), that have a cached classification
+    or that fail to decode; segment_audio() then decodes if it needs to.
+    """
+    if _use_chunked(audio_path) or _cached_result(audio_path) is not None:
+        return None
+    return _load_pcm(audio_path)
+
+
+def _use_chunked(audio_path: str) -> bool:
+    """
+    True if the file is long enough for chunked segmentation.
+
+    The duration is only probed when the threshold is set and the file is
+    big enough to possibly exceed it (see STREAMING_MIN_BITRATE).
+    """
+    from django.conf import settings
+
+    threshold = getattr(settings, "SEGMENT_STREAMING_THRESHOLD", STREAMING_THRESHOLD_DEFAULT)
+    if not threshold:
+        return False
+    try:
+        if os.path.getsize(audio_path) * 8 / STREAMING_MIN_BITRATE <= threshold:
+            return False
+    except OSError:
+        pass   # let the probe decide
+    return _is_long(_get_duration(audio_path))
+
+
+def _is_long(duration: float) -> bool:
+    from django.conf import settings
+
+    threshold = getattr(settings, "SEGMENT_STREAMING_THRESHOLD", STREAMING_THRESHOLD_DEFAULT)
+    return bool(threshold) and duration > threshold
+
+
+def _classify_whole(audio_path: str, pcm_samples: Optional[np.ndarray] = None) -> Optional[tuple]:
+    """
+    Decode the whole file once (unless *pcm_samples* is given) and classify it.
+
+    Returns (raw AudioSegments with energy, unsmoothed spectral flux,
+    duration), or None if decoding or classification failed.
+    """
+    # --- Decode once: this PCM feeds duration, CNN, energy and flux ---
+    if pcm_samples is None:
+        pcm_samples = _load_pcm(audio_path)
+    if pcm_samples is None:
+        return None
+
+    # --- Run inaSpeechSegmenter CNN on the decoded PCM ---
     try:
-        raw_segments = segmenter(audio_path)
+        raw_segments = classify_pcm(pcm_samples)
     except Exception as exc:
         logger.error("inaSpeechSegmenter failed on %s: %s", audio_path, exc)
-        return []
+        return None
 
-    if not raw_segments:
-        return []
+    return _whole_result(raw_segments, pcm_samples)
 
-    # --- Convert to PCM for energy calculation and boundary refinement ---
-    pcm_samples = _load_pcm(audio_path)
 
-    # --- Correct any timestamp drift between INA and our PCM ---
+def _whole_result(raw_segments: list, pcm_samples: np.ndarray) -> Optional[tuple]:
+    """_classify_whole()'s result from the CNN labels of the whole file."""
+    if not raw_segments:
+        return None
+    duration = len(pcm_samples) / SAMPLE_RATE
+
+    # --- Guard against any residual timestamp drift vs. the PCM time base ---
     raw_segments = _correct_timestamp_drift(raw_segments, pcm_samples, duration)
 
     # --- Build AudioSegment list with energy ---
@@ -200,20 +425,150 @@ def segment_audio(
             energy_db=round(energy, 1),
         ))
 
-    # --- Consolidate into broadcast-scale blocks ---
-    min_seg = getattr(settings, "SEGMENT_MIN_DURATION", SEGMENT_MIN_DURATION_DEFAULT)
-    segments = _consolidate_segments(segments, min_dur=min_seg)
+    return segments, _raw_spectral_flux(pcm_samples), duration
 
-    # --- Refine boundaries using spectral flux ---
-    segments = _refine_boundaries(segments, pcm_samples, search_radius=REFINE_SEARCH_RADIUS)
 
-    # --- Optionally save segments to disk ---
-    effective_save_dir = save_dir or getattr(settings, "SEGMENT_SAVE_DIR", None)
-    if effective_save_dir:
-        segments = _save_segments_to_disk(segments, audio_path, effective_save_dir)
+def _cached_result(audio_path: str) -> Optional[tuple]:
+    """_classify_whole()'s result from the sidecar cache, or None on a miss."""
+    if not segment_cache.enabled():
+        return None
+    cached = segment_cache.load(audio_path, _model_version(), _flux_grid())
+    if cached is None:
+        return None
+    labels, flux, duration = cached
+    segments = [
+        AudioSegment(start=start, end=end, segment_type=label, energy_db=energy)
+        for label, start, end, energy in labels
+    ]
+    return segments, flux, duration
 
-    _log_summary(audio_path, duration, segments)
-    return segments
+
+def _store_result(audio_path: str, result: tuple) -> None:
+    if not segment_cache.enabled():
+        return
+    segments, flux, duration = result
+    segment_cache.store(
+        audio_path,
+        [(s.segment_type, s.start, s.end, s.energy_db) for s in segments],
+        flux, duration, _model_version(), _flux_grid(),
+    )
+
+
+def _model_version() -> str:
+    """
+    Identifies the CNN output for the cache: inaSpeechSegmenter release + precision.
+
+    Read from the loaded model (loaded here if needed), so a lookup uses the
+    same key as the store after a miss -- also when a reduced-precision
+    variant fell back to float32 or the snapshot came from another release.
+    """
+    meta = getattr(_get_segmenter(), "meta", None)
+    if meta is not None:
+        return f"ina-{meta.get('ina_version')}/{meta.get('precision', 'float32')}"
+    try:
+        version = importlib.metadata.version("inaSpeechSegmenter")
+    except importlib.metadata.PackageNotFoundError:
+        version = "unknown"
+    return f"ina-{version}/float32"   # Keras model
+
+
+def _flux_grid() -> str:
+    return f"{SAMPLE_RATE}/{FLUX_HOP_SEC}/{FLUX_WIN_SEC}"
+
+
+def _classify_chunked(
+    audio_path: str,
+    chunk_sec: float = STREAMING_CHUNK_SEC,
+    context_sec: float = STREAMING_CHUNK_CONTEXT,
+) -> Optional[tuple]:
+    """
+    Classify a long file one chunk at a time with bounded memory.
+
+    Each chunk [c0, c1) is decoded with *context_sec* of audio on both
+    sides and classified on its own; only labels inside [c0, c1) are kept
+    and a label continuing across the chunk edge is stitched back into one
+    segment.  Drift correction is applied per chunk against that chunk's
+    PCM, so it cannot accumulate over the file.  The spectral flux is
+    extended chunk by chunk (4 values per second are all that is kept).
+
+    Same return value as _classify_whole().
+    """
+    flux = IncrementalSpectralFlux(history=None)
+    pieces: list = []          # [label, start, end, energy_db]
+    c0 = 0.0
+    duration = 0.0
+
+    while True:
+        r0 = max(0.0, c0 - context_sec)
+        r1 = c0 + chunk_sec + context_sec
+        pcm_int16 = audio_codec.decode_pcm(audio_path, SAMPLE_RATE, r0, r1)
+        if pcm_int16 is None or len(pcm_int16) == 0:
+            if c0 == 0.0:
+                return None
+            break
+        # One frame of slack for decoders that stop a few samples short
+        available = r0 + len(pcm_int16) / SAMPLE_RATE
+        last = available < r1 - 0.05
+        c1 = available if last else c0 + chunk_sec
+        if c1 <= c0:
+            break
+        duration = c1
+
+        first_sample = int(round(r0 * SAMPLE_RATE))
+        flux.update(
+            first_sample + min(len(pcm_int16), int(round((c1 - r0) * SAMPLE_RATE))),
+            lambda lo, hi: (
+                pcm_int16[lo - first_sample:hi - first_sample] if lo >= first_sample else None
+            ),
+        )
+
+        pcm = pcm_int16.astype(np.float32) / 32768.0
+        del pcm_int16
+        try:
+            labels = classify_pcm(pcm)
+        except Exception as exc:
+            logger.error(
+                "inaSpeechSegmenter failed on %s [%.0f-%.0fs]: %s", audio_path, c0, c1, exc,
+            )
+            return None
+        labels = _correct_timestamp_drift(labels, pcm, len(pcm) / SAMPLE_RATE)
+
+        for label, start, end in labels:
+            start, end = max(start + r0, c0), min(end + r0, c1)
+            if end <= start:
+                continue
+            energy = _compute_energy_db(pcm, start - r0, end - r0)
+            prev = pieces[-1] if pieces else None
+            if prev and prev[0] == label and abs(prev[2] - start) < 1e-6:
+                # Same label across the chunk edge: one segment, power-weighted energy
+                w0, w1 = prev[2] - prev[1], end - start
+                power = (w0 * 10 ** (prev[3] / 10) + w1 * 10 ** (energy / 10)) / (w0 + w1)
+                prev[2], prev[3] = end, 10 * np.log10(power)
+            else:
+                pieces.append([label, start, end, energy])
+
+        logger.debug("Chunked segmentation of %s: classified %.0f-%.0fs", audio_path, c0, c1)
+        if last:
+            break
+        c0 = c1
+
+    if not pieces:
+        return None
+
+    segments = [
+        AudioSegment(
+            start=round(start, 2),
+            end=round(end, 2),
+            segment_type=label,
+            energy_db=round(float(energy), 1),
+        )
+        for label, start, end, energy in pieces
+    ]
+    raw, _ = flux.raw()
+    logger.info(
+        "Chunked segmentation of %s: %.0fs in %.0fs chunks", audio_path, duration, chunk_sec,
+    )
+    return segments, raw, duration
 
 
 # -----------------------------------------------------------------------
@@ -226,43 +581,359 @@ def _get_segmenter():
 
     Uses vad_engine='smn' for speech/music/noise classification.
     Gender detection is off -- we only need content-type labels.
+
+    If SEGMENTER_SNAPSHOT_PATH holds an ONNX snapshot of the same CNN
+    (see segmenter_snapshot.py), it is used instead of the Keras model,
+    at SEGMENT_MODEL_PRECISION (float32, int8 or float16).
     """
     global _segmenter_instance
 
-    if _segmenter_instance is None:
-        from inaSpeechSegmenter import Segmenter
-        logger.info("Initialising inaSpeechSegmenter (first call, loading CNN weights)...")
-        _segmenter_instance = Segmenter(
-            vad_engine='smn',
-            detect_gender=False,
+    with _segmenter_lock:
+        if _segmenter_instance is None:
+            from django.conf import settings
+            from radios.analysis.segmenter_snapshot import load_snapshot
+
+            # Prebuilt ONNX snapshot (export_segmenter_model): no TensorFlow import
+            precision = getattr(settings, "SEGMENT_MODEL_PRECISION", "float32")
+            _segmenter_instance = load_snapshot(
+                getattr(settings, "SEGMENTER_SNAPSHOT_PATH", None), precision,
+            )
+            if _segmenter_instance is None and precision != "float32":
+                logger.warning(
+                    "SEGMENT_MODEL_PRECISION=%s needs a model snapshot "
+                    "(python manage.py export_segmenter_model) -- using float32", precision,
+                )
+
+        if _segmenter_instance is None:
+            from inaSpeechSegmenter import Segmenter
+            logger.info("Initialising inaSpeechSegmenter (first call, loading CNN weights)...")
+            _segmenter_instance = Segmenter(
+                vad_engine='smn',
+                detect_gender=False,
+            )
+            logger.info(
+                "inaSpeechSegmenter ready (run export_segmenter_model for a faster warm start).",
+            )
+
+        return _segmenter_instance
+
+
+# -----------------------------------------------------------------------
+# In-process classification (no temp files, no ffmpeg)
+# -----------------------------------------------------------------------
+
+def _pcm_features(samples: np.ndarray) -> tuple:
+    """
+    Compute the CNN input features from 16kHz mono float32 PCM.
+
+    Mirrors inaSpeechSegmenter's own decode step (24-band mel spectrogram
+    + log energy, 10 ms hop) on an in-memory array, so callers that
+    already hold PCM skip the WAV round-trip and the ffmpeg decode.
+
+    Returns (mspec, loge, difflen) as expected by Segmenter.segment_feats().
+    """
+    import warnings
+
+    mfcc = ina_module("sidekit_mfcc").mfcc
+
+    with warnings.catch_warnings():
+        # Digital silence yields log(0) -- INA ignores the same warning
+        warnings.filterwarnings(
+            "ignore", message="divide by zero encountered in log", category=RuntimeWarning,
+        )
+        _, loge, _, mspec = mfcc(samples.astype(np.float32, copy=False), get_mspec=True)
+
+    # Inputs shorter than one CNN patch (68 frames) are padded like INA does
+    difflen = 0
+    if len(loge) < 68:
+        difflen = 68 - len(loge)
+        mspec = np.concatenate((mspec, np.ones((difflen, 24)) * np.min(mspec)))
+
+    return mspec, loge, difflen
+
+
+def classify_pcm(samples: np.ndarray, start_sec: float = 0.0) -> list:
+    """
+    Classify in-memory 16kHz mono float32 PCM with the loaded CNN.
+
+    Equivalent to calling the Segmenter on a file holding the same audio,
+    minus the file: features are computed in-process and fed straight to
+    the Keras model.  Returns (label, start, end) tuples in seconds,
+    offset by *start_sec*.
+    """
+    return classify_pcm_batch([(samples, start_sec)])[0]
+
+
+def classify_pcm_batch(items: list) -> list:
+    """
+    Classify several independent PCM windows with a single CNN call.
+
+    *items* is a list of (samples, start_sec) pairs -- typically windows
+    from different streams.  The CNN patches of all windows are stacked
+    into one tensor so TensorFlow runs a few large batches instead of
+    many small ones; the predictions are then split back per window and
+    Viterbi-decoded independently.
+
+    Returns one list of (label, start, end) tuples per input, in order.
+    """
+    return classify_features_batch([
+        (_pcm_features(samples), start_sec) for samples, start_sec in items
+    ])
+
+
+def classify_features_batch(items: list) -> list:
+    """
+    Like classify_pcm_batch(), for inputs whose features are already known.
+
+    *items* is a list of ((mspec, loge, difflen), start_sec) pairs, e.g.
+    from _pcm_features() or IncrementalFeatures.window().
+    """
+    segmenter = _get_segmenter()
+
+    prepared = []
+    for (mspec, loge, difflen), _start_sec in items:
+        prepared.append(_prepare_vad(segmenter, mspec, loge, difflen))
+
+    sizes = [len(patches) for _lseg, patches, _finite in prepared]
+    if sum(sizes):
+        rawpred = _predict_patches(
+            segmenter, np.concatenate([patches for _l, patches, _f in prepared]),
         )
-        logger.info("inaSpeechSegmenter ready.")
+    else:
+        rawpred = np.zeros((0, len(segmenter.vad.outlabels)), dtype=np.float32)
+
+    results = []
+    for (lseg, _patches, finite), part, (_s, start_sec) in zip(
+        prepared, np.split(rawpred, np.cumsum(sizes)[:-1]), items,
+    ):
+        results.append(_decode_vad(segmenter, lseg, part, finite, start_sec))
+    return results
+
+
+# Feature framing used by inaSpeechSegmenter's MFCC front end: frame k
+# covers samples [k * _FEAT_HOP, k * _FEAT_HOP + _FEAT_WIN).  Pre-emphasis
+# (x[n] - 0.97 * x[n-1]) also reaches one sample back, so frames are not
+# strictly independent: see IncrementalFeatures.
+_FEAT_HOP = 160   # 10 ms
+_FEAT_WIN = 400   # 25 ms
+
+
+class IncrementalFeatures:
+    """
+    Frame-level CNN features for a growing PCM stream, computed once.
+
+    Successive overlapping classification windows (lookback context +
+    new audio) only pay for the frames they have not seen before; frames
+    from the overlap are served from the cache.  Frames older than the
+    start of the last requested window are dropped.
+
+    Cached frames are close to, not identical with, a computation over the
+    whole window: new frames are computed chunk by chunk, and pre-emphasis
+    treats each chunk's first sample as having no predecessor, so the
+    first frame of every chunk differs slightly.  The CNN works on
+    68-frame patches, where that one frame is negligible.
+    """
+
+    def __init__(self):
+        self._first = 0        # global index of the first cached frame
+        self._mspec = None
+        self._loge = None
+
+    @property
+    def _end(self) -> int:
+        """Global index one past the last cached frame."""
+        return self._first + (0 if self._loge is None else len(self._loge))
+
+    def window(self, start_sample: int, end_sample: int, read_fn) -> Optional[tuple]:
+        """
+        Return (mspec, loge, difflen) for the frames inside samples
+        [start_sample, end_sample).
+
+        *start_sample* must be a multiple of 2 * _FEAT_HOP so the frames
+        line up with the CNN's 20 ms patch grid.  *read_fn(lo, hi)* must
+        return float32 PCM for global samples [lo, hi), or None.
+        """
+        k0 = start_sample // _FEAT_HOP
+        k1 = (end_sample - _FEAT_WIN) // _FEAT_HOP + 1   # one past the last frame
+        if k1 <= k0:
+            return None
+
+        if self._loge is None or k0 < self._first or k0 > self._end:
+            self._first, self._mspec, self._loge = k0, None, None
+
+        if k1 > self._end:
+            lo = self._end * _FEAT_HOP
+            samples = read_fn(lo, (k1 - 1) * _FEAT_HOP + _FEAT_WIN)
+            if samples is None:
+                return None
+            mspec, loge, difflen = _pcm_features(samples)
+            if difflen:
+                mspec = mspec[:len(loge)]   # drop INA's short-input padding
+            if self._loge is None:
+                self._mspec, self._loge = mspec, loge
+            else:
+                self._mspec = np.concatenate((self._mspec, mspec))
+                self._loge = np.concatenate((self._loge, loge))
+
+        # Drop frames no later window can need
+        drop = k0 - self._first
+        if drop > 0:
+            self._mspec = self._mspec[drop:]
+            self._loge = self._loge[drop:]
+            self._first = k0
 
-    return _segmenter_instance
+        mspec = self._mspec[:k1 - k0]
+        loge = self._loge[:k1 - k0]
+        difflen = 0
+        if len(loge) < 68:
+            difflen = 68 - len(loge)
+            mspec = np.concatenate((mspec, np.ones((difflen, 24)) * np.min(mspec)))
+        return mspec, loge, difflen
 
 
 # -----------------------------------------------------------------------
-# Energy calculation
+# CNN stages (split out of Segmenter.segment_feats so that patches from
+# several inputs can share one model call)
 # -----------------------------------------------------------------------
 
-def _load_pcm(audio_path: str) -> Optional[np.ndarray]:
-    """Convert audio to 16kHz mono PCM and return as float32 samples, or None on failure."""
-    with tempfile.NamedTemporaryFile(suffix=".pcm", delete=False) as f:
-        pcm_path = tempfile.mktemp(suffix=".pcm")
-        try:
-            if not _to_pcm(audio_path, pcm_path):
-                return None
-            pcm_int16 = np.fromfile(pcm_path, dtype=np.int16)
-        finally:
-            try:
-                os.unlink(pcm_path)
-            except OSError:
-                pass
+# Patches per model.predict() step.  INA defaults to 32, which leaves most
+# of the CPU's vector width idle on large stacked batches.
+CNN_BATCH_SIZE = 256
+
+# inaSpeechSegmenter works on 20 ms patch steps
+_FRAME_SEC = 0.02
 
-        if len(pcm_int16) == 0:
-            return None
 
-        return pcm_int16.astype(np.float32) / 32768.0
+def _prepare_vad(segmenter, mspec, loge, difflen) -> tuple:
+    """
+    Energy-based activity detection and CNN patch extraction.
+
+    Returns (lseg, patches, finite): the energy segmentation in patch
+    frames, the stacked patches of the segments the CNN must classify,
+    and the per-frame finiteness mask used when decoding.
+    """
+    vad = segmenter.vad
+
+    lseg = []
+    for lab, start, stop in _binidx2seglist(
+        _energy_activity(loge, segmenter.energy_ratio)[::2]
+    ):
+        lseg.append(("noEnergy" if lab == 0 else "energy", start, stop))
+
+    if vad.nmel < 24:
+        mspec = mspec[:, :vad.nmel].copy()
+
+    patches, finite = _get_patches(mspec, 68, 2)
+    if difflen > 0:
+        patches = patches[:-int(difflen / 2), :, :]
+        finite = finite[:-int(difflen / 2)]
+
+    batch = [patches[start:stop] for lab, start, stop in lseg if lab == vad.inlabel]
+    if batch:
+        batch = np.concatenate(batch)
+    else:
+        batch = patches[:0]
+
+    return lseg, batch, finite
+
+
+# _energy_activity(), _get_patches() and _binidx2seglist() are copied from
+# inaSpeechSegmenter.segmenter, which imports TensorFlow at module level.
+# Same arithmetic; numpy's sliding_window_view replaces skimage's.
+
+def _energy_activity(loge: np.ndarray, ratio: float) -> np.ndarray:
+    viterbi = ina_module("pyannote_viterbi")
+    utils = ina_module("viterbi_utils")
+    threshold = np.mean(loge[np.isfinite(loge)]) + np.log(ratio)
+    raw_activity = (loge > threshold)
+    return viterbi.viterbi_decoding(
+        utils.pred2logemission(raw_activity), utils.log_trans_exp(150, cost0=-5),
+    )
+
+
+def _get_patches(mspec: np.ndarray, w: int, step: int) -> tuple:
+    import warnings
+
+    h = mspec.shape[1]
+    data = np.lib.stride_tricks.sliding_window_view(mspec, (w, h))[::step, 0]
+    data = data.reshape(len(data), w * h)
+    with warnings.catch_warnings():
+        warnings.filterwarnings(
+            "ignore", message="invalid value encountered in subtract", category=RuntimeWarning,
+        )
+        data = (data - np.mean(data, axis=1).reshape((len(data), 1))) / np.std(data, axis=1).reshape((len(data), 1))
+    lfill = [data[0, :].reshape(1, h * w)] * (w // (2 * step))
+    rfill = [data[-1, :].reshape(1, h * w)] * (w // (2 * step) - 1 + len(mspec) % 2)
+    data = np.vstack(lfill + [data] + rfill)
+    finite = np.all(np.isfinite(data), axis=1)
+    data.shape = (len(data), w, h)
+    return data, finite
+
+
+def _binidx2seglist(binidx) -> list:
+    """[a, a, b, b, b] -> [(a, 0, 2), (b, 2, 5)]"""
+    curlabel = None
+    bseg = -1
+    ret = []
+    for i, e in enumerate(binidx):
+        if e != curlabel:
+            if curlabel is not None:
+                ret.append((curlabel, bseg, i))
+            curlabel = e
+            bseg = i
+    ret.append((curlabel, bseg, i + 1))
+    return ret
+
+
+def _predict_patches(segmenter, patches: np.ndarray) -> np.ndarray:
+    """Run the VAD CNN over stacked patches; returns per-patch class scores."""
+    return segmenter.vad.nn.predict(
+        np.expand_dims(patches, 3), batch_size=CNN_BATCH_SIZE, verbose=0,
+    )
+
+
+def _decode_vad(segmenter, lseg, rawpred, finite, start_sec: float) -> list:
+    """
+    Viterbi-decode CNN scores back into labelled segments.
+
+    Returns (label, start, end) tuples in seconds, offset by *start_sec*.
+    """
+    viterbi_decoding = ina_module("pyannote_viterbi").viterbi_decoding
+    diag_trans_exp = ina_module("viterbi_utils").diag_trans_exp
+
+    vad = segmenter.vad
+    transition = diag_trans_exp(vad.viterbi_arg, len(vad.outlabels))
+
+    ret = []
+    for lab, start, stop in lseg:
+        if lab != vad.inlabel:
+            ret.append((lab, start, stop))
+            continue
+
+        n = stop - start
+        scores = np.array(rawpred[:n])
+        rawpred = rawpred[n:]
+        scores[~finite[start:stop], :] = 0.5
+        pred = viterbi_decoding(np.log(scores), transition)
+        for lab2, start2, stop2 in _binidx2seglist(pred):
+            ret.append((vad.outlabels[int(lab2)], start2 + start, stop2 + start))
+
+    return [
+        (lab, start_sec + start * _FRAME_SEC, start_sec + stop * _FRAME_SEC)
+        for lab, start, stop in ret
+    ]
+
+
+# -----------------------------------------------------------------------
+# Energy calculation
+# -----------------------------------------------------------------------
+
+def _load_pcm(audio_path: str) -> Optional[np.ndarray]:
+    """Decode audio to 16kHz mono PCM and return as float32 samples, or None on failure."""
+    pcm_int16 = audio_codec.decode_pcm(audio_path, SAMPLE_RATE)
+    if pcm_int16 is None or len(pcm_int16) == 0:
+        return None
+    return pcm_int16.astype(np.float32) / 32768.0
 
 
 def _compute_energy_db(
@@ -368,60 +1039,112 @@ def _absorb_shortest(
 
     Processes the **shortest** segment first each iteration (not
     left-to-right) to avoid systematically shifting transition boundaries.
+    Ties go to the earliest segment.
 
     Neighbour selection priority:
     1. Both neighbours same type  -> bridge the gap.
     2. Short segment's type matches one neighbour -> extend that neighbour
        (keeps the real transition boundary in place).
     3. No type match -> absorb into the longer neighbour.
+
+    Segments live in a doubly linked list (index arrays) with a min-heap of
+    (duration, position, version) entries; entries whose version is stale
+    are skipped on pop.  A segment keeps its position index when extended,
+    so list order and tie-breaking match a left-to-right scan, and each
+    absorb is O(log n) instead of a full rescan.
     """
     segments = _merge_adjacent(segments)
+    n = len(segments)
+    if n < 2:
+        return segments
 
-    while len(segments) > 1:
-        shortest_idx = min(
-            range(len(segments)),
-            key=lambda i: segments[i].end - segments[i].start,
-        )
-        if (segments[shortest_idx].end - segments[shortest_idx].start) >= min_dur:
+    nodes = list(segments)
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    nxt[-1] = -1
+    version = [0] * n              # -1 once a node is removed
+    heap = [(seg.end - seg.start, i, 0) for i, seg in enumerate(nodes)]
+    heapq.heapify(heap)
+    count = n
+
+    def put(i: int, seg: AudioSegment):
+        nodes[i] = seg
+        version[i] += 1
+        heapq.heappush(heap, (seg.end - seg.start, i, version[i]))
+
+    def remove(i: int):
+        nonlocal count
+        p, q = prev[i], nxt[i]
+        if p >= 0:
+            nxt[p] = q
+        if q >= 0:
+            prev[q] = p
+        version[i] = -1
+        count -= 1
+
+    def merge_around(i: int):
+        # Local equivalent of _merge_adjacent: the earlier segment survives
+        p = prev[i]
+        if p >= 0 and nodes[p].segment_type == nodes[i].segment_type:
+            put(p, dataclasses.replace(nodes[p], end=nodes[i].end))
+            remove(i)
+            i = p
+        q = nxt[i]
+        if q >= 0 and nodes[q].segment_type == nodes[i].segment_type:
+            put(i, dataclasses.replace(nodes[i], end=nodes[q].end))
+            remove(q)
+
+    while count > 1:
+        dur, idx, ver = heap[0]
+        if ver != version[idx]:
+            heapq.heappop(heap)
+            continue
+        if dur >= min_dur:
             break
-
-        idx = shortest_idx
-        seg = segments[idx]
-        prev = segments[idx - 1] if idx > 0 else None
-        next_seg = segments[idx + 1] if idx + 1 < len(segments) else None
-
-        if prev and next_seg:
-            if prev.segment_type == next_seg.segment_type:
-                segments[idx - 1] = dataclasses.replace(prev, end=next_seg.end)
-                del segments[idx:idx + 2]
-            elif seg.segment_type == prev.segment_type:
-                segments[idx - 1] = dataclasses.replace(prev, end=seg.end)
-                del segments[idx]
+        heapq.heappop(heap)
+
+        seg = nodes[idx]
+        p, q = prev[idx], nxt[idx]
+        prev_seg = nodes[p] if p >= 0 else None
+        next_seg = nodes[q] if q >= 0 else None
+
+        if prev_seg and next_seg:
+            if prev_seg.segment_type == next_seg.segment_type:
+                put(p, dataclasses.replace(prev_seg, end=next_seg.end))
+                remove(idx)
+                remove(q)
+                kept = p
+            elif seg.segment_type == prev_seg.segment_type:
+                put(p, dataclasses.replace(prev_seg, end=seg.end))
+                remove(idx)
+                kept = p
             elif seg.segment_type == next_seg.segment_type:
-                segments[idx + 1] = dataclasses.replace(next_seg, start=seg.start)
-                del segments[idx]
+                put(q, dataclasses.replace(next_seg, start=seg.start))
+                remove(idx)
+                kept = q
             else:
-                prev_dur = prev.end - prev.start
+                prev_dur = prev_seg.end - prev_seg.start
                 next_dur = next_seg.end - next_seg.start
                 if prev_dur >= next_dur:
-                    segments[idx - 1] = dataclasses.replace(prev, end=seg.end)
+                    put(p, dataclasses.replace(prev_seg, end=seg.end))
+                    kept = p
                 else:
-                    segments[idx + 1] = dataclasses.replace(next_seg, start=seg.start)
-                del segments[idx]
-        elif prev:
-            segments[idx - 1] = dataclasses.replace(prev, end=seg.end)
-            del segments[idx]
-        elif next_seg:
-            segments[idx + 1] = dataclasses.replace(next_seg, start=seg.start)
-            del segments[idx]
+                    put(q, dataclasses.replace(next_seg, start=seg.start))
+                    kept = q
+                remove(idx)
+        elif prev_seg:
+            put(p, dataclasses.replace(prev_seg, end=seg.end))
+            remove(idx)
+            kept = p
         else:
-            break
-
-        segments = _merge_adjacent(segments)
-
-    return segments
+            put(q, dataclasses.replace(next_seg, start=seg.start))
+            remove(idx)
+            kept = q
 
+        merge_around(kept)
 
+    # Position indices never change order, so survivors are already sorted
+    return [nodes[i] for i in range(n) if version[i] >= 0]
 
 
 def _consolidate_segments(
@@ -456,7 +1179,7 @@ def _consolidate_segments(
 
 
 
-def _spectral_flux(samples: np.ndarray) -> np.ndarray:
+def _spectral_flux(samples: np.ndarray, dtype=None) -> np.ndarray:
     """
     Compute spectral flux over the entire signal.
 
@@ -464,39 +1187,104 @@ def _spectral_flux(samples: np.ndarray) -> np.ndarray:
     consecutive short-time frames.  A peak in the smoothed flux corresponds
     to a real content transition (speech -> music, music -> speech, etc.).
 
+    Frames are a strided view of *samples* (no copy) transformed
+    FLUX_BLOCK_FRAMES at a time with one batched rfft.  *dtype* sets the
+    FFT precision: None keeps the input's (int16 -> float64, bit-identical
+    to a frame-by-frame loop); np.float32 halves the FFT working set.
+
     Returns one value per hop (0.25 s).
     """
+    flux = _raw_spectral_flux(samples, dtype=dtype)
+    if len(flux) == 0:
+        return flux
+    return _smooth_flux(flux)
+
+
+def _raw_spectral_flux(samples: np.ndarray, dtype=None) -> np.ndarray:
+    """_spectral_flux() before smoothing (empty for less than two frames)."""
     hop_n = int(FLUX_HOP_SEC * SAMPLE_RATE)
     win_n = int(FLUX_WIN_SEC * SAMPLE_RATE)
     n_frames = max(0, (len(samples) - win_n) // hop_n + 1)
     if n_frames < 2:
         return np.zeros(0)
 
+    flux, _ = _raw_flux(samples, n_frames, dtype=dtype)
+    return flux
+
+
+def _raw_flux(samples: np.ndarray, n_frames: int, prev_mag=None, dtype=None) -> tuple:
+    """
+    Unsmoothed flux of the first *n_frames* frames of *samples*.
+
+    *prev_mag* is the magnitude spectrum of the frame just before
+    samples[0] (None: the first frame scores 0).  Returns (flux, last_mag)
+    so a caller can continue where this call stopped.
+    """
+    hop_n = int(FLUX_HOP_SEC * SAMPLE_RATE)
+    win_n = int(FLUX_WIN_SEC * SAMPLE_RATE)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, win_n)[::hop_n][:n_frames]
     flux = np.zeros(n_frames)
-    prev_mag = None
-    for f in range(n_frames):
-        lo = f * hop_n
-        frame = samples[lo:lo + win_n]
-        mag = np.abs(np.fft.rfft(frame))
+    for lo in range(0, n_frames, FLUX_BLOCK_FRAMES):
+        block = frames[lo:lo + FLUX_BLOCK_FRAMES]
+        if dtype is not None:
+            block = block.astype(dtype)
+        mag = np.abs(np.fft.rfft(block, axis=-1))
+        # Half-wave rectified difference -- only count spectral increases
+        # (onset-style detection, more robust than raw difference)
+        flux[lo + 1:lo + len(mag)] = np.maximum(np.diff(mag, axis=0), 0.0).sum(axis=1)
         if prev_mag is not None:
-            # Half-wave rectified difference -- only count spectral increases
-            # (onset-style detection, more robust than raw difference)
-            flux[f] = np.sum(np.maximum(mag - prev_mag, 0.0))
-        prev_mag = mag
+            flux[lo] = np.maximum(mag[0] - prev_mag, 0.0).sum()
+        prev_mag = mag[-1]
+    return flux, prev_mag
+
 
+def _smooth_flux(flux: np.ndarray) -> np.ndarray:
     # Smooth to suppress individual beat/note onsets and highlight broad
     # content transitions (~2 s moving average)
     smooth_frames = max(1, int(FLUX_SMOOTH_SEC / FLUX_HOP_SEC))
     kernel = np.ones(smooth_frames, dtype=np.float32) / smooth_frames
-    flux = np.convolve(flux, kernel, mode="same")
+    return np.convolve(flux, kernel, mode="same")
 
-    return flux
+
+def _refine_boundary(
+    flux: np.ndarray,
+    boundary: float,
+    lo_sec: float,
+    hi_sec: float,
+    first_frame: int = 0,
+) -> Optional[float]:
+    """
+    Proximity-weighted flux peak for one boundary, searched in [lo_sec, hi_sec).
+
+    *flux* is smoothed flux whose element 0 is frame *first_frame*; only the
+    frames inside the search window are touched.  Returns the refined
+    boundary (seconds), or None if the window holds no flux frames.
+    """
+    lo_frame = max(first_frame, int(lo_sec / FLUX_HOP_SEC))
+    hi_frame = min(first_frame + len(flux), int(hi_sec / FLUX_HOP_SEC))
+    if lo_frame >= hi_frame:
+        return None
+
+    # Proximity-weighted peak selection: multiply flux by a Gaussian
+    # centred on the current boundary.  A moderate peak 2 s away
+    # easily beats a loud peak 10 s away.
+    window_flux = flux[lo_frame - first_frame:hi_frame - first_frame]
+    frame_times = np.arange(lo_frame, hi_frame) * FLUX_HOP_SEC
+    proximity = np.exp(
+        -((frame_times - boundary) ** 2) / (2.0 * PROXIMITY_SIGMA ** 2)
+    )
+    weighted_flux = window_flux * proximity
+
+    hop_n = int(FLUX_HOP_SEC * SAMPLE_RATE)
+    peak_frame = lo_frame + np.argmax(weighted_flux)
+    return round(peak_frame * hop_n / SAMPLE_RATE, 2)
 
 
 def _refine_boundaries(
     segments: List[AudioSegment],
     samples: Optional[np.ndarray],
     search_radius: float = 15.0,
+    flux: Optional[np.ndarray] = None,
 ) -> List[AudioSegment]:
     """
     Fine-tune each boundary using proximity-weighted spectral flux.
@@ -507,15 +1295,19 @@ def _refine_boundaries(
     by a Gaussian centred on the current boundary position.  This ensures
     that a moderate transition peak near the boundary beats a loud beat
     10+ seconds away.
+
+    The flux envelope is computed once for the whole recording (or passed
+    in as *flux*); each boundary is then a lookup into its search window.
     """
-    if samples is None or len(segments) < 2:
+    if len(segments) < 2:
         return segments
-
-    flux = _spectral_flux(samples)
+    if flux is None:
+        if samples is None:
+            return segments
+        flux = _spectral_flux(samples)
     if len(flux) == 0:
         return segments
 
-    hop_n = int(FLUX_HOP_SEC * SAMPLE_RATE)
     segments = list(segments)
 
     for i in range(1, len(segments)):
@@ -528,30 +1320,89 @@ def _refine_boundaries(
         if lo_sec >= hi_sec:
             continue
 
-        lo_frame = max(0, int(lo_sec / FLUX_HOP_SEC))
-        hi_frame = min(len(flux), int(hi_sec / FLUX_HOP_SEC))
-        if lo_frame >= hi_frame:
+        new_boundary = _refine_boundary(flux, boundary, lo_sec, hi_sec)
+        if new_boundary is None:
             continue
 
-        # Proximity-weighted peak selection: multiply flux by a Gaussian
-        # centred on the current boundary.  A moderate peak 2 s away
-        # easily beats a loud peak 10 s away.
-        window_flux = flux[lo_frame:hi_frame].copy()
-        frame_times = np.arange(lo_frame, hi_frame) * FLUX_HOP_SEC
-        proximity = np.exp(
-            -((frame_times - boundary) ** 2) / (2.0 * PROXIMITY_SIGMA ** 2)
-        )
-        weighted_flux = window_flux * proximity
-
-        peak_frame = lo_frame + np.argmax(weighted_flux)
-        new_boundary = round(peak_frame * hop_n / SAMPLE_RATE, 2)
-
         segments[i - 1] = dataclasses.replace(segments[i - 1], end=new_boundary)
         segments[i] = dataclasses.replace(segments[i], start=new_boundary)
 
     return segments
 
 
+class IncrementalSpectralFlux:
+    """
+    Spectral flux of a live PCM stream, extended as audio arrives.
+
+    Uses the same frame grid as _spectral_flux (frame f starts at stream
+    sample f * hop), and each frame's FFT is computed exactly once, so
+    refining a boundary is a slice of the stored envelope rather than a
+    fresh set of FFTs over the audio around it.  Raw flux for the last
+    *history* seconds is kept (None: all of it).
+    """
+
+    def __init__(self, history: Optional[float] = 3600.0):
+        self._hop_n = int(FLUX_HOP_SEC * SAMPLE_RATE)
+        self._win_n = int(FLUX_WIN_SEC * SAMPLE_RATE)
+        self._max_frames = None if history is None else max(1, int(history / FLUX_HOP_SEC))
+        self._first = 0          # global index of the first stored frame
+        self._raw = np.zeros(0)  # unsmoothed flux, frames [_first, _end)
+        self._prev_mag = None    # magnitude spectrum of frame _end - 1
+
+    @property
+    def _end(self) -> int:
+        """Global index one past the last computed frame."""
+        return self._first + len(self._raw)
+
+    def update(self, total_samples: int, read_fn) -> None:
+        """
+        Compute every frame fully covered by the first *total_samples*
+        stream samples.  *read_fn(lo, hi)* must return PCM for global
+        samples [lo, hi), or None if they are no longer available.
+        """
+        k1 = (total_samples - self._win_n) // self._hop_n + 1   # one past the last frame
+        k0 = self._end
+        if k1 <= k0:
+            return
+        samples = read_fn(k0 * self._hop_n, (k1 - 1) * self._hop_n + self._win_n)
+        if samples is None:
+            # Fell behind the PCM buffer: restart the envelope at the new audio
+            self._first, self._raw, self._prev_mag = k1, np.zeros(0), None
+            return
+
+        flux, self._prev_mag = _raw_flux(samples, k1 - k0, prev_mag=self._prev_mag)
+        self._raw = np.concatenate((self._raw, flux))
+        drop = 0 if self._max_frames is None else len(self._raw) - self._max_frames
+        if drop > 0:
+            self._raw = self._raw[drop:]
+            self._first += drop
+
+    def envelope(self) -> tuple:
+        """(smoothed flux of every stored frame, global index of the first)."""
+        return _smooth_flux(self._raw), self._first
+
+    def raw(self) -> tuple:
+        """(unsmoothed flux of every stored frame, global index of the first)."""
+        return self._raw, self._first
+
+    def refine(self, boundary: float, lo_sec: float, hi_sec: float) -> Optional[float]:
+        """
+        Refined position of *boundary* within [lo_sec, hi_sec) (stream
+        seconds), or None when the flux for that window is not available.
+        """
+        lo_frame = max(self._first, int(lo_sec / FLUX_HOP_SEC))
+        hi_frame = min(self._end, int(hi_sec / FLUX_HOP_SEC))
+        if lo_frame >= hi_frame:
+            return None
+        # Smooth a slice with a kernel-wide margin on each side, so frames
+        # inside the window match a whole-signal smoothing
+        margin = max(1, int(FLUX_SMOOTH_SEC / FLUX_HOP_SEC))
+        a = max(self._first, lo_frame - margin)
+        b = min(self._end, hi_frame + margin)
+        smoothed = _smooth_flux(self._raw[a - self._first:b - self._first])
+        return _refine_boundary(smoothed, boundary, lo_sec, hi_sec, first_frame=a)
+
+
 # -----------------------------------------------------------------------
 # Segment saving
 # -----------------------------------------------------------------------
@@ -568,26 +1419,13 @@ def _save_segment(src_path: str, start: float, end: float, out_path: str) -> boo
     """
     Extract [start, end] seconds from *src_path* and write to *out_path*.
 
-    Uses ``-ss``/``-to`` before ``-i`` (fast seek) with stream copy so the
-    operation is nearly instantaneous.  MP3 frame alignment may shift the
-    actual cut by up to ~0.026 s at each boundary — acceptable for broadcast
-    segments that are typically 15+ seconds long.
+    Stream copy (no re-encode) via the shared audio codec, so the operation
+    is nearly instantaneous.  MP3 frame alignment may shift the actual cut
+    by up to ~0.026 s at each boundary — acceptable for broadcast segments
+    that are typically 15+ seconds long.
     """
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    cmd = [
-        "ffmpeg", "-y", "-hide_banner", "-loglevel", "warning",
-        "-ss", str(start),
-        "-to", str(end),
-        "-i", src_path,
-        "-c", "copy",
-        out_path,
-    ]
-    try:
-        subprocess.run(cmd, check=True, capture_output=True, timeout=120)
-        return True
-    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as exc:
-        logger.error("Failed to save segment %s: %s", out_path, exc)
-        return False
+    return audio_codec.cut(src_path, start, end, out_path)
 
 
 def _save_segments_to_disk(
@@ -598,56 +1436,101 @@ def _save_segments_to_disk(
     """
     Save each segment to *save_dir/<source_stem>/* and return updated segments
     with ``file_path`` populated.
+
+    All segments are cut in one stream-copy pass over the source (split at
+    every segment boundary); if that fails, each segment is cut on its own.
     """
     stem = os.path.splitext(os.path.basename(src_path))[0]
     out_dir = os.path.join(save_dir, stem)
     os.makedirs(out_dir, exist_ok=True)
     logger.info("Saving %d segments to %s", len(segments), out_dir)
 
+    out_paths = [os.path.join(out_dir, _segment_filename(i, seg)) for i, seg in enumerate(segments)]
+    saved = _split_segments(src_path, segments, out_paths)
+    if saved is None:
+        saved = [
+            _save_segment(src_path, seg.start, seg.end, out_path)
+            for seg, out_path in zip(segments, out_paths)
+        ]
+
     updated = []
-    for i, seg in enumerate(segments):
-        filename = _segment_filename(i, seg)
-        out_path = os.path.join(out_dir, filename)
-        ok = _save_segment(src_path, seg.start, seg.end, out_path)
+    for seg, out_path, ok in zip(segments, out_paths, saved):
         updated.append(dataclasses.replace(seg, file_path=out_path if ok else None))
         if ok:
             logger.debug("Saved segment %s", out_path)
 
-    saved = sum(1 for s in updated if s.file_path)
-    logger.info("Saved %d/%d segments to %s", saved, len(segments), out_dir)
+    n_saved = sum(1 for s in updated if s.file_path)
+    logger.info("Saved %d/%d segments to %s", n_saved, len(segments), out_dir)
     return updated
 
 
+def _split_segments(
+    src_path: str,
+    segments: List[AudioSegment],
+    out_paths: List[str],
+) -> Optional[List[bool]]:
+    """
+    Cut every segment out of *src_path* with a single split pass.
+
+    The source is split at the union of all segment starts/ends; each
+    segment is the piece starting at its start time (pieces covering gaps
+    between segments are discarded).  Returns per-segment success flags,
+    or None if the split itself failed.
+    """
+    cuts = sorted({t for seg in segments for t in (seg.start, seg.end) if t > 0})
+    out_dir = os.path.dirname(out_paths[0])
+    ext = os.path.splitext(out_paths[0])[1]
+    pieces = audio_codec.split(src_path, cuts, out_dir, ext)
+    if pieces is None:
+        return None
+
+    # Piece k covers [bounds[k], bounds[k + 1]); a list of any other length
+    # cannot be matched to the intervals
+    bounds = [0.0] + cuts
+    if len(pieces) != len(bounds):
+        logger.warning(
+            "Split of %s returned %d pieces for %d intervals -- cutting segments one by one",
+            src_path, len(pieces), len(bounds),
+        )
+        _remove_pieces(pieces)
+        return None
+    index = {t: k for k, t in enumerate(bounds)}
+
+    saved = []
+    used = set()
+    for seg, out_path in zip(segments, out_paths):
+        k = index.get(seg.start)
+        exact = (
+            k is not None and k < len(pieces) and pieces[k] is not None
+            and k + 1 < len(bounds) and bounds[k + 1] == seg.end
+        )
+        if not exact:
+            # Overlapping segments (or a missing piece): cut this one on its own
+            saved.append(_save_segment(src_path, seg.start, seg.end, out_path))
+            continue
+        os.replace(pieces[k], out_path)
+        used.add(pieces[k])
+        saved.append(True)
+
+    _remove_pieces(p for p in pieces if p not in used)
+    return saved
+
+
+def _remove_pieces(pieces) -> None:
+    for piece in pieces:
+        if piece is not None:
+            try:
+                os.unlink(piece)
+            except OSError:
+                pass
+
+
 # -----------------------------------------------------------------------
 # Audio I/O helpers
 # -----------------------------------------------------------------------
 
 def _get_duration(path: str) -> float:
-    cmd = [
-        "ffprobe", "-v", "quiet", "-print_format", "json",
-        "-show_format", path,
-    ]
-    try:
-        r = subprocess.run(cmd, capture_output=True, text=True, timeout=30, check=True)
-        return float(json.loads(r.stdout)["format"]["duration"])
-    except Exception as exc:
-        logger.error("ffprobe failed on %s: %s", path, exc)
-        return 0.0
-
-
-def _to_pcm(src: str, dst: str) -> bool:
-    cmd = [
-        "ffmpeg", "-y", "-hide_banner", "-loglevel", "warning",
-        "-i", src,
-        "-ar", str(SAMPLE_RATE), "-ac", "1", "-f", "s16le",
-        dst,
-    ]
-    try:
-        subprocess.run(cmd, check=True, capture_output=True, timeout=120)
-        return True
-    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as exc:
-        logger.error("PCM conversion failed: %s", exc)
-        return False
+    return audio_codec.probe_duration(path)
 
 
 def _fmt_duration(seconds: float) -> str:
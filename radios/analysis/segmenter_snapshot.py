@@ -0,0 +1,264 @@
+"""
+Prebuilt segmenter model snapshot -- warm start without TensorFlow.
+
+inaSpeechSegmenter loads its Keras CNN through TensorFlow on first use,
+which costs several seconds and a few hundred MB in every process that
+segments (daemons, --workers children, tune.py, tests).  The snapshot is
+the same speech/music/noise CNN exported once to an ONNX graph:
+
+    python manage.py export_segmenter_model       # needs tensorflow + tf2onnx
+
+writes SEGMENTER_SNAPSHOT_PATH, with the VAD parameters (labels, mel
+bands, Viterbi cost, energy ratio) stored in the graph's metadata.  When
+that file exists and onnxruntime is installed, _get_segmenter() returns a
+SnapshotSegmenter and TensorFlow is never imported; otherwise it falls
+back to inaSpeechSegmenter's Keras model.
+
+The numpy-only parts of inaSpeechSegmenter (MFCC front end, Viterbi
+decoding) are still used.  Importing them normally runs the package
+__init__, which imports TensorFlow, so ina_module() loads them directly.
+
+Reduced precision (SEGMENT_MODEL_PRECISION)
+-------------------------------------------
+"int8" runs a dynamically quantized copy of the snapshot (int8 weights,
+activations quantized per batch), "float16" a half-precision copy.  Each
+variant is derived from the float32 snapshot on first use and cached next
+to it (ina_smn.int8.onnx, ...).  Measure the boundary accuracy you give up
+with `radios/analysis/tune.py labels.json --precision int8 float16`
+before switching.
+
+Dependencies: onnxruntime (inference, int8); tensorflow + tf2onnx (export
+only); onnx + onnxconverter-common (float16 variant only)
+"""
+
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("broadcast_analysis")
+
+SNAPSHOT_FORMAT = 1           # bumped when the metadata layout changes
+SNAPSHOT_METADATA_KEY = "ina_vad"
+SNAPSHOT_OPSET = 13
+PRECISIONS = ("float32", "int8", "float16")
+
+_ina_modules: dict = {}
+
+
+def ina_module(name: str):
+    """
+    Return the inaSpeechSegmenter submodule *name* (e.g. "sidekit_mfcc").
+
+    If the package is already imported the regular submodule is returned;
+    otherwise the file is loaded on its own, skipping the package __init__
+    and its TensorFlow import.  Only meant for the numpy-only submodules.
+    """
+    if "inaSpeechSegmenter" in sys.modules:
+        return importlib.import_module(f"inaSpeechSegmenter.{name}")
+
+    module = _ina_modules.get(name)
+    if module is None:
+        spec = importlib.util.find_spec("inaSpeechSegmenter")
+        if spec is None or not spec.submodule_search_locations:
+            raise ImportError("inaSpeechSegmenter is not installed")
+        path = os.path.join(list(spec.submodule_search_locations)[0], f"{name}.py")
+        module_spec = importlib.util.spec_from_file_location(f"_ina_{name}", path)
+        module = importlib.util.module_from_spec(module_spec)
+        module_spec.loader.exec_module(module)
+        _ina_modules[name] = module
+    return module
+
+
+class _OnnxModel:
+    """The bits of the Keras model API used by segmenter._predict_patches()."""
+
+    def __init__(self, session, n_labels: int):
+        self._session = session
+        self._input = session.get_inputs()[0].name
+        self._n_labels = n_labels
+
+    def predict(self, patches: np.ndarray, batch_size: int = 256, verbose: int = 0) -> np.ndarray:
+        patches = np.asarray(patches, dtype=np.float32)
+        if len(patches) == 0:
+            return np.zeros((0, self._n_labels), dtype=np.float32)
+        parts = [
+            self._session.run(None, {self._input: patches[lo:lo + batch_size]})[0]
+            for lo in range(0, len(patches), batch_size)
+        ]
+        return np.concatenate(parts)
+
+
+class _SnapshotVAD:
+    """Mirrors inaSpeechSegmenter's DnnSegmenter attributes."""
+
+    def __init__(self, nn, meta: dict):
+        self.nn = nn
+        self.outlabels = tuple(meta["outlabels"])
+        self.inlabel = meta["inlabel"]
+        self.nmel = int(meta["nmel"])
+        self.viterbi_arg = meta["viterbi_arg"]
+
+
+class SnapshotSegmenter:
+    """Drop-in for the inaSpeechSegmenter.Segmenter attributes segmenter.py uses."""
+
+    def __init__(self, session, meta: dict):
+        self.energy_ratio = meta["energy_ratio"]
+        self.vad = _SnapshotVAD(_OnnxModel(session, len(meta["outlabels"])), meta)
+        self.meta = meta
+
+
+def snapshot_path(path, precision: str = "float32") -> str:
+    """File holding the *precision* variant of the snapshot at *path*."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+    if precision == "float32":
+        return str(path)
+    root, ext = os.path.splitext(str(path))
+    return f"{root}.{precision}{ext}"
+
+
+def load_snapshot(path, precision: str = "float32") -> Optional[SnapshotSegmenter]:
+    """
+    Load the ONNX snapshot at *path*, or return None when there is none.
+
+    For *precision* "int8" or "float16" the reduced-precision variant is
+    loaded, and built from the float32 snapshot first if needed.  If that
+    fails the float32 snapshot is used.
+
+    Missing file, missing onnxruntime and unreadable or outdated snapshots
+    all return None (the caller falls back to the Keras model).
+    """
+    if not path or not os.path.exists(path):
+        return None
+    if precision != "float32":
+        variant = snapshot_path(path, precision)
+        try:
+            if not os.path.exists(variant):
+                quantize_snapshot(path, variant, precision)
+        except Exception as exc:
+            logger.warning(
+                "Cannot build the %s segmenter snapshot (%s) -- using float32", precision, exc,
+            )
+        else:
+            path = variant
+    try:
+        import onnxruntime
+    except ImportError:
+        logger.info("Segmenter snapshot %s found but onnxruntime is not installed", path)
+        return None
+
+    t0 = time.monotonic()
+    options = onnxruntime.SessionOptions()
+    # segment_recordings worker processes cap their thread count this way
+    options.intra_op_num_threads = int(os.environ.get("OMP_NUM_THREADS") or 0)
+    try:
+        session = onnxruntime.InferenceSession(
+            str(path), sess_options=options, providers=["CPUExecutionProvider"],
+        )
+        meta = json.loads(session.get_modelmeta().custom_metadata_map[SNAPSHOT_METADATA_KEY])
+    except Exception as exc:
+        logger.warning("Cannot load segmenter snapshot %s: %s", path, exc)
+        return None
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        logger.warning(
+            "Segmenter snapshot %s has format %s (expected %d) -- re-run export_segmenter_model",
+            path, meta.get("format"), SNAPSHOT_FORMAT,
+        )
+        return None
+
+    logger.info(
+        "Segmenter snapshot loaded from %s in %.2fs (inaSpeechSegmenter %s, %s, %s)",
+        path, time.monotonic() - t0, meta.get("ina_version"), meta.get("vad_engine"),
+        meta.get("precision", "float32"),
+    )
+    return SnapshotSegmenter(session, meta)
+
+
+def quantize_snapshot(src, dst, precision: str) -> dict:
+    """
+    Write the *precision* ("int8" or "float16") variant of snapshot *src* to *dst*.
+
+    The snapshot metadata is carried over, with "precision" set.  The
+    file is written atomically.  Returns the metadata.
+    """
+    import onnx
+
+    if precision not in ("int8", "float16"):
+        raise ValueError(f"Cannot quantize to {precision!r}")
+
+    model = onnx.load(str(src))
+    props = {p.key: p.value for p in model.metadata_props}
+    meta = json.loads(props[SNAPSHOT_METADATA_KEY])
+    meta["precision"] = precision
+    tmp = f"{dst}.tmp"
+
+    if precision == "int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(src), tmp, weight_type=QuantType.QInt8)
+        model = onnx.load(tmp)
+    else:
+        from onnxconverter_common import float16
+
+        # Inputs/outputs stay float32 so callers are unchanged
+        model = float16.convert_float_to_float16(model, keep_io_types=True)
+
+    del model.metadata_props[:]
+    for key, value in props.items():
+        entry = model.metadata_props.add()
+        entry.key = key
+        entry.value = json.dumps(meta) if key == SNAPSHOT_METADATA_KEY else value
+    onnx.save(model, tmp)
+    os.replace(tmp, dst)
+    logger.info("Built %s segmenter snapshot %s", precision, dst)
+    return meta
+
+
+def export_snapshot(path, vad_engine: str = "smn") -> dict:
+    """
+    Convert inaSpeechSegmenter's VAD CNN to an ONNX snapshot at *path*.
+
+    Needs tensorflow and tf2onnx.  The file is written atomically.
+    Returns the metadata stored in the snapshot.
+    """
+    import inaSpeechSegmenter
+    import tensorflow as tf
+    import tf2onnx
+    from inaSpeechSegmenter import Segmenter
+
+    segmenter = Segmenter(vad_engine=vad_engine, detect_gender=False, ffmpeg=None)
+    vad = segmenter.vad
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "ina_version": inaSpeechSegmenter.__version__,
+        "vad_engine": vad_engine,
+        "outlabels": list(vad.outlabels),
+        "inlabel": vad.inlabel,
+        "nmel": vad.nmel,
+        "viterbi_arg": vad.viterbi_arg,
+        "energy_ratio": segmenter.energy_ratio,
+        "precision": "float32",
+    }
+
+    signature = (tf.TensorSpec((None, 68, vad.nmel, 1), tf.float32, name="patches"),)
+    model_proto, _ = tf2onnx.convert.from_keras(
+        vad.nn, input_signature=signature, opset=SNAPSHOT_OPSET,
+    )
+    entry = model_proto.metadata_props.add()
+    entry.key = SNAPSHOT_METADATA_KEY
+    entry.value = json.dumps(meta)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(model_proto.SerializeToString())
+    os.replace(tmp, path)
+    return meta
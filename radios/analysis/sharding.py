@@ -0,0 +1,186 @@
+"""
+Process sharding for record_and_segment.
+
+The CNN and the numpy work are GIL-bound, so one Python process tops out
+at a few dozen streams.  In supervisor mode (``--shards N``) the command
+spawns N worker processes, each running ``record_and_segment --shard i/N``
+and handling only the streams it owns:
+
+    supervisor ─┬─ worker 0/N ─→ streams with ring.owner(id) == 0
+                ├─ worker 1/N ─→ streams with ring.owner(id) == 1
+                └─ ...
+
+Ownership comes from a consistent-hash ring on stream id, so every worker
+derives the same assignment from the DB on its own (no coordination), new
+or removed streams are picked up by their owner on the next sync, and
+changing N moves only ~1/N of the streams.
+
+The supervisor restarts crashed workers with exponential backoff and
+reports per-shard load.  ShardSupervisor is also used by
+segment_recordings --workers, whose --once workers exit when the backlog
+is drained (restart_on_success=False).
+"""
+
+import bisect
+import hashlib
+import logging
+import subprocess
+import time
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger("stream_processor")
+
+VNODES = 64                # virtual nodes per shard on the hash ring
+RESTART_DELAY = 5.0        # first restart delay after a worker crash (s)
+MAX_RESTART_DELAY = 300.0  # backoff cap (s)
+STABLE_UPTIME = 600.0      # a worker up this long has its backoff reset (s)
+STOP_TIMEOUT = 30.0        # grace period for workers on shutdown (s)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring mapping stream ids to shard indices."""
+
+    def __init__(self, shards: int, vnodes: int = VNODES):
+        if shards < 1:
+            raise ValueError("shards must be >= 1")
+        self.shards = shards
+        points = sorted(
+            (_hash(f"shard-{shard}-{v}"), shard)
+            for shard in range(shards)
+            for v in range(vnodes)
+        )
+        self._points = [p for p, _ in points]
+        self._owners = [s for _, s in points]
+
+    def owner(self, stream_id) -> int:
+        i = bisect.bisect(self._points, _hash(f"stream-{stream_id}"))
+        return self._owners[i % len(self._points)]
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'2/8' → (2, 8).  Raises ValueError for malformed or out-of-range specs."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like INDEX/COUNT, got {spec!r}") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index out of range: {spec!r}")
+    return index, count
+
+
+class _Worker:
+    __slots__ = ("shard", "process", "started", "restarts", "failures", "restart_at", "finished")
+
+    def __init__(self, shard: int):
+        self.shard = shard
+        self.process: Optional[subprocess.Popen] = None
+        self.started = 0.0
+        self.restarts = 0
+        self.failures = 0          # consecutive short-lived runs (backoff exponent)
+        self.restart_at = 0.0
+        self.finished = False      # exited cleanly and not to be restarted
+
+
+class ShardSupervisor:
+    """
+    Keeps one worker process alive per shard.
+
+    *build_cmd(shard)* returns the argv for a shard's worker.
+    Call poll() periodically from the supervising loop.  With
+    restart_on_success=False a worker that exits with status 0 is done
+    and stays stopped; only crashes are restarted.
+    """
+
+    def __init__(self, shards: int, build_cmd: Callable[[int], List[str]],
+                 restart_delay: float = RESTART_DELAY, restart_on_success: bool = True):
+        self.shards = shards
+        self.restart_delay = restart_delay
+        self.restart_on_success = restart_on_success
+        self._build_cmd = build_cmd
+        self._workers = [_Worker(shard) for shard in range(shards)]
+
+    def start(self):
+        for worker in self._workers:
+            self._spawn(worker)
+
+    def poll(self):
+        """Reap exited workers and restart them once their backoff has elapsed."""
+        now = time.monotonic()
+        for worker in self._workers:
+            proc = worker.process
+            if proc is not None and proc.poll() is not None:
+                uptime = now - worker.started
+                if proc.returncode == 0 and not self.restart_on_success:
+                    logger.info(
+                        "Shard %d/%d worker (pid %d) finished after %.0fs",
+                        worker.shard, self.shards, proc.pid, uptime,
+                    )
+                    worker.process = None
+                    worker.finished = True
+                    continue
+                worker.failures = 1 if uptime >= STABLE_UPTIME else worker.failures + 1
+                delay = min(
+                    self.restart_delay * 2 ** (worker.failures - 1), MAX_RESTART_DELAY,
+                )
+                logger.error(
+                    "Shard %d/%d worker (pid %d) exited rc=%s after %.0fs — restarting in %.0fs",
+                    worker.shard, self.shards, proc.pid, proc.returncode, uptime, delay,
+                )
+                worker.process = None
+                worker.restart_at = now + delay
+            if worker.process is None and not worker.finished and now >= worker.restart_at:
+                worker.restarts += 1
+                self._spawn(worker)
+
+    @property
+    def finished(self) -> bool:
+        """True once every worker has exited cleanly (restart_on_success=False)."""
+        return all(worker.finished for worker in self._workers)
+
+    def stop(self, timeout: float = STOP_TIMEOUT):
+        """SIGTERM every worker, then SIGKILL those still running after *timeout*."""
+        for worker in self._workers:
+            if worker.process is not None and worker.process.poll() is None:
+                worker.process.terminate()
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            proc = worker.process
+            if proc is None:
+                continue
+            try:
+                proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.warning("Shard %d worker did not exit — SIGKILL", worker.shard)
+                proc.kill()
+                proc.wait(timeout=5)
+
+    def status(self) -> list:
+        now = time.monotonic()
+        return [
+            {
+                "shard": w.shard,
+                "pid": w.process.pid if w.process else None,
+                "alive": w.process is not None and w.process.poll() is None,
+                "restarts": w.restarts,
+                "uptime": round(now - w.started) if w.process else 0,
+            }
+            for w in self._workers
+        ]
+
+    def _spawn(self, worker: _Worker):
+        cmd = self._build_cmd(worker.shard)
+        try:
+            worker.process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL)
+        except OSError:
+            logger.exception("Failed to launch shard %d worker", worker.shard)
+            worker.process = None
+            worker.restart_at = time.monotonic() + self.restart_delay
+            return
+        worker.started = time.monotonic()
+        logger.info(
+            "Shard %d/%d worker started (pid %d)", worker.shard, self.shards, worker.process.pid,
+        )
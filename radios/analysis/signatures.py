@@ -0,0 +1,228 @@
+"""
+Shazam recognition signatures computed locally, cached per window.
+
+shazamio's recognize() takes an audio file (or its bytes), builds the
+recognition signature -- a compact list of spectral peaks -- and POSTs
+only that.  The fingerprint stage now does the signing itself, straight
+from the PCM it already decoded (fingerprinter._SegmentAudio):
+
+    - sign_batch() signs several windows at once: the window asked for
+      plus the next ones the sliding window reaches if it keeps missing,
+      as far as that PCM is already in memory (fingerprinter._WindowSigner);
+    - signatures are cached per (segment id, window offset) in
+      FINGERPRINT_SIGNATURE_CACHE_DIR, so retried windows and
+      --retry-no-match runs re-send stored signatures instead of signing
+      the audio again;
+    - Shazam receives the signature (send_recognize_request_v2), not an
+      audio upload.
+
+Signing uses shazamio_core's Recognizer, the same code shazamio itself
+runs, fed a WAV header around the int16 samples (no re-encoding, no temp
+file).  Without shazamio_core, or with FINGERPRINT_SIGNATURES = False,
+clips are uploaded as WAV bytes as before.
+
+Cache files are <segment id>.json, one per segment, tied to the source
+file's size and mtime.  A segment that produced songs drops its file (it
+is never fingerprinted again), and so does a deleted segment
+(discard_segment(), from radios/signals.py); the directory can be wiped at
+any time.
+
+Dependencies: shazamio_core (installed with shazamio >= 0.5)
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+logger = logging.getLogger("broadcast_analysis")
+
+CACHE_FORMAT = 1
+SIGNATURE_SECONDS = 10   # audio per signature (shazamio's segment_duration_seconds default)
+
+_recognizer = None
+_recognizer_lock = threading.Lock()
+
+
+@dataclasses.dataclass
+class Signature:
+    """A Shazam signature: data URI of the encoded peaks, and the audio length in ms."""
+    uri: str
+    samplems: int
+
+    def request(self):
+        """The object shazamio's send_recognize_request_v2() expects."""
+        return SimpleNamespace(
+            signature=SimpleNamespace(uri=self.uri, samples=self.samplems),
+            timestamp=int(time.time() * 1000),
+        )
+
+
+def enabled() -> bool:
+    from django.conf import settings
+
+    return bool(getattr(settings, "FINGERPRINT_SIGNATURES", True)) and _get_recognizer() is not None
+
+
+def _get_recognizer():
+    global _recognizer
+
+    if _recognizer is None:
+        with _recognizer_lock:
+            if _recognizer is None:
+                try:
+                    from shazamio_core import Recognizer
+                except ImportError:
+                    logger.info("shazamio_core not available -- uploading clips instead of signatures")
+                    _recognizer = False
+                else:
+                    _recognizer = Recognizer(segment_duration_seconds=SIGNATURE_SECONDS)
+    return _recognizer or None
+
+
+async def sign_batch(clips: list, sample_rate: int) -> list:
+    """
+    Signatures of int16 PCM clips, computed concurrently.
+
+    Returns one Signature per clip, None where signing failed.
+    """
+    from radios.analysis.audio_codec import _wav_bytes
+
+    recognizer = _get_recognizer()
+    if recognizer is None:
+        return [None] * len(clips)
+    signed = await asyncio.gather(
+        *(recognizer.recognize_bytes(value=_wav_bytes(pcm, sample_rate)) for pcm in clips),
+        return_exceptions=True,
+    )
+    signatures = []
+    for sig in signed:
+        if isinstance(sig, Exception):
+            logger.warning("Could not compute Shazam signature: %s", sig)
+            signatures.append(None)
+        else:
+            signatures.append(Signature(uri=sig.signature.uri, samplems=int(sig.signature.samples)))
+    return signatures
+
+
+def sign(clips: list, sample_rate: int) -> list:
+    """
+    sign_batch() from synchronous code.
+
+    Inside a running event loop (asyncio.run() would raise), the batch is
+    signed on a fresh loop in a worker thread, as _recognize_sync() does.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if loop and loop.is_running():
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, sign_batch(clips, sample_rate)).result()
+    return asyncio.run(sign_batch(clips, sample_rate))
+
+
+def _source_id(source_path: str) -> str:
+    try:
+        st = os.stat(source_path)
+    except OSError:
+        return ""
+    return f"{os.path.abspath(source_path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def _offset_key(offset: float) -> str:
+    return f"{offset:.2f}"
+
+
+class SignatureCache:
+    """The cached window signatures of one segment (<directory>/<segment id>.json)."""
+
+    def __init__(self, directory: str, segment_id, source_path: str):
+        self.path = os.path.join(str(directory), f"{segment_id}.json")
+        self._source = _source_id(source_path)
+        self._windows: dict = {}   # offset key -> [duration, uri, samplems]
+        self._dirty = False
+        self._load()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def get(self, offset: float, duration: float) -> Optional[Signature]:
+        entry = self._windows.get(_offset_key(offset))
+        if entry is None or abs(entry[0] - duration) > 0.01:
+            return None
+        return Signature(uri=entry[1], samplems=entry[2])
+
+    def put(self, offset: float, duration: float, signature: Signature):
+        self._windows[_offset_key(offset)] = [duration, signature.uri, signature.samplems]
+        self._dirty = True
+
+    def save(self):
+        """Write the file atomically if anything was added; failures are logged and ignored."""
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"format": CACHE_FORMAT, "source": self._source,
+                           "windows": self._windows}, f)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError as exc:
+            logger.warning("Cannot write signature cache %s: %s", self.path, exc)
+
+    def discard(self):
+        self._windows.clear()
+        self._dirty = False
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.warning("Cannot remove signature cache %s: %s", self.path, exc)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable signature cache %s: %s", self.path, exc)
+            return
+        if data.get("format") == CACHE_FORMAT and data.get("source") == self._source:
+            self._windows = data.get("windows", {})
+
+
+def get_cache(segment_id, source_path: str) -> Optional[SignatureCache]:
+    """The signature cache of a segment, or None (no segment id, or caching disabled)."""
+    from django.conf import settings
+
+    directory = getattr(settings, "FINGERPRINT_SIGNATURE_CACHE_DIR", None)
+    if segment_id is None or not directory:
+        return None
+    return SignatureCache(directory, segment_id, source_path)
+
+
+def discard_segment(segment_id):
+    """Remove the cache file of a segment (called when the segment is deleted)."""
+    from django.conf import settings
+
+    directory = getattr(settings, "FINGERPRINT_SIGNATURE_CACHE_DIR", None)
+    if not directory:
+        return
+    path = os.path.join(str(directory), f"{segment_id}.json")
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as exc:
+        logger.warning("Cannot remove signature cache %s: %s", path, exc)
@@ -15,6 +15,8 @@ Architecture:
                                                        │
                                              on_segment_finalized()
                                                        │
+                                             SegmentEncoderPool (shared)
+                                                       │
                                              encode MP3 + save to DB
 
 Components:
@@ -26,14 +28,15 @@ Components:
 Security:
     - ffmpeg invoked via subprocess with list args (never shell=True)
     - Stream URLs validated to http/https before reaching here
-    - Temp files use /dev/shm for classifier (RAM-backed, auto-cleaned)
+    - Classifier runs on in-memory PCM (no temp files on the hot path)
     - Proxy URLs validated to allowed schemes only
 """
 
+import concurrent.futures
+import contextlib
 import datetime
 import logging
 import os
-import struct
 import subprocess
 import tempfile
 import threading
@@ -44,17 +47,19 @@ from urllib.parse import urlparse
 import numpy as np
 
 from django.conf import settings
-from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
 from django.db import transaction
 from django.utils import timezone
 
 from radios.models import Recording, Stream, TranscriptionSegment, TranscriptionSettings
+from radios.analysis import audio_codec
 from radios.analysis.segmenter import (
     SAMPLE_RATE,
-    _compute_energy_db,
-    _get_segmenter,
-    _refine_boundaries,
-    _spectral_flux,
+    classify_features_batch,
+    classify_pcm,
+    IncrementalFeatures,
+    IncrementalSpectralFlux,
     AudioSegment,
     REFINE_SEARCH_RADIUS,
 )
@@ -105,10 +110,37 @@ SEGMENT_MIN_DURATION = 10.0  # minimum segment duration before finalization (s)
 STABILITY_WINDOW = 10.0      # seconds of stable label before finalizing
 BYTES_PER_SAMPLE = 2         # int16
 MAX_SEGMENT_DURATION = 900.0 # 15 minutes
+MP3_BITRATE = "64k"          # stored segment bitrate
+CLASSIFY_TIMEOUT = 60.0      # max wait for a shared-scheduler inference result (s)
+ENCODE_DRAIN_TIMEOUT = 300.0 # max wait for pooled segment encodes when a session ends (s)
+
+# Sliding-context classification: each window is prefixed with already
+# classified audio so the CNN sees both sides of boundaries near the window
+# edge; only labels for the new region are emitted, and the last
+# CLASSIFY_HOLDBACK seconds are left for the next window (right context).
+# Opt-in (settings.STREAM_CLASSIFY_CONTEXT).  The stability window stays at
+# STABILITY_WINDOW until label-stability measurements justify a shorter one.
+CLASSIFY_CONTEXT = 0.0           # lookback prepended to each window (s), 0 = off
+CLASSIFY_HOLDBACK = 1.0          # trailing audio deferred to the next window (s)
+CONTEXT_STABILITY_WINDOW = STABILITY_WINDOW   # STABILITY_WINDOW used in sliding-context mode
 
 # Labels from inaSpeechSegmenter that we store (others are discarded)
 STORED_LABELS = {"speech", "music"}
 
+_INT16_SCALE = np.float32(1.0 / 32768.0)  # int16 → normalized float32
+
+# Opt-in lock-free ring buffer: the PCM reader never waits on classifier/
+# encoder reads (STREAM_PCM_BUFFER_LOCK_FREE overrides).  Overrun reads are
+# retried up to TAIL_READ_ATTEMPTS times where a fresher range is acceptable.
+PCM_BUFFER_LOCK_FREE = False
+TAIL_READ_ATTEMPTS = 3
+
+# Opt-in boundary refinement: the stream's spectral flux is tracked
+# incrementally as audio arrives and each finalized boundary snaps to the
+# proximity-weighted flux peak near it (STREAM_REFINE_BOUNDARIES overrides).
+REFINE_BOUNDARIES = False
+FLUX_HISTORY = 600.0         # seconds of flux kept for refinement
+
 
 # =============================================================================
 # RollingPCMBuffer
@@ -116,19 +148,40 @@ STORED_LABELS = {"speech", "music"}
 
 class RollingPCMBuffer:
     """
-    Thread-safe ring buffer of mono 16kHz int16 PCM samples.
+    Ring buffer of mono 16kHz int16 PCM samples, one writer, many readers.
 
     Tracks wall-clock timestamps so samples can be extracted by time range.
     Capacity is ~10 MB/min at 16kHz mono int16.
+
+    Two concurrency modes:
+        locked     — every append and read holds one RLock; a long read
+                     (a 15-minute encode) stalls the writer meanwhile.
+        lock_free  — the single writer never blocks.  It announces the
+                     samples it is about to overwrite (_write_claim),
+                     writes them, then publishes _total_written.  Readers
+                     copy without a lock and validate afterwards, seqlock
+                     style: if the claim reached into the range just read,
+                     the copy may be torn and is discarded (an overrun).
+
+    Sample i always lives at ring position i % capacity.
     """
 
-    def __init__(self, max_duration: float = BUFFER_DURATION):
+    def __init__(self, max_duration: float = BUFFER_DURATION, lock_free: bool = False):
         self._max_samples = int(max_duration * SAMPLE_RATE)
         self._buffer = np.zeros(self._max_samples, dtype=np.int16)
         self._write_pos = 0        # next write position (wraps around)
-        self._total_written = 0    # total samples ever written (monotonic)
+        self._total_written = 0    # total samples ever written (monotonic, published last)
+        self._write_claim = 0      # samples written once the in-flight append lands
         self._start_wall = None    # wall-clock time of sample 0
-        self._lock = threading.RLock()  # RLock: re-entrant (get_range_float32 calls _available_samples under the same lock)
+        self._start_mono = None    # monotonic time of sample 0 (ingest lag)
+        self.lock_free = lock_free
+        # RLock: re-entrant (read() calls _available_samples under the same lock)
+        self._lock = contextlib.nullcontext() if lock_free else threading.RLock()
+
+        # Metrics
+        self.overruns = 0              # reads discarded because the writer lapped them
+        self.read_retries = 0          # tail reads retried after an overrun
+        self.max_append_seconds = 0.0  # worst append() latency, incl. lock waits
 
     @property
     def total_duration(self) -> float:
@@ -136,36 +189,61 @@ class RollingPCMBuffer:
         with self._lock:
             return self._total_written / SAMPLE_RATE
 
+    @property
+    def ingest_lag(self) -> float:
+        """
+        Seconds the ingested audio trails wall-clock time since sample 0.
+
+        For a live source this is backpressure: it grows while the reader
+        is stalled and ffmpeg's stdout pipe fills up.
+        """
+        if self._start_mono is None:
+            return 0.0
+        return (time.monotonic() - self._start_mono) - self._total_written / SAMPLE_RATE
+
+    def stats(self) -> dict:
+        return {
+            "lock_free": self.lock_free,
+            "overruns": self.overruns,
+            "read_retries": self.read_retries,
+            "max_append_seconds": self.max_append_seconds,
+            "ingest_lag": self.ingest_lag,
+        }
+
     def append(self, samples: np.ndarray):
         """Append int16 PCM samples to the buffer."""
+        t0 = time.monotonic()
         with self._lock:
-            if self._start_wall is None:
-                self._start_wall = timezone.now()
+            self._append(samples)
+        elapsed = time.monotonic() - t0
+        if elapsed > self.max_append_seconds:
+            self.max_append_seconds = elapsed
+
+    def _append(self, samples: np.ndarray):
+        if self._start_wall is None:
+            self._start_wall = timezone.now()
+            self._start_mono = time.monotonic()
+
+        n = len(samples)
+        if n == 0:
+            return
 
-            n = len(samples)
-            if n == 0:
-                return
+        if n >= self._max_samples:
+            # More data than buffer can hold — keep only the tail
+            samples = samples[-self._max_samples:]
+            n = self._max_samples
 
-            if n >= self._max_samples:
-                # More data than buffer can hold — keep only the tail
-                samples = samples[-self._max_samples:]
-                n = self._max_samples
-                self._buffer[:] = samples
-                self._write_pos = 0
-                self._total_written += n
-                return
+        total = self._total_written
+        self._write_claim = total + n   # readers of overwritten samples will fail validation
 
-            # Write in up to two chunks (wrap-around)
-            end_pos = self._write_pos + n
-            if end_pos <= self._max_samples:
-                self._buffer[self._write_pos:end_pos] = samples
-            else:
-                first = self._max_samples - self._write_pos
-                self._buffer[self._write_pos:] = samples[:first]
-                self._buffer[:n - first] = samples[first:]
+        # Write in up to two chunks (wrap-around)
+        pos = total % self._max_samples
+        first = min(n, self._max_samples - pos)
+        self._buffer[pos:pos + first] = samples[:first]
+        self._buffer[:n - first] = samples[first:]
 
-            self._write_pos = end_pos % self._max_samples
-            self._total_written += n
+        self._write_pos = (total + n) % self._max_samples
+        self._total_written = total + n  # publish
 
     def get_tail(self, duration: float) -> Optional[np.ndarray]:
         """Return the last *duration* seconds of PCM as float32 samples."""
@@ -174,43 +252,122 @@ class RollingPCMBuffer:
             return None
         return self._extract_last_n(n_samples)
 
-    def get_range_float32(self, start_sec: float, end_sec: float) -> Optional[np.ndarray]:
+    @property
+    def total_samples(self) -> int:
+        """Total samples received since start (monotonic)."""
+        with self._lock:
+            return self._total_written
+
+    def get_range(
+        self,
+        start_sec: float,
+        end_sec: float,
+        dtype=np.int16,
+        out: Optional[np.ndarray] = None,
+        allow_view: bool = False,
+    ) -> Optional[np.ndarray]:
+        """
+        Extract PCM for [start_sec, end_sec] relative to stream start.
+        See read() for dtype / out / allow_view.
+        """
+        return self.read(
+            int(start_sec * SAMPLE_RATE), int(end_sec * SAMPLE_RATE),
+            dtype=dtype, out=out, allow_view=allow_view,
+        )
+
+    def get_range_float32(
+        self, start_sec: float, end_sec: float, out: Optional[np.ndarray] = None,
+    ) -> Optional[np.ndarray]:
         """
         Extract PCM for [start_sec, end_sec] relative to stream start.
         Returns float32 normalized samples, or None if range is unavailable.
         """
+        return self.get_range(start_sec, end_sec, dtype=np.float32, out=out)
+
+    def get_samples_float32(
+        self, start_sample: int, end_sample: int, out: Optional[np.ndarray] = None,
+    ) -> Optional[np.ndarray]:
+        """Like get_range_float32(), addressed by absolute sample index."""
+        return self.read(start_sample, end_sample, dtype=np.float32, out=out)
+
+    def read(
+        self,
+        start_sample: int,
+        end_sample: int,
+        dtype=np.int16,
+        out: Optional[np.ndarray] = None,
+        allow_view: bool = False,
+    ) -> Optional[np.ndarray]:
+        """
+        Read samples [start_sample, end_sample) by absolute sample index.
+
+        dtype       np.int16 (raw samples) or np.float32 (normalized to [-1, 1)).
+        out         preallocated 1-D array of *dtype* with room for the range;
+                    it is filled in place and the used prefix is returned, so
+                    callers can reuse one scratch buffer across reads.
+        allow_view  for int16 reads without *out*, return a read-only view of
+                    the ring when the range does not wrap (no copy at all).
+                    The view aliases live buffer memory and is overwritten
+                    once the writer laps it (BUFFER_DURATION later), so use
+                    it right away and do not keep it.
+
+        Returns None if the range is empty or not (or no longer) buffered.
+        """
+        dtype = np.dtype(dtype)
+        if dtype not in (np.dtype(np.int16), np.dtype(np.float32)):
+            raise ValueError(f"Unsupported PCM dtype: {dtype}")
+
         with self._lock:
-            avail = self._available_samples()
+            total = self._total_written   # one snapshot; the writer may move on
+            avail = min(total, self._max_samples)
             if avail == 0:
                 return None
 
-            start_sample = int(start_sec * SAMPLE_RATE)
-            end_sample = int(end_sec * SAMPLE_RATE)
-
             # Oldest available sample index
-            oldest = self._total_written - avail
-            if start_sample < oldest or end_sample > self._total_written:
+            oldest = total - avail
+            if start_sample < oldest or end_sample > total:
                 return None
 
-            # Convert to buffer-relative positions
-            offset_start = start_sample - oldest
-            offset_end = end_sample - oldest
-            n = offset_end - offset_start
+            n = end_sample - start_sample
             if n <= 0:
                 return None
 
-            # Read position in ring buffer
-            read_start = (self._write_pos - avail + offset_start) % self._max_samples
-            result = np.zeros(n, dtype=np.int16)
-
-            if read_start + n <= self._max_samples:
-                result[:] = self._buffer[read_start:read_start + n]
+            # Read position in ring buffer; the range is at most two slices
+            read_start = start_sample % self._max_samples
+            first = min(n, self._max_samples - read_start)
+            head = self._buffer[read_start:read_start + first]
+            tail = self._buffer[:n - first]
+
+            if out is None:
+                if allow_view and dtype == np.int16 and first == n:
+                    view = head.view()
+                    view.flags.writeable = False
+                    return self._validated(view, start_sample)
+                out = np.empty(n, dtype=dtype)
             else:
-                first = self._max_samples - read_start
-                result[:first] = self._buffer[read_start:]
-                result[first:] = self._buffer[:n - first]
-
-            return result.astype(np.float32) / 32768.0
+                if out.dtype != dtype or out.ndim != 1 or len(out) < n:
+                    raise ValueError(
+                        f"out must be a 1-D {dtype} array of at least {n} samples"
+                    )
+                out = out[:n]
+
+            if dtype == np.int16:
+                out[:first] = head
+                out[first:] = tail
+            else:
+                np.multiply(head, _INT16_SCALE, out=out[:first])
+                np.multiply(tail, _INT16_SCALE, out=out[first:])
+            return self._validated(out, start_sample)
+
+    def _validated(self, result: np.ndarray, start_sample: int) -> Optional[np.ndarray]:
+        """Seqlock check: drop *result* if the writer claimed any of it meanwhile."""
+        if self._write_claim - self._max_samples > start_sample:
+            self.overruns += 1
+            logger.warning(
+                "PCM buffer overrun: read from sample %d lapped by writer", start_sample,
+            )
+            return None
+        return result
 
     def get_wall_time(self, stream_sec: float) -> Optional[datetime.datetime]:
         """Convert stream-relative seconds to wall-clock datetime."""
@@ -223,22 +380,17 @@ class RollingPCMBuffer:
         with self._lock:
             return min(self._total_written, self._max_samples)
 
-    def _extract_last_n(self, n: int) -> np.ndarray:
+    def _extract_last_n(self, n: int) -> Optional[np.ndarray]:
         """Extract the last n samples as float32 (caller must check n > 0)."""
-        with self._lock:
-            avail = self._available_samples()
-            n = min(n, avail)
-            start = (self._write_pos - n) % self._max_samples
-            result = np.zeros(n, dtype=np.int16)
-
-            if start + n <= self._max_samples:
-                result[:] = self._buffer[start:start + n]
-            else:
-                first = self._max_samples - start
-                result[:first] = self._buffer[start:]
-                result[first:] = self._buffer[:n - first]
-
-            return result.astype(np.float32) / 32768.0
+        for _attempt in range(TAIL_READ_ATTEMPTS):
+            with self._lock:
+                total = self._total_written
+                count = min(n, total, self._max_samples)
+                result = self.read(total - count, total, dtype=np.float32)
+            if result is not None:
+                return result
+            self.read_retries += 1
+        return None
 
 
 # =============================================================================
@@ -266,14 +418,21 @@ class SegmentStateMachine:
     when to finalize segments.
 
     Delayed finalization: a segment is only finalized when a different label
-    has been stable for STABILITY_WINDOW seconds AND the active segment
-    exceeds SEGMENT_MIN_DURATION.
+    has been stable for *stability_window* seconds (STABILITY_WINDOW by
+    default) AND the active segment exceeds SEGMENT_MIN_DURATION.
 
     Silence (noEnergy) and noise segments are discarded (not stored).
+
+    With *refine_fn(boundary, lo_sec, hi_sec)* the boundary between the
+    finalized segment and its successor is moved to the returned position
+    (None keeps it), e.g. IncrementalSpectralFlux.refine.
     """
 
-    def __init__(self, on_finalized):
+    def __init__(self, on_finalized, stability_window: float = STABILITY_WINDOW,
+                 refine_fn=None):
         self._on_finalized = on_finalized
+        self._stability_window = stability_window
+        self._refine_fn = refine_fn
         self._active: Optional[_ActiveSegment] = None
         self._pending_label: Optional[str] = None
         self._pending_since: float = 0.0
@@ -313,14 +472,19 @@ class SegmentStateMachine:
 
             pending_duration = seg_end - self._pending_since
 
-            if (pending_duration >= STABILITY_WINDOW
+            if (pending_duration >= self._stability_window
                     and self._active.duration >= SEGMENT_MIN_DURATION):
+                boundary = self._pending_since
+                if self._refine_fn is not None:
+                    boundary = self._refined(boundary, seg_end)
+                    self._active.end_sec = boundary
+
                 # Finalize the active segment
                 self._finalize_active()
 
                 # Start new segment if the new label is stored
                 if mapped in STORED_LABELS:
-                    self._active = _ActiveSegment(mapped, self._pending_since)
+                    self._active = _ActiveSegment(mapped, boundary)
                     self._active.end_sec = seg_end
                 else:
                     self._active = None
@@ -329,6 +493,19 @@ class SegmentStateMachine:
                 # Not stable enough yet — keep extending active
                 self._active.end_sec = seg_end
 
+    def _refined(self, boundary: float, audio_end: float) -> float:
+        """Refine *boundary* within the active segment and the audio seen so far.
+
+        The finalized segment never drops below SEGMENT_MIN_DURATION.
+        """
+        lo_sec = max(self._active.start_sec + SEGMENT_MIN_DURATION,
+                     boundary - REFINE_SEARCH_RADIUS)
+        hi_sec = min(audio_end - 1.0, boundary + REFINE_SEARCH_RADIUS)
+        if lo_sec >= hi_sec:
+            return boundary
+        refined = self._refine_fn(boundary, lo_sec, hi_sec)
+        return boundary if refined is None else refined
+
     def flush(self):
         """Finalize any remaining active segment (called on stream stop)."""
         if self._active and self._active.duration >= 2.0:
@@ -376,13 +553,77 @@ class SegmentStateMachine:
 # StreamSegmentEncoder
 # =============================================================================
 
+def _int16_energy_db(pcm: np.ndarray, chunk: int = SAMPLE_RATE) -> float:
+    """
+    RMS energy in dB of int16 samples, on the normalized [-1, 1) scale.
+
+    Squares are summed in float64 one *chunk* at a time, so a segment read
+    as a view of the ring is never copied whole.
+    """
+    if pcm is None or not len(pcm):
+        return -100.0
+    total = 0.0
+    for lo in range(0, len(pcm), chunk):
+        block = pcm[lo:lo + chunk].astype(np.float64)
+        total += float(np.dot(block, block))
+    rms = np.sqrt(total / len(pcm)) / 32768.0
+    return 20.0 * np.log10(rms + 1e-10)
+
+
+def _store_segment_file(seg_obj, filename: str, data: bytes) -> str:
+    """
+    Write *data* as seg_obj's file and return the storage name (row not saved).
+
+    On local filesystem storage the bytes go straight to the final path: a
+    ``.part`` sibling is written and fsync'ed, then atomically renamed, so a
+    crash never leaves a truncated MP3 under the real name.  Other storage
+    backends receive the in-memory bytes as a ContentFile.
+    """
+    field = seg_obj.file.field
+    storage = seg_obj.file.storage
+    name = field.generate_filename(seg_obj, filename)
+
+    if not isinstance(storage, FileSystemStorage):
+        return storage.save(name, ContentFile(data), max_length=field.max_length)
+
+    name = storage.get_available_name(name, max_length=field.max_length)
+    path = storage.path(name)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    part_path = f"{path}.part"
+    fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if storage.file_permissions_mode is not None:
+            os.chmod(part_path, storage.file_permissions_mode)
+        os.replace(part_path, path)
+    except BaseException:
+        try:
+            os.unlink(part_path)
+        except OSError:
+            pass
+        raise
+
+    # Persist the rename itself
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return name
+
+
 class StreamSegmentEncoder:
     """
-    Given finalized segment metadata and a RollingPCMBuffer reference:
+    Given finalized segment metadata (boundaries already refined by the
+    state machine) and a RollingPCMBuffer reference:
     1. Extract PCM samples for the time range
-    2. Optionally refine boundary using spectral flux
-    3. Encode to MP3 via ffmpeg
-    4. Save file via Django storage and create TranscriptionSegment row
+    2. Encode to MP3 via the shared audio codec
+    3. Write the file to its final storage path, then create the TranscriptionSegment row
     """
 
     def __init__(self, buffer: RollingPCMBuffer, recording: Recording):
@@ -391,20 +632,8 @@ class StreamSegmentEncoder:
 
     def encode_and_save(self, segment: AudioSegment):
         """Encode a finalized segment to MP3 and persist to DB."""
-        # Extract PCM with context for boundary refinement
-        context_start = max(0, segment.start - 10.0)
-        context_end = segment.end + 10.0
-        pcm_context = self._buffer.get_range_float32(context_start, context_end)
-
-        energy = 0.0
-        if pcm_context is not None:
-            # Compute energy on the segment portion only
-            seg_offset_start = segment.start - context_start
-            seg_offset_end = segment.end - context_start
-            energy = _compute_energy_db(pcm_context, seg_offset_start, seg_offset_end)
-
-        # Extract just the segment PCM
-        pcm = self._buffer.get_range_float32(segment.start, segment.end)
+        # int16 segment PCM, straight from the ring when it does not wrap
+        pcm = self._buffer.get_range(segment.start, segment.end, allow_view=True)
         if pcm is None:
             logger.warning(
                 "Cannot extract PCM for segment [%.1f-%.1fs] — buffer expired",
@@ -412,7 +641,10 @@ class StreamSegmentEncoder:
             )
             return
 
-        # Encode to MP3 via ffmpeg pipe
+        # Energy from the same int16 samples (no second, float32 read)
+        energy = _int16_energy_db(pcm)
+
+        # Encode to MP3 (in-process when PyAV is available)
         mp3_data = self._encode_mp3(pcm)
         if mp3_data is None:
             return
@@ -431,37 +663,27 @@ class StreamSegmentEncoder:
             f"{wall_end:%H%M%S}.mp3"
         )
 
-        # Save to DB
+        # File first (durable at its final path), then the DB row
+        stored_name = None
         try:
             # Determine initial pipeline statuses for this segment
             stream = self._recording.stream
             seg_statuses = _initial_segment_statuses(segment.segment_type, stream)
 
+            seg_obj = TranscriptionSegment(
+                recording=self._recording,
+                segment_type=segment.segment_type,
+                start_offset=segment.start,
+                end_offset=segment.end,
+                absolute_start_time=wall_start,
+                absolute_end_time=wall_end,
+                energy_db=round(energy, 1),
+                **seg_statuses,
+            )
+            stored_name = _store_segment_file(seg_obj, filename, mp3_data)
+            seg_obj.file.name = stored_name
             with transaction.atomic():
-                seg_obj = TranscriptionSegment(
-                    recording=self._recording,
-                    segment_type=segment.segment_type,
-                    start_offset=segment.start,
-                    end_offset=segment.end,
-                    absolute_start_time=wall_start,
-                    absolute_end_time=wall_end,
-                    energy_db=round(energy, 1),
-                    **seg_statuses,
-                )
-                # Write MP3 data to a temp file, then save via Django
-                tmp_path = os.path.join(
-                    tempfile.gettempdir(), f"aum_seg_{os.getpid()}_{id(segment)}.mp3"
-                )
-                try:
-                    with open(tmp_path, "wb") as f:
-                        f.write(mp3_data)
-                    with open(tmp_path, "rb") as f:
-                        seg_obj.file.save(filename, File(f), save=True)
-                finally:
-                    try:
-                        os.unlink(tmp_path)
-                    except OSError:
-                        pass
+                seg_obj.save()
 
             logger.info(
                 "Saved segment: %s [%.1f-%.1fs] (%d bytes MP3)",
@@ -472,41 +694,35 @@ class StreamSegmentEncoder:
                 "Failed to save segment [%.1f-%.1fs]",
                 segment.start, segment.end,
             )
+            if stored_name:
+                # No row points at the file: don't leave an orphan behind
+                try:
+                    TranscriptionSegment.file.field.storage.delete(stored_name)
+                except Exception:
+                    logger.exception("Could not remove orphaned segment file %s", stored_name)
 
     @staticmethod
-    def _encode_mp3(pcm_float32: np.ndarray) -> Optional[bytes]:
-        """Encode float32 PCM to MP3 via ffmpeg pipe. Returns bytes or None."""
-        pcm_int16 = (pcm_float32 * 32767).astype(np.int16)
-        pcm_bytes = pcm_int16.tobytes()
-
-        cmd = [
-            "ffmpeg",
-            "-y", "-hide_banner", "-loglevel", "warning",
-            "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1",
-            "-i", "pipe:0",
-            "-c:a", "libmp3lame", "-b:a", "64k",
-            "-f", "mp3", "pipe:1",
-        ]
-        try:
-            result = subprocess.run(
-                cmd,
-                input=pcm_bytes,
-                capture_output=True,
-                timeout=60,
-            )
-            if result.returncode != 0:
-                logger.error("ffmpeg MP3 encode failed: %s", result.stderr[:500])
-                return None
-            return result.stdout
-        except (subprocess.TimeoutExpired, OSError) as exc:
-            logger.error("ffmpeg MP3 encode error: %s", exc)
-            return None
+    def _encode_mp3(pcm_int16: np.ndarray) -> Optional[bytes]:
+        """Encode int16 PCM to MP3 via the shared audio codec. Returns bytes or None."""
+        return audio_codec.encode_mp3(pcm_int16, SAMPLE_RATE, MP3_BITRATE)
 
 
 # =============================================================================
 # StreamProcessor
 # =============================================================================
 
+class _Window:
+    """One classifier window: either raw PCM or (context) precomputed features."""
+    __slots__ = ("start", "end", "pcm", "feats", "offset")
+
+    def __init__(self, start: float, end: float, pcm=None, feats=None, offset: float = 0.0):
+        self.start = start    # stream seconds covered by emitted labels
+        self.end = end
+        self.pcm = pcm        # float32 samples of [start, end] (isolated windows)
+        self.feats = feats    # (mspec, loge, difflen) incl. lookback (context mode)
+        self.offset = offset  # stream time of the first feature frame
+
+
 class StreamProcessor:
     """
     Per-stream orchestrator for the real-time segmentation pipeline.
@@ -514,11 +730,32 @@ class StreamProcessor:
     Starts ffmpeg outputting mono 16kHz PCM to stdout.
     Reader thread: reads PCM in 0.5s chunks, appends to RollingPCMBuffer.
     Classifier thread: every ~10s, classifies buffer tail, feeds SegmentStateMachine.
-    On segment finalized: StreamSegmentEncoder saves MP3 + DB row.
+        When a shared InferenceScheduler is given, windows are batched with
+        those of other streams instead of calling the CNN directly.
+    With a shared PCMIngestLoop both per-stream threads are replaced by the
+        loop's selector and dispatch threads (windows submitted async).
+        With context > 0 (STREAM_CLASSIFY_CONTEXT) each window carries that
+        many seconds of lookback (features cached, not recomputed) for steadier boundaries.
+    On segment finalized: StreamSegmentEncoder saves MP3 + DB row — on a
+        shared SegmentEncoderPool when one is given, so a long encode never
+        delays the next classification.
     """
 
-    def __init__(self, stream: Stream):
+    def __init__(self, stream: Stream, scheduler=None, context: Optional[float] = None,
+                 encoder_pool=None, ingest_loop=None):
         self.stream = stream
+        self._scheduler = scheduler  # shared InferenceScheduler, or None for inline CNN calls
+        self._encoder_pool = encoder_pool  # shared SegmentEncoderPool, or None to encode inline
+        self._pending_encodes: list = []   # Futures of segments handed to the pool
+        # Shared PCMIngestLoop, or None for per-stream reader/classifier threads
+        self._ingest_loop = ingest_loop
+        self._classify_lock = threading.Lock()  # serializes window dispatch/completion vs flush
+        self._inflight: Optional[tuple] = None  # (window, Future) awaiting the scheduler
+        self._next_dispatch = 0.0
+        self._ingest_partial = b""
+        if context is None:
+            context = getattr(settings, "STREAM_CLASSIFY_CONTEXT", CLASSIFY_CONTEXT)
+        self._context = context      # sliding-context lookback (s), 0 = isolated windows
         self.last_heartbeat = time.monotonic()
         self.started_at = None
         self.running = False
@@ -526,13 +763,18 @@ class StreamProcessor:
         self._reader_thread: Optional[threading.Thread] = None
         self._classifier_thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
-        self._buffer = RollingPCMBuffer()
+        self._buffer = RollingPCMBuffer(
+            lock_free=getattr(settings, "STREAM_PCM_BUFFER_LOCK_FREE", PCM_BUFFER_LOCK_FREE),
+        )
+        self._reported_overruns = 0
         self._recording: Optional[Recording] = None
         self._encoder: Optional[StreamSegmentEncoder] = None
         self._state_machine: Optional[SegmentStateMachine] = None
         self._stderr_path: Optional[str] = None
         self._stderr_fh = None
         self._last_classified_sec: float = 0.0
+        self._features: Optional[IncrementalFeatures] = None
+        self._flux: Optional[IncrementalSpectralFlux] = None
 
     def is_alive(self) -> bool:
         return self._process is not None and self._process.poll() is None
@@ -552,9 +794,16 @@ class StreamProcessor:
         )
 
         self._encoder = StreamSegmentEncoder(self._buffer, self._recording)
+        if getattr(settings, "STREAM_REFINE_BOUNDARIES", REFINE_BOUNDARIES):
+            self._flux = IncrementalSpectralFlux(history=FLUX_HISTORY)
         self._state_machine = SegmentStateMachine(
-            on_finalized=self._on_segment_finalized
+            on_finalized=self._on_segment_finalized,
+            stability_window=(
+                CONTEXT_STABILITY_WINDOW if self._context > 0 else STABILITY_WINDOW
+            ),
+            refine_fn=self._flux.refine if self._flux else None,
         )
+        self._features = IncrementalFeatures() if self._context > 0 else None
         self._stop_event.clear()
 
         self._start_ffmpeg()
@@ -565,10 +814,12 @@ class StreamProcessor:
         self._stop_event.set()
 
         self._stop_ffmpeg()
+        self._detach_ingest()
 
         # Flush remaining segments
         if self._state_machine:
             self._state_machine.flush()
+        self._wait_for_encodes()
 
         # Update session recording end time
         if self._recording:
@@ -577,6 +828,7 @@ class StreamProcessor:
                 segmentation_status="done",
             )
 
+        logger.info("StreamProcessor[%s]: PCM buffer stats %s", self.stream, self._buffer.stats())
         self._cleanup()
         self._update_stream_status("idle", "")
 
@@ -603,9 +855,12 @@ class StreamProcessor:
 
             logger.warning("StreamProcessor[%s]: %s", self.stream, error_msg)
 
+            self._detach_ingest()
+
             # Flush any accumulated segments
             if self._state_machine:
                 self._state_machine.flush()
+            self._wait_for_encodes()
 
             if self._recording:
                 Recording.objects.filter(pk=self._recording.pk).update(
@@ -681,6 +936,13 @@ class StreamProcessor:
             self._update_stream_status("error", str(e))
             return
 
+        if self._ingest_loop is not None:
+            self._ingest_partial = b""
+            self._next_dispatch = time.monotonic() + CLASSIFY_INTERVAL
+            self._ingest_loop.register(self)
+            self._update_stream_status("recording", "")
+            return
+
         # Start reader thread
         self._reader_thread = threading.Thread(
             target=self._pcm_reader,
@@ -718,6 +980,76 @@ class StreamProcessor:
         except (ValueError, OSError):
             pass  # pipe closed
 
+    # -- internal: shared ingest loop ----------------------------------------
+
+    def _ingest_fileno(self) -> int:
+        return self._process.stdout.fileno()
+
+    def _ingest(self, data: bytes):
+        """Selector thread: append raw s16le bytes (reads may split a sample)."""
+        if self._ingest_partial:
+            data = self._ingest_partial + data
+            self._ingest_partial = b""
+        if len(data) % BYTES_PER_SAMPLE:
+            self._ingest_partial = data[-1:]
+            data = data[:-1]
+        if data:
+            self._buffer.append(np.frombuffer(data, dtype=np.int16))
+
+    def _dispatch_window(self, completions):
+        """
+        Dispatch thread: submit the next window if one is due.
+
+        With a scheduler the window is queued asynchronously and its Future
+        reports back through *completions*; without one it is classified
+        inline.  At most one window per stream is in flight.
+        """
+        with self._classify_lock:
+            if self._stop_event.is_set() or self._inflight is not None:
+                return
+            now = time.monotonic()
+            if now < self._next_dispatch:
+                return
+            self._next_dispatch = now + CLASSIFY_INTERVAL
+            try:
+                if self._scheduler is None:
+                    self._classify_batch()
+                else:
+                    window = self._next_window()
+                    if window is not None:
+                        future = self._submit_window(window)
+                        self._inflight = (window, future)
+                        future.add_done_callback(
+                            lambda f, w=window: completions.put((self, w, f))
+                        )
+                self._check_buffer_overruns()
+            except Exception:
+                logger.exception("StreamProcessor[%s]: classifier error", self.stream)
+
+    def _complete_window(self, window: "_Window", future: concurrent.futures.Future):
+        """Dispatch thread: feed the result of an async window (in order, once)."""
+        with self._classify_lock:
+            if self._inflight is None or self._inflight[1] is not future:
+                return  # already handled by _detach_ingest()
+            self._inflight = None
+            self._feed_future(window, future, timeout=0)
+
+    def _feed_future(self, window: "_Window", future, timeout):
+        try:
+            self._finish_window(window, future.result(timeout=timeout))
+        except Exception:
+            logger.exception("StreamProcessor[%s]: classification failed", self.stream)
+
+    def _detach_ingest(self):
+        """Leave the ingest loop and settle the in-flight window before flushing."""
+        if self._ingest_loop is None:
+            return
+        self._ingest_loop.unregister(self)
+        with self._classify_lock:
+            inflight, self._inflight = self._inflight, None
+            if inflight is not None:
+                self._feed_future(*inflight, timeout=CLASSIFY_TIMEOUT)
+
     def _classifier_loop(self):
         """Background thread: periodically classify buffered audio."""
         # Wait for initial audio to accumulate
@@ -729,79 +1061,154 @@ class StreamProcessor:
             try:
                 self._classify_batch()
                 logger.debug(
-                    "Classifier tick: buffer=%.1fs last_classified=%.1fs",
+                    "Classifier tick: buffer=%.1fs last_classified=%.1fs "
+                    "ingest_lag=%.1fs max_append=%.3fs",
                     self._buffer.total_duration,
                     self._last_classified_sec,
+                    self._buffer.ingest_lag,
+                    self._buffer.max_append_seconds,
                 )
+                self._check_buffer_overruns()
             except Exception:
                 logger.exception("StreamProcessor[%s]: classifier error", self.stream)
 
             self._stop_event.wait(timeout=CLASSIFY_INTERVAL)
 
+    def _check_buffer_overruns(self):
+        """Warn once per batch of new ring-buffer overruns (reads lost to the writer)."""
+        overruns = self._buffer.overruns
+        if overruns > self._reported_overruns:
+            logger.warning(
+                "StreamProcessor[%s]: %d PCM buffer overrun(s) so far; %s",
+                self.stream, overruns, self._buffer.stats(),
+            )
+            self._reported_overruns = overruns
+
     def _classify_batch(self):
         """
         Classify the latest un-classified audio via inaSpeechSegmenter.
 
-        Writes PCM to a temp file (in /dev/shm if available, ~320KB per batch),
-        runs the already-loaded CNN singleton, feeds labels to state machine.
+        The ring buffer slice is handed straight to the CNN (features
+        computed in-process — no temp WAV, no ffmpeg), either through the
+        shared InferenceScheduler or, without one, the loaded singleton.
+        The resulting labels are fed to the state machine.
         """
-        current_duration = self._buffer.total_duration
+        window = self._next_window()
+        if window is None:
+            return
+        try:
+            if self._scheduler is not None:
+                raw_labels = self._submit_window(window).result(timeout=CLASSIFY_TIMEOUT)
+            elif window.feats is not None:
+                raw_labels = classify_features_batch([(window.feats, window.offset)])[0]
+            else:
+                raw_labels = classify_pcm(window.pcm)
+            self._finish_window(window, raw_labels)
+        except Exception:
+            logger.exception("StreamProcessor[%s]: classification failed", self.stream)
+
+    def _next_window(self) -> Optional["_Window"]:
+        """
+        Cut the next window from the ring buffer, or None if not enough new audio.
+
+        Marks the window's range as classified: the caller owns it from here.
+        """
+        if self._features is not None:
+            return self._next_context_window()
+
         batch_start = self._last_classified_sec
-        batch_end = current_duration
+        batch_end = self._buffer.total_duration
 
         if batch_end - batch_start < CLASSIFY_INTERVAL * 0.5:
-            return  # not enough new audio
+            return None  # not enough new audio
 
         pcm = self._buffer.get_range_float32(batch_start, batch_end)
         if pcm is None or len(pcm) < SAMPLE_RATE:
-            return
+            return None
 
-        # Write to temp file for inaSpeechSegmenter
-        # Prefer /dev/shm (RAM-backed) for speed
-        shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
-        tmp_fd, tmp_path = tempfile.mkstemp(
-            suffix=".wav", prefix="aum_cls_", dir=shm_dir,
-        )
-        try:
-            os.close(tmp_fd)
-            # Write as WAV for inaSpeechSegmenter compatibility
-            self._write_wav(tmp_path, pcm)
+        self._last_classified_sec = batch_end
+        return _Window(batch_start, batch_end, pcm=pcm)
 
-            segmenter = _get_segmenter()
-            raw_labels = segmenter(tmp_path)
+    def _next_context_window(self) -> Optional["_Window"]:
+        """
+        Sliding-context variant of _next_window().
 
-            logger.debug("Classifier output: %s", raw_labels)
+        The CNN sees [new_start - context, now]; labels are emitted for
+        [new_start, now - holdback] only.  Mel features of the overlap come
+        from the IncrementalFeatures cache instead of being recomputed.
+        """
+        new_start = int(round(self._last_classified_sec * SAMPLE_RATE))
+        total = self._buffer.total_samples
+        emit_end = total - int(CLASSIFY_HOLDBACK * SAMPLE_RATE)
 
-            if raw_labels:
-                self._state_machine.feed(
-                    raw_labels, batch_start,
-                    batch_end - batch_start,
-                )
-        except Exception:
-            logger.exception("StreamProcessor[%s]: classification failed", self.stream)
-        finally:
-            try:
-                os.unlink(tmp_path)
-            except OSError:
-                pass
+        if (emit_end - new_start) / SAMPLE_RATE < CLASSIFY_INTERVAL * 0.5:
+            return None  # not enough new audio
 
+        # Align the window start to the CNN's 20 ms patch grid
+        grid = 2 * SAMPLE_RATE // 100
+        ctx_start = max(0, new_start - int(self._context * SAMPLE_RATE))
+        ctx_start -= ctx_start % grid
+
+        feats = self._features.window(ctx_start, total, self._buffer.get_samples_float32)
+        if feats is None:
+            return None
+
+        batch_end = emit_end / SAMPLE_RATE
         self._last_classified_sec = batch_end
+        return _Window(
+            new_start / SAMPLE_RATE, batch_end, feats=feats, offset=ctx_start / SAMPLE_RATE,
+        )
 
-    @staticmethod
-    def _write_wav(path: str, pcm_float32: np.ndarray):
-        """Write float32 PCM to a 16kHz mono WAV file."""
-        import wave
-        pcm_int16 = (pcm_float32 * 32767).astype(np.int16)
-        with wave.open(path, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(SAMPLE_RATE)
-            wf.writeframes(pcm_int16.tobytes())
+    def _submit_window(self, window: "_Window") -> concurrent.futures.Future:
+        """Queue *window* on the shared scheduler."""
+        if window.feats is not None:
+            return self._scheduler.submit_features(self.stream.pk, window.feats, window.offset)
+        return self._scheduler.submit(self.stream.pk, window.pcm)
+
+    def _finish_window(self, window: "_Window", raw_labels: list):
+        """Feed a classified window's labels to the state machine."""
+        batch_start, batch_end = window.start, window.end
+        if window.feats is not None:
+            # Keep the new region only, relative to its start
+            labels = [
+                (label, max(start, batch_start) - batch_start,
+                 min(end, batch_end) - batch_start)
+                for label, start, end in raw_labels
+                if end > batch_start and start < batch_end
+            ]
+        else:
+            labels = raw_labels
+        logger.debug("Classifier output: %s", labels)
+
+        if labels:
+            if self._flux is not None:
+                # Bring the flux envelope up to date before any boundary is refined
+                self._flux.update(self._buffer.total_samples, self._buffer.read)
+            self._state_machine.feed(labels, batch_start, batch_end - batch_start)
 
     def _on_segment_finalized(self, segment: AudioSegment):
         """Callback from state machine when a segment is finalized."""
-        if self._encoder:
+        if not self._encoder:
+            return
+        if self._encoder_pool is None:
             self._encoder.encode_and_save(segment)
+            return
+        self._pending_encodes = [f for f in self._pending_encodes if not f.done()]
+        self._pending_encodes.append(
+            self._encoder_pool.submit(self._recording.pk, self._encoder, segment)
+        )
+
+    def _wait_for_encodes(self):
+        """Block until segments handed to the pool are saved (before closing the session)."""
+        pending, self._pending_encodes = self._pending_encodes, []
+        if not pending:
+            return
+        _done, not_done = concurrent.futures.wait(pending, timeout=ENCODE_DRAIN_TIMEOUT)
+        if not_done:
+            logger.warning(
+                "StreamProcessor[%s]: %d segment encode(s) still pending after %.0fs",
+                self.stream, len(not_done), ENCODE_DRAIN_TIMEOUT,
+            )
 
     def _stop_ffmpeg(self):
         """Send SIGTERM to ffmpeg, wait, then SIGKILL if needed."""
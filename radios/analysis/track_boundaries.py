@@ -0,0 +1,192 @@
+"""
+Track boundaries inside a music segment, from spectral novelty.
+
+A music segment is often several songs back to back (a music block, a
+mixtape, a DJ set).  The fingerprinter used to find them by walking the
+segment: jump _DEFAULT_TRACK_DUR ahead after a match, _FAIL_STEP after a
+miss -- which loses short songs, re-queries long ones and spends the
+per-segment attempt budget on mixes.  This module predicts where the
+songs change before anything is sent to Shazam, so the fingerprinter can
+place a window or two inside each predicted track instead
+(fingerprinter._TrackWindows).
+
+Method (Foote's novelty on a self-similarity matrix):
+    1. read the segment block by block, as fingerprinter._SegmentAudio
+       decodes it for the Shazam windows (no decode of its own);
+    2. per FEATURE_SEC: a chroma vector (harmony) and log band energies
+       (timbre / loudness), z-scored over the segment;
+    3. cosine self-similarity near the diagonal, correlated with a
+       Gaussian-tapered checkerboard kernel of half-width KERNEL_SEC --
+       high where the music before and after a point are alike within
+       themselves but unlike each other;
+    4. boundaries are novelty peaks at least MIN_TRACK_SEC apart and
+       PEAK_THRESHOLD robust standard deviations above the median.
+
+Only the diagonal band of the similarity matrix is computed, so memory is
+O(duration), not O(duration^2).  numpy only.
+"""
+
+import logging
+from typing import Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger("broadcast_analysis")
+
+# Analysis frame (seconds); frames tile the signal without overlap.
+FRAME_SEC = 0.25
+
+# Frames are averaged into one feature vector per FEATURE_SEC.
+FEATURE_SEC = 1.0
+
+# Chroma is computed from this frequency range (Hz).
+CHROMA_FMIN = 110.0
+CHROMA_FMAX = 2000.0
+
+# Log-spaced energy bands for timbre.
+N_BANDS = 16
+BAND_FMIN = 60.0
+BAND_FMAX = 3800.0
+
+# Half-width of the checkerboard kernel (seconds).  Changes shorter than
+# this (a chorus, a drop) are averaged out.  Range: 8-20 s.
+KERNEL_SEC = 12.0
+
+# No two boundaries closer than this (seconds); also the shortest track
+# predicted at a segment edge.  Range: 45-90 s.
+MIN_TRACK_SEC = 60.0
+
+# Peak height above the median novelty, in robust standard deviations
+# (1.4826 * MAD).  Lower = more boundaries.  Range: 3-8.
+PEAK_THRESHOLD = 5.0
+
+
+def enabled() -> bool:
+    from django.conf import settings
+
+    return bool(getattr(settings, "FINGERPRINT_TRACK_BOUNDARIES", True))
+
+
+def find_track_boundaries(blocks: Iterable, sample_rate: int, start: float) -> Optional[list]:
+    """
+    Predicted song changes in a segment, in absolute seconds.
+
+    *blocks* yields the segment's mono PCM in consecutive pieces from
+    *start* on (fingerprinter._SegmentAudio.blocks()); features are
+    computed block by block, so the segment never has to be held whole.
+    Returns an empty list for a segment holding one track (or too short to
+    split), None if no audio could be decoded.
+    """
+    per_feature = int(round(FEATURE_SEC * sample_rate))
+    features = []
+    carry = None    # samples of a feature step split across two blocks
+    for pcm in blocks:
+        if carry is not None and len(carry):
+            pcm = np.concatenate([carry, pcm])
+        usable = len(pcm) // per_feature * per_feature
+        features.append(_features(pcm[:usable], sample_rate))
+        carry = pcm[usable:]
+    if carry is None:
+        logger.warning("Could not decode audio for track boundaries")
+        return None
+
+    boundaries = [start + t for t in boundaries_from_features(np.concatenate(features))]
+    logger.debug(
+        "Track boundaries from %.1fs: %s",
+        start, ", ".join(f"{b:.0f}" for b in boundaries) or "none",
+    )
+    return boundaries
+
+
+def boundaries_from_pcm(pcm: np.ndarray, sample_rate: int) -> list:
+    """Predicted song changes in mono PCM, in seconds from its start."""
+    return boundaries_from_features(_features(pcm, sample_rate))
+
+
+def boundaries_from_features(features: np.ndarray) -> list:
+    """Boundary times (seconds) from one feature vector per FEATURE_SEC."""
+    if len(features) * FEATURE_SEC < 2 * MIN_TRACK_SEC:
+        return []
+    novelty = _novelty(_normalize(features))
+    return [round(k * FEATURE_SEC, 1) for k in _pick_peaks(novelty)]
+
+
+def _features(pcm: np.ndarray, sample_rate: int) -> np.ndarray:
+    """(seconds, 12 + N_BANDS) raw features: chroma, then log band energies."""
+    frame_n = int(FRAME_SEC * sample_rate)
+    per_feature = int(round(FEATURE_SEC / FRAME_SEC))
+    n_frames = len(pcm) // frame_n // per_feature * per_feature
+    if n_frames == 0:
+        return np.zeros((0, 12 + N_BANDS), dtype=np.float32)
+
+    frames = pcm[:n_frames * frame_n].reshape(n_frames, frame_n).astype(np.float32)
+    power = np.abs(np.fft.rfft(frames * np.hanning(frame_n).astype(np.float32), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(frame_n, 1.0 / sample_rate)
+
+    chroma_bins = (freqs >= CHROMA_FMIN) & (freqs <= CHROMA_FMAX)
+    pitch_class = np.round(12 * np.log2(freqs[chroma_bins] / 440.0)).astype(int) % 12
+    chroma = np.zeros((n_frames, 12), dtype=np.float32)
+    for pc in range(12):
+        chroma[:, pc] = power[:, chroma_bins][:, pitch_class == pc].sum(axis=1)
+
+    edges = np.geomspace(BAND_FMIN, BAND_FMAX, N_BANDS + 1)
+    band_of_bin = np.searchsorted(edges, freqs) - 1
+    bands = np.zeros((n_frames, N_BANDS), dtype=np.float32)
+    for b in range(N_BANDS):
+        bands[:, b] = power[:, band_of_bin == b].sum(axis=1)
+
+    # Pool frames into feature steps
+    chroma = chroma.reshape(-1, per_feature, 12).mean(axis=1)
+    bands = bands.reshape(-1, per_feature, N_BANDS).mean(axis=1)
+    chroma /= chroma.sum(axis=1, keepdims=True) + 1e-9
+    return np.hstack([chroma, np.log10(bands + 1e-3)])
+
+
+def _normalize(features: np.ndarray) -> np.ndarray:
+    """Z-score each dimension over the segment, then unit-length rows (for cosine)."""
+    z = (features - features.mean(axis=0)) / (features.std(axis=0) + 1e-6)
+    return z / (np.linalg.norm(z, axis=1, keepdims=True) + 1e-6)
+
+
+def _kernel(half: int) -> np.ndarray:
+    """Gaussian-tapered checkerboard kernel of size 2 * half."""
+    idx = np.arange(-half, half) + 0.5
+    sign = np.sign(idx)
+    taper = np.exp(-0.5 * (idx / (0.5 * half)) ** 2)
+    kernel = np.outer(sign, sign) * np.outer(taper, taper)
+    return kernel / np.abs(kernel).sum()
+
+
+def _novelty(features: np.ndarray) -> np.ndarray:
+    """Checkerboard-kernel novelty, one value per feature step (0 near the edges)."""
+    half = max(1, int(round(KERNEL_SEC / FEATURE_SEC)))
+    n = len(features)
+    novelty = np.zeros(n)
+    if n < 2 * half + 1:
+        return novelty
+    # Windows of 2*half steps centred between t-1 and t: only the diagonal
+    # band of the self-similarity matrix is ever formed
+    windows = np.lib.stride_tricks.sliding_window_view(features, 2 * half, axis=0)
+    windows = windows.transpose(0, 2, 1)              # (n - 2*half + 1, 2*half, dims)
+    similarity = windows @ windows.transpose(0, 2, 1)
+    novelty[half:n - half + 1] = (similarity * _kernel(half)).sum(axis=(1, 2))
+    return novelty
+
+
+def _pick_peaks(novelty: np.ndarray) -> list:
+    """Indices of novelty peaks: dominant within MIN_TRACK_SEC and above the threshold."""
+    median = np.median(novelty)
+    spread = 1.4826 * np.median(np.abs(novelty - median)) + 1e-9
+    threshold = median + PEAK_THRESHOLD * spread
+    min_gap = int(round(MIN_TRACK_SEC / FEATURE_SEC))
+    n = len(novelty)
+
+    peaks = []
+    for k in np.argsort(novelty)[::-1]:
+        if novelty[k] <= threshold:
+            break
+        if k < min_gap or k > n - min_gap:
+            continue
+        if all(abs(k - p) >= min_gap for p in peaks):
+            peaks.append(int(k))
+    return sorted(peaks)
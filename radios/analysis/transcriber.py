@@ -14,7 +14,7 @@ in the database — set them as environment variables.
 
 Requirements
 ------------
-- ffmpeg on $PATH (for audio extraction)
+- ffmpeg on $PATH, or PyAV (audio extraction via radios.analysis.audio_codec)
 - faster-whisper Python package (for local backend)
 - openai Python package (for openai backend)
 - anthropic Python package (for anthropic backend)
@@ -34,7 +34,6 @@ import json
 import logging
 import os
 import re
-import subprocess
 import tempfile
 import time
 from typing import Optional
@@ -42,6 +41,8 @@ from typing import Optional
 from django.conf import settings
 from functools import lru_cache
 
+from radios.analysis import audio_codec
+
 logger = logging.getLogger("broadcast_analysis")
 
 # Skip segments shorter than this — too short for reliable transcription.
@@ -166,47 +167,19 @@ def _extract_audio_slice(
     source_path: str, start: float, end: float, fmt: str = "wav"
 ) -> Optional[str]:
     """
-    Extract [start, end) from source_path to a temp file via ffmpeg.
+    Extract [start, end) from source_path to a 16 kHz mono temp file.
     Returns the temp file path, or None on failure.
     """
-    suffix = f".{fmt}"
-    tmp_fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix=f".{fmt}")
     os.close(tmp_fd)
 
-    duration = end - start
-    codec_args = ["-ar", "16000", "-ac", "1"]
-    if fmt == "wav":
-        codec_args += ["-f", "wav"]
-    else:
-        codec_args += ["-codec:a", "libmp3lame", "-q:a", "4"]
-
-    cmd = [
-        "ffmpeg", "-y",
-        "-ss", str(start),
-        "-i", source_path,
-        "-t", str(duration),
-        "-avoid_negative_ts", "make_zero"
-    ] + codec_args + [tmp_path]
-
-    try:
-        timeout = min(600, duration * 2 + 30)
-        proc = subprocess.run(cmd, capture_output=True, timeout=timeout)
-        if proc.returncode != 0:
-            logger.error(
-                "ffmpeg extraction failed for %s [%.1f-%.1f]: %s",
-                source_path, start, end,
-                proc.stderr.decode(errors="replace")[-500:],
-            )
-            os.unlink(tmp_path)
-            return None
+    if audio_codec.extract_slice(source_path, start, end, tmp_path, fmt=fmt):
         return tmp_path
-    except Exception as exc:
-        logger.error("ffmpeg extraction error: %s", exc)
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
-        return None
+    try:
+        os.unlink(tmp_path)
+    except OSError:
+        pass
+    return None
 
 
 def _split_and_transcribe(
@@ -9,7 +9,8 @@ Usage
 # Evaluate current parameters on all labeled files:
     python radios/analysis/tune.py labels.json
 
-# Grid search (slow -- reruns segmentation per parameter combination):
+# Grid search (the CNN runs once per file; later combinations reuse the
+# segmentation cache and only re-run consolidation and refinement):
     python radios/analysis/tune.py labels.json --grid
 
 # Resume a previously interrupted grid search:
@@ -18,6 +19,10 @@ Usage
 # Use a custom checkpoint file (default: tune_checkpoint.json):
     python radios/analysis/tune.py labels.json --grid --checkpoint my_run.json
 
+# Compare reduced-precision CNNs against float32 (needs the ONNX snapshot,
+# see export_segmenter_model / SEGMENT_MODEL_PRECISION):
+    python radios/analysis/tune.py labels.json --precision int8 float16
+
 Label file format (JSON)
 ------------------------
 A JSON array; each entry describes one audio file and its known
@@ -46,6 +51,11 @@ The metric reported is the boundary offset error: for each predicted
 boundary the script finds the nearest ground truth boundary of the same
 transition type and measures |predicted - truth| in seconds.  It
 reports mean, median, and max error across all boundaries in all files.
+
+The --precision report runs the same evaluation once per CNN precision
+and adds, per precision, the boundary error against the float32
+boundaries (how far quantization moves them, no labels needed) and the
+CPU seconds spent in the CNN.
 """
 
 import argparse
@@ -53,6 +63,7 @@ import json
 import os
 import signal
 import sys
+import time
 
 # Bootstrap Django so we can import segmenter (needs settings).
 # Run from the project root: python radios/analysis/tune.py ...
@@ -106,10 +117,16 @@ def _boundary_errors(
     return errors
 
 
-def evaluate(labeled: List[Dict[str, Any]]) -> Dict[str, float]:
+def evaluate(
+    labeled: List[Dict[str, Any]],
+    predictions: Optional[Dict[str, List[AudioSegment]]] = None,
+) -> Dict[str, float]:
     """
     Run segment_audio on each labeled file and compute boundary errors.
     Returns a dict with mean, median, max, and count.
+
+    If *predictions* is given, the predicted segments are stored in it,
+    keyed by file path.
     """
     all_errors = []
 
@@ -126,6 +143,8 @@ def evaluate(labeled: List[Dict[str, Any]]) -> Dict[str, float]:
 
         print(f"  {os.path.basename(path)} ...", end=" ", flush=True)
         predicted = segment_audio(path)
+        if predictions is not None:
+            predictions[path] = predicted
         errors = _boundary_errors(predicted, truth_segs)
         all_errors.extend(errors)
 
@@ -310,6 +329,82 @@ def grid_search(
         print(f"(Checkpoint '{checkpoint_path}' removed — run complete.)")
 
 
+# -----------------------------------------------------------------------
+# Precision comparison
+# -----------------------------------------------------------------------
+
+def compare_precisions(labeled: List[Dict[str, Any]], precisions: List[str]) -> list:
+    """
+    Evaluate the float32 snapshot and each reduced *precision* on *labeled*.
+
+    Returns one (precision, metrics, drift, cnn_cpu) row per precision
+    that could be loaded: boundary-error metrics against the labels, the
+    boundary errors against the float32 predictions, and the CPU seconds
+    spent in the CNN.  The segmentation cache is off throughout: a cache
+    hit would skip the CNN being compared.
+    """
+    from django.conf import settings
+    from django.test import override_settings
+    from radios.analysis.segmenter_snapshot import load_snapshot
+
+    base = getattr(settings, "SEGMENTER_SNAPSHOT_PATH", None)
+    predict = seg_mod._predict_patches
+    cnn_cpu = [0.0]
+
+    def timed_predict(segmenter, patches):
+        t0 = time.process_time()
+        try:
+            return predict(segmenter, patches)
+        finally:
+            cnn_cpu[0] += time.process_time() - t0
+
+    rows = []
+    reference: Dict[str, List[AudioSegment]] = {}
+    seg_mod._predict_patches = timed_predict
+    try:
+        with override_settings(SEGMENT_CACHE=False):
+            for precision in ["float32"] + [p for p in precisions if p != "float32"]:
+                model = load_snapshot(base, precision)
+                if model is None or model.meta.get("precision", "float32") != precision:
+                    print(f"No {precision} model snapshot "
+                          "(run: manage.py export_segmenter_model) -- skipped.\n")
+                    continue
+                seg_mod._segmenter_instance = model
+                print(f"Evaluating {precision}...\n")
+                cnn_cpu[0] = 0.0
+                predictions: Dict[str, List[AudioSegment]] = {}
+                metrics = evaluate(labeled, predictions)
+                drift = []
+                if precision == "float32":
+                    reference = predictions
+                for path, predicted in predictions.items():
+                    if path in reference:
+                        drift.extend(_boundary_errors(predicted, reference[path]))
+                rows.append((precision, metrics, drift, cnn_cpu[0]))
+                print()
+    finally:
+        seg_mod._predict_patches = predict
+        seg_mod._segmenter_instance = None
+    return rows
+
+
+def _print_precision_report(rows: list) -> None:
+    if not rows:
+        print("No precision could be evaluated.")
+        return
+    base_cpu = rows[0][3] if rows[0][0] == "float32" else 0.0
+    print("=== CNN precision vs. boundary accuracy ===\n")
+    print(f"  {'precision':<10} {'mean':>7} {'median':>7} {'max':>7}"
+          f" {'vs f32 mean':>12} {'vs f32 max':>11} {'CNN CPU':>9} {'speedup':>8}")
+    for precision, metrics, drift, cpu in rows:
+        err = [metrics.get(k) for k in ("mean", "median", "max")]
+        cols = "".join(f" {v:>6.2f}s" if v is not None else f" {'-':>7}" for v in err)
+        drift_cols = (f" {np.mean(drift):>11.2f}s {np.max(drift):>10.2f}s" if drift
+                      else f" {'-':>12} {'-':>11}")
+        speedup = f"{base_cpu / cpu:>7.2f}x" if base_cpu and cpu else f"{'-':>8}"
+        print(f"  {precision:<10}{cols}{drift_cols} {cpu:>8.1f}s {speedup}")
+
+
 # -----------------------------------------------------------------------
 # Entry point
 # -----------------------------------------------------------------------
@@ -331,6 +426,13 @@ def main():
         metavar="FILE",
         help=f"Checkpoint file for grid search progress (default: {_DEFAULT_CHECKPOINT}).",
     )
+    parser.add_argument(
+        "--precision",
+        nargs="+",
+        choices=["float32", "int8", "float16"],
+        metavar="PRECISION",
+        help="Compare CNN precisions (int8, float16) against float32 instead of a single evaluation.",
+    )
     args = parser.parse_args()
 
     with open(args.labels) as f:
@@ -338,7 +440,9 @@ def main():
 
     print(f"Loaded {len(labeled)} labeled file(s).\n")
 
-    if args.grid:
+    if args.precision:
+        _print_precision_report(compare_precisions(labeled, args.precision))
+    elif args.grid:
         grid_search(labeled, checkpoint_path=args.checkpoint, resume=args.resume)
     else:
         if args.resume:
@@ -6,4 +6,4 @@ class RadiosConfig(AppConfig):
     name = 'radios'
 
     def ready(self):
-        import radios.signals  # noqa: F401 — register FTS sync signals
+        import radios.signals  # noqa: F401 — register FTS sync / cache cleanup signals
@@ -106,6 +106,31 @@ class AnalysisStageCommand(BaseCommand):
         signal.signal(signal.SIGINT, shutdown)
         signal.signal(signal.SIGTERM, shutdown)
 
+        self._reset_claims(status_field, error_field, retry_failed, retry_skipped)
+
+        logger.info(
+            "%s daemon starting (once=%s, limit=%s, poll=%ss)",
+            self.stage_name, once, limit or "unlimited", poll_interval,
+        )
+
+        try:
+            while self._running:
+                processed = self._process_cycle(status_field, error_field, limit)
+
+                if once or not self._running:
+                    break
+
+                if not processed:
+                    deadline = time.monotonic() + poll_interval
+                    while self._running and time.monotonic() < deadline:
+                        time.sleep(1)
+        except KeyboardInterrupt:
+            logger.warning("Force killed by KeyboardInterrupt.")
+
+        logger.info("%s daemon exited.", self.stage_name)
+
+    def _reset_claims(self, status_field, error_field, retry_failed, retry_skipped):
+        """Stale claim recovery, plus the --retry-failed / --retry-skipped resets."""
         # Stale claim recovery: reset any 'running' rows back to 'pending'
         stale_count = Recording.objects.filter(
             **{status_field: "running"}
@@ -138,29 +163,21 @@ class AnalysisStageCommand(BaseCommand):
                     skipped_count, self.stage_name,
                 )
 
-        logger.info(
-            "%s daemon starting (once=%s, limit=%s, poll=%ss)",
-            self.stage_name, once, limit or "unlimited", poll_interval,
-        )
-
-        try:
-            while self._running:
-                processed = self._process_cycle(status_field, error_field, limit)
-
-                if once or not self._running:
-                    break
+    def _process_cycle(self, status_field, error_field, limit):
+        """Find and process eligible recordings. Returns count processed."""
+        recordings = self._eligible_recordings(status_field, limit)
 
-                if not processed:
-                    deadline = time.monotonic() + poll_interval
-                    while self._running and time.monotonic() < deadline:
-                        time.sleep(1)
-        except KeyboardInterrupt:
-            logger.warning("Force killed by KeyboardInterrupt.")
+        processed = 0
+        for recording in recordings:
+            if not self._running:
+                break
+            self._process_one_recording(recording, status_field, error_field)
+            processed += 1
 
-        logger.info("%s daemon exited.", self.stage_name)
+        return processed
 
-    def _process_cycle(self, status_field, error_field, limit):
-        """Find and process eligible recordings. Returns count processed."""
+    def _eligible_recordings(self, status_field, limit):
+        """Recordings pending this stage whose upstream stages are finished."""
         # Build queryset: this stage pending, upstream stages done/skipped
         filters = {status_field: "pending"}
         for upstream_field in self.upstream_done_fields:
@@ -181,18 +198,18 @@ class AnalysisStageCommand(BaseCommand):
                 "[%s] Found %d recording(s) to process.",
                 self.stage_name, len(recordings),
             )
-
-        processed = 0
-        for recording in recordings:
-            if not self._running:
-                break
-            self._process_one_recording(recording, status_field, error_field)
-            processed += 1
-
-        return processed
+        return recordings
 
     def _process_one_recording(self, recording, status_field, error_field):
         """Claim, process, and update status for a single recording."""
+        if self._claim_recording(recording, status_field):
+            self._run_claimed(recording, status_field, error_field)
+
+    def _claim_recording(self, recording, status_field) -> bool:
+        """
+        Claim *recording* for this stage.  Returns False if another worker
+        got it first or the stage is inactive for its stream (then skipped).
+        """
         # Skip if stage is inactive for this stream
         stream = recording.stream
         if not stream.is_stage_active(self.stage_name):
@@ -204,16 +221,23 @@ class AnalysisStageCommand(BaseCommand):
                 pk=recording.pk, **{status_field: "pending"}
             ).update(**{status_field: "skipped"})
             self._check_all_complete(recording)
-            return
+            return False
 
         # Optimistic claim: only succeeds if still pending (atomic on SQLite)
         claimed = Recording.objects.filter(
             pk=recording.pk, **{status_field: "pending"}
         ).update(**{status_field: "running"})
 
-        if not claimed:
-            return  # another worker got it
+        return bool(claimed)  # False: another worker got it
+
+    def _release_claim(self, recording, status_field):
+        """Hand a claimed but unprocessed recording back to the pending pool."""
+        Recording.objects.filter(
+            pk=recording.pk, **{status_field: "running"}
+        ).update(**{status_field: "pending"})
 
+    def _run_claimed(self, recording, status_field, error_field):
+        """Process a recording this worker has claimed and record the outcome."""
         # Set analysis_started_at if this is the first stage to run
         if not recording.analysis_started_at:
             Recording.objects.filter(
@@ -229,21 +253,7 @@ class AnalysisStageCommand(BaseCommand):
         )
 
         try:
-            # Session recordings (real-time pipeline) have no file —
-            # segments carry their own files.  Pass None as file_path.
-            if recording.is_session:
-                file_path = None
-            else:
-                if not recording.file or not recording.file.name:
-                    raise FileNotFoundError(
-                        f"Recording {recording.id} has no file attached."
-                    )
-                file_path = recording.file.path
-                if not os.path.exists(file_path):
-                    raise FileNotFoundError(
-                        f"Recording file not found on disk: {file_path}"
-                    )
-
+            file_path = self._recording_file_path(recording)
             self.process_one(recording, file_path, check)
 
             # Success
@@ -271,6 +281,24 @@ class AnalysisStageCommand(BaseCommand):
                 **{status_field: "failed", error_field: tb}
             )
 
+    @staticmethod
+    def _recording_file_path(recording):
+        """Absolute path of the recording's audio file; raises FileNotFoundError."""
+        # Session recordings (real-time pipeline) have no file —
+        # segments carry their own files.  Pass None as file_path.
+        if recording.is_session:
+            return None
+        if not recording.file or not recording.file.name:
+            raise FileNotFoundError(
+                f"Recording {recording.id} has no file attached."
+            )
+        file_path = recording.file.path
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(
+                f"Recording file not found on disk: {file_path}"
+            )
+        return file_path
+
     def _check_shutdown(self):
         """Raise _ShutdownRequested if a shutdown has been requested."""
         if not self._running:
@@ -433,6 +461,19 @@ class SegmentStageCommand(BaseCommand):
 
     def _process_cycle(self, status_field, error_field, limit):
         """Find and process eligible segments. Returns count processed."""
+        segments = self._eligible_segments(status_field, limit)
+
+        processed = 0
+        for segment in segments:
+            if not self._running:
+                break
+            self._process_one_segment(segment, status_field, error_field)
+            processed += 1
+
+        return processed
+
+    def _eligible_segments(self, status_field, limit):
+        """Segments pending this stage whose recording has been segmented."""
         qs = (
             TranscriptionSegment.objects
             .filter(
@@ -455,15 +496,7 @@ class SegmentStageCommand(BaseCommand):
                 "[%s] Found %d segment(s) to process.",
                 self.stage_name, len(segments),
             )
-
-        processed = 0
-        for segment in segments:
-            if not self._running:
-                break
-            self._process_one_segment(segment, status_field, error_field)
-            processed += 1
-
-        return processed
+        return segments
 
     def _process_one_segment(self, segment, status_field, error_field):
         """Claim, process, and update status for a single segment."""
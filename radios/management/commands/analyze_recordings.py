@@ -441,7 +441,7 @@ class Command(BaseCommand):
             return
 
         check()
-        results = fingerprint_segment_sliding(source_path, start, end)
+        results = fingerprint_segment_sliding(source_path, start, end, segment.id)
 
         with transaction.atomic():
             segment.song_occurrences.all().delete()
@@ -0,0 +1,117 @@
+"""
+Seed the local fingerprint index from songs already identified by Shazam.
+
+Usage:
+    python manage.py build_fingerprint_index
+    python manage.py build_fingerprint_index --rebuild     # start from an empty index
+    python manage.py build_fingerprint_index --limit 500   # most recent occurrences only
+
+For every SongOccurrence whose song has a Shazam key, decodes up to
+INDEX_SPAN seconds of the occurrence from its recording (or segment file)
+and adds the clip's landmark hashes to FINGERPRINT_INDEX_PATH, at most
+MAX_REFS_PER_SONG clips per song.  Occurrences whose audio is gone are
+skipped.  Afterwards fingerprint_recordings recognizes these songs without
+calling Shazam; see radios/analysis/fingerprint_index.py.  The daemons
+keep the index growing on their own, so this is only needed once.
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from radios.models import SongOccurrence
+
+SAVE_EVERY = 50   # clips added between index saves
+
+
+class Command(BaseCommand):
+    help = "Build the local fingerprint index (FINGERPRINT_INDEX_PATH) from identified songs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Discard the existing index first.",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=0,
+            metavar="N",
+            help="Only index the N most recent occurrences (0 = all).",
+        )
+
+    def handle(self, *args, **options):
+        from radios.analysis import fingerprint_index
+        from radios.analysis.audio_codec import decode_pcm
+        from radios.analysis.fingerprinter import _CLIP_SAMPLE_RATE, FingerprintResult
+
+        path = getattr(settings, "FINGERPRINT_INDEX_PATH", None)
+        if not path:
+            raise CommandError("FINGERPRINT_INDEX_PATH is not set.")
+        if options["rebuild"] and os.path.exists(path):
+            os.remove(path)
+        index = fingerprint_index.FingerprintIndex(path)
+
+        qs = (
+            SongOccurrence.objects
+            .filter(song__shazam_key__isnull=False)
+            .exclude(song__shazam_key="")
+            .select_related("song", "segment", "segment__recording")
+            .prefetch_related("song__genres")
+            .order_by("-segment__recording__start_time", "start_offset")
+        )
+        if options["limit"]:
+            qs = qs[:options["limit"]]
+
+        added = skipped = 0
+        for occurrence in qs.iterator(chunk_size=200):
+            song = occurrence.song
+            if index.song_refs(song.shazam_key) >= fingerprint_index.MAX_REFS_PER_SONG:
+                continue
+            source_path = self._source_path(occurrence.segment)
+            if source_path is None:
+                skipped += 1
+                continue
+            start = occurrence.start_offset
+            end = min(occurrence.end_offset, start + fingerprint_index.INDEX_SPAN)
+            pcm = decode_pcm(source_path, _CLIP_SAMPLE_RATE, start, end)
+            if pcm is None:
+                skipped += 1
+                continue
+
+            result = FingerprintResult(
+                title=song.title,
+                artist=song.artist,
+                score=1.0,
+                shazam_key=song.shazam_key,
+                genres=[genre.name for genre in song.genres.all()],
+                album_name=song.album_name,
+                release_year=song.release_year,
+                album_cover_url=song.album_cover_url,
+                estimated_start=start,
+                estimated_end=end,
+            )
+            if index.add(result, pcm, _CLIP_SAMPLE_RATE):
+                added += 1
+                if added % SAVE_EVERY == 0:
+                    index.save()
+                    self.stdout.write(f"  {added} clips indexed...")
+
+        index.save()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {added} clips ({len(index)} in {path}); "
+            f"{skipped} occurrence(s) without readable audio skipped."
+        ))
+
+    @staticmethod
+    def _source_path(segment):
+        """The file SongOccurrence offsets refer to (see SegmentStageCommand), or None."""
+        if segment.file and segment.file.name:
+            path = segment.file.path
+        else:
+            recording = segment.recording
+            if recording.is_session or not recording.file or not recording.file.name:
+                return None
+            path = recording.file.path
+        return path if os.path.exists(path) else None
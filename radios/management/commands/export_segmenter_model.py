@@ -0,0 +1,83 @@
+"""
+Export the segmentation CNN to an ONNX snapshot for fast warm starts.
+
+Usage:
+    python manage.py export_segmenter_model
+    python manage.py export_segmenter_model --output /srv/models/ina_smn.onnx
+    python manage.py export_segmenter_model --precision int8
+
+Loads inaSpeechSegmenter's Keras speech/music/noise model once (needs
+tensorflow and tf2onnx) and writes it as an ONNX graph to
+SEGMENTER_SNAPSHOT_PATH.  Every later segmentation process loads that
+file with onnxruntime instead of importing TensorFlow; see
+radios/analysis/segmenter_snapshot.py.  Re-run after upgrading
+inaSpeechSegmenter.
+
+Reduced-precision variants (SEGMENT_MODEL_PRECISION) are derived from the
+float32 snapshot: stale ones are deleted on export, and --precision
+builds one right away instead of on first use.
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Export the segmentation CNN to an ONNX snapshot (SEGMENTER_SNAPSHOT_PATH)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=getattr(settings, "SEGMENTER_SNAPSHOT_PATH", None),
+            help="Snapshot path (default: SEGMENTER_SNAPSHOT_PATH).",
+        )
+        parser.add_argument(
+            "--precision",
+            choices=["float32", "int8", "float16"],
+            default=getattr(settings, "SEGMENT_MODEL_PRECISION", "float32"),
+            help="Also build this reduced-precision variant (default: SEGMENT_MODEL_PRECISION).",
+        )
+
+    def handle(self, *args, **options):
+        from radios.analysis.segmenter_snapshot import (
+            PRECISIONS,
+            export_snapshot,
+            load_snapshot,
+            quantize_snapshot,
+            snapshot_path,
+        )
+
+        output = options["output"]
+        if not output:
+            raise CommandError("No output path: set SEGMENTER_SNAPSHOT_PATH or pass --output.")
+
+        self.stdout.write("Loading the Keras model and converting to ONNX...")
+        try:
+            meta = export_snapshot(str(output))
+        except ImportError as exc:
+            raise CommandError(f"Export needs tensorflow and tf2onnx: {exc}") from exc
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {output} (inaSpeechSegmenter {meta['ina_version']}, "
+            f"labels {', '.join(meta['outlabels'])})"
+        ))
+
+        for precision in PRECISIONS[1:]:
+            variant = snapshot_path(output, precision)
+            if os.path.exists(variant):
+                os.remove(variant)
+                self.stdout.write(f"Removed stale {precision} snapshot {variant}")
+        precision = options["precision"]
+        if precision != "float32":
+            variant = snapshot_path(output, precision)
+            try:
+                quantize_snapshot(str(output), variant, precision)
+            except ImportError as exc:
+                raise CommandError(f"The {precision} snapshot needs more packages: {exc}") from exc
+            self.stdout.write(self.style.SUCCESS(f"Wrote {variant} ({precision})"))
+
+        if load_snapshot(str(output), precision) is None:
+            self.stdout.write(self.style.WARNING(
+                "The snapshot cannot be loaded here -- install onnxruntime to use it."
+            ))
@@ -8,25 +8,31 @@ recording in parallel.
 Uses sliding window to detect multiple songs per segment, storing results
 as SongOccurrence rows.
 
+Segments are fingerprinted --concurrency at a time on one asyncio event
+loop (FingerprintEngine).  Shazam requests are paced by a token bucket
+shared by every fingerprinting process on the host (FINGERPRINT_RATE_LIMIT
+requests/s in total), which backs off on HTTP 429 -- so more daemons or a
+higher --concurrency never exceed the allowed rate.
+
 Usage:
     python manage.py fingerprint_recordings                  # run as daemon
     python manage.py fingerprint_recordings --once           # process pending, then exit
     python manage.py fingerprint_recordings --limit 5        # cap per cycle
+    python manage.py fingerprint_recordings --concurrency 16 # segments in flight
     python manage.py fingerprint_recordings --retry-failed   # re-queue failed segments
     python manage.py fingerprint_recordings --retry-no-match # re-queue done-but-no-songs segments
     python manage.py fingerprint_recordings --retry-skipped  # re-queue skipped segments
 """
 
+import concurrent.futures
 import logging
-import time
-import random
 
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Exists, OuterRef
 
 from radios.models import TranscriptionSegment, Song, SongOccurrence
-from radios.analysis.fingerprinter import fingerprint_segment_sliding
+from radios.analysis.fingerprint_engine import FingerprintEngine
 from radios.management.commands._analysis_base import SegmentStageCommand
 
 MIN_DURATION = 5
@@ -50,6 +56,13 @@ class Command(SegmentStageCommand):
                 "back to pending, so they are retried."
             ),
         )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "FINGERPRINT_CONCURRENCY", 8),
+            metavar="N",
+            help="Fingerprint up to N segments at once (default: 8).",
+        )
 
     def handle(self, *args, **options):
         if options.get("retry_no_match"):
@@ -68,7 +81,35 @@ class Command(SegmentStageCommand):
                 logger.info(
                     "Reset %d no-match fingerprinting segment(s) to 'pending'.", count,
                 )
-        super().handle(*args, **options)
+
+        self._concurrency = max(1, options["concurrency"])
+        self._engine = FingerprintEngine(self._concurrency)
+        self._engine.start()
+        try:
+            super().handle(*args, **options)
+        finally:
+            self._engine.stop()
+
+    def _process_cycle(self, status_field, error_field, limit):
+        """Process eligible segments on --concurrency threads. Returns count processed."""
+        if self._concurrency == 1:
+            return super()._process_cycle(status_field, error_field, limit)
+
+        segments = self._eligible_segments(status_field, limit)
+
+        def run(segment):
+            if not self._running:
+                return 0
+            try:
+                self._process_one_segment(segment, status_field, error_field)
+            finally:
+                connection.close()   # each thread has its own DB connection
+            return 1
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._concurrency, thread_name_prefix="fingerprint",
+        ) as pool:
+            return sum(pool.map(run, segments))
 
     def process_segment(self, segment, source_path, start, end, check_fn):
         duration = end - start
@@ -80,11 +121,18 @@ class Command(SegmentStageCommand):
 
         check_fn()
 
-        results = fingerprint_segment_sliding(source_path, start, end)
-
-        sleep_time = getattr(settings, "FINGERPRINT_SLEEP_SECONDS", 0)
-        if sleep_time:
-            time.sleep(sleep_time + random.uniform(0, 0.5))
+        future = self._engine.submit(source_path, start, end, segment.id)
+        while True:
+            try:
+                results = future.result(timeout=1)
+                break
+            except concurrent.futures.TimeoutError:
+                pass
+            try:
+                check_fn()
+            except Exception:
+                future.cancel()
+                raise
 
         # Clear previous occurrences (idempotent re-processing)
         with transaction.atomic():
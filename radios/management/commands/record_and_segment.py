@@ -9,8 +9,32 @@ This is an alternative to record_streams + segment_recordings for streams
 that benefit from real-time processing.  Both modes can coexist — different
 streams can use different modes.
 
+All streams share one InferenceScheduler: pending 10 s windows from every
+processor are classified together as one batched CNN call (round-robin
+across streams, bounded by --max-batch windows and --max-latency seconds).
+Finalized segments are MP3-encoded and saved by one shared pool of
+--encoder-workers threads, so encoding never stalls classification.
+
 Usage:
     python manage.py record_and_segment
+    python manage.py record_and_segment --max-batch 64 --max-latency 2
+    python manage.py record_and_segment --encoder-workers 4
+    python manage.py record_and_segment --ingest selector
+    python manage.py record_and_segment --shards 4
+
+Sharding:
+    --shards N runs a supervisor that spawns N worker processes
+    (record_and_segment --shard i/N) so one host can use all its cores.
+    Streams are assigned by consistent hashing on stream id; each worker
+    only syncs the streams it owns.  Crashed workers are restarted and
+    per-shard load is logged every LOAD_REPORT_INTERVAL seconds.
+
+Ingest modes:
+    threads   — one PCM reader + one classifier thread per stream (default)
+    selector  — one PCMIngestLoop for all streams: a selector thread reads
+                every ffmpeg pipe and a dispatch thread submits windows to
+                the scheduler asynchronously; thread count stays constant
+                as streams are added
 
 Safety:
     - ffmpeg invoked via subprocess with list args (never shell=True)
@@ -19,10 +43,13 @@ Safety:
 """
 
 import logging
+import os
 import signal
+import sys
 import time
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
 from radios.analysis.recorder import (
     ALLOWED_STREAM_SCHEMES,
@@ -30,6 +57,11 @@ from radios.analysis.recorder import (
     _is_recording_enabled,
     _is_within_recording_window,
 )
+from radios.analysis import encoder_pool, inference_scheduler
+from radios.analysis.encoder_pool import SegmentEncoderPool
+from radios.analysis.inference_scheduler import InferenceScheduler
+from radios.analysis.pcm_ingest import PCMIngestLoop
+from radios.analysis.sharding import HashRing, ShardSupervisor, parse_shard
 from radios.analysis.stream_processor import StreamProcessor
 from radios.models import Stream
 from django.db import close_old_connections
@@ -37,6 +69,11 @@ from django.db import close_old_connections
 logger = logging.getLogger("stream_processor")
 
 POLL_INTERVAL = 5  # seconds between main-loop iterations
+LOAD_REPORT_INTERVAL = 60  # seconds between per-shard load reports (supervisor)
+# Seconds shard workers get on shutdown before the supervisor SIGKILLs them:
+# enough to stop their streams and drain a full encoder queue of MP3 encodes
+# (STREAM_SHARD_STOP_TIMEOUT overrides).
+SHARD_STOP_TIMEOUT = 300
 
 
 class Command(BaseCommand):
@@ -45,11 +82,102 @@ class Command(BaseCommand):
         "Alternative to record_streams + segment_recordings."
     )
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-batch",
+            type=int,
+            default=getattr(
+                settings, "STREAM_INFERENCE_MAX_BATCH", inference_scheduler.MAX_BATCH,
+            ),
+            metavar="N",
+            help="Maximum 10 s windows per shared CNN call.",
+        )
+        parser.add_argument(
+            "--max-latency",
+            type=float,
+            default=getattr(
+                settings, "STREAM_INFERENCE_MAX_LATENCY", inference_scheduler.MAX_LATENCY,
+            ),
+            metavar="SEC",
+            help="Maximum seconds a window waits for other streams before inference.",
+        )
+        parser.add_argument(
+            "--encoder-workers",
+            type=int,
+            default=getattr(
+                settings, "STREAM_ENCODER_WORKERS", encoder_pool.ENCODER_WORKERS,
+            ),
+            metavar="N",
+            help="Threads encoding and saving finalized segments, shared by all "
+                 "streams (default: half the CPU cores).",
+        )
+        parser.add_argument(
+            "--encoder-queue-size",
+            type=int,
+            default=getattr(
+                settings, "STREAM_ENCODER_QUEUE_SIZE", encoder_pool.ENCODER_QUEUE_SIZE,
+            ),
+            metavar="N",
+            help="Finalized segments queued per encoder thread before producers block.",
+        )
+        parser.add_argument(
+            "--ingest",
+            choices=("threads", "selector"),
+            default=getattr(settings, "STREAM_INGEST_MODE", "threads"),
+            help="PCM ingestion: per-stream threads, or one shared selector loop.",
+        )
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=getattr(settings, "STREAM_SHARDS", 1),
+            metavar="N",
+            help="Run a supervisor with N worker processes, streams sharded by id.",
+        )
+        parser.add_argument(
+            "--shard",
+            metavar="INDEX/COUNT",
+            help="Worker mode: only handle streams owned by this shard (set by the supervisor).",
+        )
+
     def handle(self, *args, **options):
-        logger.info("Real-time stream processor starting up")
+        self._ring = None
+        self._shard_index = None
+        if options["shard"]:
+            try:
+                self._shard_index, count = parse_shard(options["shard"])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self._ring = HashRing(count)
+        elif options["shards"] > 1:
+            return self._supervise(options)
+
+        logger.info(
+            "Real-time stream processor starting up%s",
+            f" (shard {options['shard']})" if options["shard"] else "",
+        )
+
+        self._scheduler = InferenceScheduler(
+            max_batch=options["max_batch"],
+            max_latency=options["max_latency"],
+        )
+        self._scheduler.start()
+        self._encoder_pool = SegmentEncoderPool(
+            workers=options["encoder_workers"],
+            queue_size=options["encoder_queue_size"],
+        )
+        self._encoder_pool.start()
+        self._ingest_loop = None
+        if options["ingest"] == "selector":
+            self._ingest_loop = PCMIngestLoop()
+            self._ingest_loop.start()
 
         # Reset any stale 'recording' statuses from a previous unclean shutdown
-        stale = Stream.objects.filter(recording_status="recording").update(
+        stale_ids = [
+            pk for pk in Stream.objects.filter(recording_status="recording")
+                                       .values_list("id", flat=True)
+            if self._owns(pk)
+        ]
+        stale = Stream.objects.filter(id__in=stale_ids).update(
             recording_status="idle", recording_error="", recording_started_at=None,
         )
         if stale:
@@ -81,8 +209,84 @@ class Command(BaseCommand):
                 processor.stop()
             except Exception:
                 logger.exception("Error stopping processor")
+        if self._ingest_loop is not None:
+            self._ingest_loop.stop()
+        self._encoder_pool.stop()   # drains queued segments
+        self._scheduler.stop()
         logger.info("Real-time stream processor exited cleanly")
 
+    def _owns(self, stream_id) -> bool:
+        """True if this process handles *stream_id* (always, unless sharded)."""
+        return self._ring is None or self._ring.owner(stream_id) == self._shard_index
+
+    def _supervise(self, options):
+        """Supervisor mode: keep one worker process per shard running."""
+        shards = options["shards"]
+        ring = HashRing(shards)
+        manage_py = os.path.join(settings.BASE_DIR, "manage.py")
+        # Host-wide sizes are split between the workers
+        encoder_workers = max(1, (options["encoder_workers"] or encoder_pool.ENCODER_WORKERS) // shards)
+
+        def build_cmd(shard):
+            return [
+                sys.executable, manage_py, "record_and_segment",
+                "--shard", f"{shard}/{shards}",
+                "--max-batch", str(options["max_batch"]),
+                "--max-latency", str(options["max_latency"]),
+                "--encoder-workers", str(encoder_workers),
+                "--encoder-queue-size", str(options["encoder_queue_size"]),
+                "--ingest", options["ingest"],
+            ]
+
+        supervisor = ShardSupervisor(shards, build_cmd)
+        running = True
+
+        def on_shutdown(signum, _frame):
+            nonlocal running
+            logger.info("Shutdown signal received (signal %s)", signum)
+            running = False
+
+        signal.signal(signal.SIGINT, on_shutdown)
+        signal.signal(signal.SIGTERM, on_shutdown)
+
+        logger.info("Shard supervisor starting %d worker(s)", shards)
+        supervisor.start()
+        last_report = 0.0
+        while running:
+            try:
+                supervisor.poll()
+                if time.monotonic() - last_report >= LOAD_REPORT_INTERVAL:
+                    last_report = time.monotonic()
+                    close_old_connections()
+                    self._report_shard_load(supervisor, ring)
+            except Exception:
+                logger.exception("Supervisor loop iteration failed")
+            time.sleep(POLL_INTERVAL)
+
+        logger.info("Stopping shard workers...")
+        supervisor.stop(timeout=getattr(settings, "STREAM_SHARD_STOP_TIMEOUT", SHARD_STOP_TIMEOUT))
+        logger.info("Shard supervisor exited cleanly")
+
+    def _report_shard_load(self, supervisor, ring):
+        """Log streams assigned / recording per shard next to worker health."""
+        assigned = [0] * ring.shards
+        recording = [0] * ring.shards
+        for stream_id, status in (
+            Stream.objects.filter(is_active=True, enable_recording=True)
+                          .values_list("id", "recording_status")
+        ):
+            shard = ring.owner(stream_id)
+            assigned[shard] += 1
+            recording[shard] += status == "recording"
+        for worker in supervisor.status():
+            shard = worker["shard"]
+            logger.info(
+                "Shard %d: %d stream(s) assigned, %d recording; pid=%s alive=%s "
+                "restarts=%d uptime=%ss",
+                shard, assigned[shard], recording[shard], worker["pid"],
+                worker["alive"], worker["restarts"], worker["uptime"],
+            )
+
     def _stop_processor(self, processors, stream_id):
         processor = processors.pop(stream_id, None)
         if processor:
@@ -90,10 +294,13 @@ class Command(BaseCommand):
 
     def _sync_processors(self, processors: dict):
         """One main-loop iteration: keep processors in sync with DB state."""
+        if self._encoder_pool.pending:
+            logger.debug("Segment encoder pool: %s", self._encoder_pool.stats())
         active_streams = {
             s.id: s
             for s in Stream.objects.filter(is_active=True, enable_recording=True)
                                    .select_related("radio", "audio_feed")
+            if self._owns(s.id)
         }
 
         # Give existing processors a fresh stream reference
@@ -139,7 +346,12 @@ class Command(BaseCommand):
                     stream, stream_id,
                 )
                 try:
-                    processor = StreamProcessor(stream)
+                    processor = StreamProcessor(
+                        stream,
+                        scheduler=self._scheduler,
+                        encoder_pool=self._encoder_pool,
+                        ingest_loop=self._ingest_loop,
+                    )
                     processor.start()
                 except Exception:
                     logger.exception("Failed to start processor for '%s'", stream)
@@ -14,16 +14,45 @@ Usage:
     python manage.py segment_recordings            # run as daemon
     python manage.py segment_recordings --once     # process pending, then exit
     python manage.py segment_recordings --limit 5  # cap per cycle
+    python manage.py segment_recordings --once --workers 8   # backfill on 8 cores
+    python manage.py segment_recordings --once --batch 16    # batched CNN calls
+
+Throughput:
+    Within a process, decoding is pipelined with inference: while the CNN
+    runs on one recording, the next one is already claimed and decoded on
+    a prefetch thread (ffmpeg/PyAV release the GIL).
+
+    --workers N starts N worker processes (segment_recordings --worker i/N),
+    each loading its own CNN with a 1/N share of the CPU threads.  Workers
+    claim recordings through the usual optimistic status update, so no
+    recording is processed twice.  Crashed workers are restarted; with
+    --once the command returns when every worker has drained the backlog.
+
+    --batch N claims N recordings at a time and segments them with
+    segment_audio_batch(): files are decoded and featurized in parallel
+    and their CNN patches go through the model as one large batch, which
+    keeps the CPU's vector units busy during backfills of short chunks.
 """
 
+import concurrent.futures
 import logging
+import os
+import signal
+import sys
+import time
 
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from radios.analysis.sharding import ShardSupervisor, parse_shard
 from radios.models import Recording, TranscriptionSegment, TranscriptionSettings
 from radios.management.commands._analysis_base import AnalysisStageCommand
 from django.db import transaction
 
 logger = logging.getLogger("broadcast_analysis")
 
+WORKER_STOP_TIMEOUT = 300  # seconds workers get to finish their recording on shutdown
+
 
 def _initial_segment_statuses(segment_type, stream):
     """
@@ -61,23 +90,222 @@ class Command(AnalysisStageCommand):
     stage_name = "segmentation"
     upstream_done_fields = []  # first stage — no upstream
 
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "SEGMENT_WORKERS", 1),
+            metavar="N",
+            help="Segment with N worker processes, one CNN each (default: 1).",
+        )
+        parser.add_argument(
+            "--worker",
+            metavar="INDEX/COUNT",
+            help="Worker mode (set by --workers): skip stale-claim recovery.",
+        )
+        parser.add_argument(
+            "--batch",
+            type=int,
+            default=getattr(settings, "SEGMENT_BATCH_SIZE", 1),
+            metavar="N",
+            help="Segment N recordings per shared CNN call (default: 1, one at a time).",
+        )
+
+    def handle(self, *args, **options):
+        self._prefetched = {}   # recording pk -> Future of decoded PCM
+        self._batched = {}      # recording pk -> segments from segment_audio_batch()
+        self._batch_size = max(1, options["batch"])
+        self._worker = options["worker"]
+        if self._worker:
+            try:
+                _, count = parse_shard(options["worker"])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            # One CNN per process: split the CPU threads between the workers
+            # (read by TensorFlow / oneDNN when the model is first loaded)
+            threads = str(max(1, (os.cpu_count() or 1) // count))
+            os.environ.setdefault("TF_NUM_INTRAOP_THREADS", threads)
+            os.environ.setdefault("OMP_NUM_THREADS", threads)
+        elif options["workers"] > 1:
+            return self._run_workers(options)
+        return super().handle(*args, **options)
+
+    def _reset_claims(self, *args):
+        # Worker processes skip this: the parent already reset the claims,
+        # and their siblings hold live ones.
+        if not self._worker:
+            super()._reset_claims(*args)
+
+    def _run_workers(self, options):
+        """Parent mode: reset claims once, then keep N worker processes running."""
+        workers = options["workers"]
+        status_field = f"{self.stage_name}_status"
+        self._reset_claims(
+            status_field, f"{self.stage_name}_error",
+            options["retry_failed"], options["retry_skipped"],
+        )
+
+        manage_py = os.path.join(settings.BASE_DIR, "manage.py")
+
+        def build_cmd(index):
+            cmd = [
+                sys.executable, manage_py, "segment_recordings",
+                "--worker", f"{index}/{workers}",
+                "--limit", str(options["limit"]),
+                "--batch", str(options["batch"]),
+            ]
+            if options["once"]:
+                cmd.append("--once")
+            return cmd
+
+        supervisor = ShardSupervisor(workers, build_cmd, restart_on_success=not options["once"])
+        running = True
+
+        def on_shutdown(signum, _frame):
+            nonlocal running
+            logger.info("Shutdown signal (%s) received for segmentation workers.", signum)
+            running = False
+
+        signal.signal(signal.SIGINT, on_shutdown)
+        signal.signal(signal.SIGTERM, on_shutdown)
+
+        logger.info("Starting %d segmentation worker(s) (once=%s)", workers, options["once"])
+        supervisor.start()
+        while running and not supervisor.finished:
+            supervisor.poll()
+            time.sleep(1)
+
+        supervisor.stop(timeout=WORKER_STOP_TIMEOUT)
+        logger.info("Segmentation workers exited.")
+
+    def _process_cycle(self, status_field, error_field, limit):
+        """
+        Like the base cycle, but one recording ahead: the next recording is
+        claimed and decoded on a prefetch thread while the current one runs.
+        """
+        if self._batch_size > 1:
+            return self._process_cycle_batched(status_field, error_field, limit)
+        recordings = iter(self._eligible_recordings(status_field, limit))
+
+        def claim_next():
+            for recording in recordings:
+                if not self._running:
+                    return None
+                if self._claim_recording(recording, status_field):
+                    self._prefetched[recording.pk] = prefetch.submit(self._decode, recording)
+                    return recording
+            return None
+
+        processed = 0
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="segment-prefetch",
+        ) as prefetch:
+            current = claim_next()
+            try:
+                while current is not None and self._running:
+                    upcoming = claim_next()
+                    self._run_claimed(current, status_field, error_field)
+                    self._prefetched.pop(current.pk, None)   # unused if it failed early
+                    processed += 1
+                    current = upcoming
+            finally:
+                # Claimed ahead but never started (shutdown): give it back
+                if current is not None:
+                    self._prefetched.pop(current.pk, None)
+                    self._release_claim(current, status_field)
+        return processed
+
+    def _process_cycle_batched(self, status_field, error_field, limit):
+        """Claim up to --batch recordings, segment them together, then record each result."""
+        recordings = iter(self._eligible_recordings(status_field, limit))
+        processed = 0
+        while self._running:
+            claimed = []
+            for recording in recordings:
+                if not self._running:
+                    break
+                if self._claim_recording(recording, status_field):
+                    claimed.append(recording)
+                    if len(claimed) >= self._batch_size:
+                        break
+            if not claimed:
+                break
+
+            self._segment_batch(claimed)
+            for i, recording in enumerate(claimed):
+                if not self._running:
+                    for pending in claimed[i:]:
+                        self._batched.pop(pending.pk, None)
+                        self._release_claim(pending, status_field)
+                    break
+                self._run_claimed(recording, status_field, error_field)
+                self._batched.pop(recording.pk, None)
+                processed += 1
+        return processed
+
+    def _segment_batch(self, recordings):
+        """Run segment_audio_batch() over the recordings' files; results go to self._batched."""
+        from radios.analysis.segmenter import segment_audio_batch
+
+        paths = {}
+        for recording in recordings:
+            try:
+                file_path = self._recording_file_path(recording)
+            except FileNotFoundError:
+                continue   # reported by _run_claimed()
+            if file_path is not None:
+                paths[recording.pk] = file_path
+        if not paths:
+            return
+
+        logger.info("Segmenting %d recording(s) as one batch...", len(paths))
+        try:
+            results = segment_audio_batch(list(paths.values()))
+        except Exception:
+            logger.exception("Batch segmentation crashed; segmenting one by one.")
+            return
+        self._batched.update(zip(paths, results))
+
+    def _decode(self, recording):
+        """Prefetch thread: decode the recording's audio, or None to decode inline later."""
+        from radios.analysis.segmenter import decode_for_segmentation
+
+        try:
+            file_path = self._recording_file_path(recording)
+            if file_path is None:
+                return None
+            return decode_for_segmentation(file_path)
+        except Exception:
+            logger.debug("[%s] Prefetch decode failed.", recording.id, exc_info=True)
+            return None
+
+    def _take_prefetched(self, recording):
+        future = self._prefetched.pop(recording.pk, None)
+        return future.result() if future is not None else None
+
     def process_one(self, recording, file_path, check_fn):
         from radios.analysis.segmenter import segment_audio
 
         check_fn()
 
+        pcm_samples = self._take_prefetched(recording)
+
         # Session recordings are already segmented inline by StreamProcessor
         if recording.is_session:
             logger.info("[%s] Session recording — already segmented inline.", recording.id)
             return
 
-        logger.info("[%s] Running segmentation...", recording.id)
+        if recording.pk in self._batched:
+            audio_segments = self._batched.pop(recording.pk)
+        else:
+            logger.info("[%s] Running segmentation...", recording.id)
 
-        try:
-            audio_segments = segment_audio(file_path)
-        except Exception:
-            logger.exception("[%s] Segmentation crashed.", recording.id)
-            return
+            try:
+                audio_segments = segment_audio(file_path, pcm_samples=pcm_samples)
+            except Exception:
+                logger.exception("[%s] Segmentation crashed.", recording.id)
+                return
 
         stream = recording.stream
 
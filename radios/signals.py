@@ -1,5 +1,6 @@
 """
-Django signals to keep FTS5 virtual tables in sync with model changes.
+Django signals to keep FTS5 virtual tables in sync with model changes, and
+to drop a deleted segment's fingerprint signature cache.
 
 Registered in RadiosConfig.ready().
 """
@@ -46,6 +47,13 @@ def sync_transcription_fts_on_delete(sender, instance, **kwargs):
     )
 
 
+@receiver(post_delete, sender=TranscriptionSegment)
+def discard_signature_cache_on_delete(sender, instance, **kwargs):
+    from radios.analysis import signatures
+
+    signatures.discard_segment(instance.id)
+
+
 # --- ChunkSummary ---
 
 @receiver(post_save, sender=ChunkSummary)
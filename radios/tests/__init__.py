@@ -28,3 +28,14 @@ def fmt_dur(seconds):
     if m:
         return f"{m}m {s:02d}s"
     return f"{s}s"
+
+
+def fingerprint_result(key):
+    """A Shazam FingerprintResult for song *key* ("Song <key>")."""
+    from radios.analysis.fingerprinter import FingerprintResult
+
+    return FingerprintResult(
+        title=f"Song {key}", artist="Artist", score=1.0, shazam_key=key, genres=["pop"],
+        album_name="Album", release_year=2020, album_cover_url="",
+        estimated_start=0.0, estimated_end=0.0,
+    )
@@ -0,0 +1,222 @@
+"""
+Unit tests for the shared audio codec service (backends faked, no ffmpeg),
+and for the in-process PyAV backend (skipped when PyAV is not installed).
+
+Run with:
+    python manage.py test radios.tests.test_audio_codec
+"""
+
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import django.test
+import numpy as np
+
+
+class _FakeBackend:
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.calls = 0
+
+    def encode_mp3(self, pcm, sample_rate, bitrate):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.name} broken")
+        return self.name.encode()
+
+    def cut(self, src, start, end, out):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.name} broken")
+
+
+class AudioCodecTest(django.test.SimpleTestCase):
+
+    def _codec(self, primary_fails=False, fallback_fails=False):
+        from radios.analysis.audio_codec import AudioCodec
+
+        codec = AudioCodec(backend="ffmpeg", max_concurrency=2)
+        codec._primary = _FakeBackend("pyav", fail=primary_fails)
+        codec._fallback = _FakeBackend("ffmpeg", fail=fallback_fails)
+        return codec
+
+    def test_in_process_backend_preferred(self):
+        codec = self._codec()
+
+        self.assertEqual(codec.encode_mp3(np.zeros(10, dtype=np.int16)), b"pyav")
+        self.assertEqual(codec._fallback.calls, 0)
+
+    def test_failed_call_retried_on_ffmpeg(self):
+        codec = self._codec(primary_fails=True)
+
+        self.assertEqual(codec.encode_mp3(np.zeros(10, dtype=np.int16)), b"ffmpeg")
+        self.assertTrue(codec.cut("in.mp3", 0.0, 1.0, "out.mp3"))
+        self.assertEqual(codec.health()["consecutive_failures"], 2)
+
+    def test_failure_of_both_backends_returns_sentinel(self):
+        codec = self._codec(primary_fails=True, fallback_fails=True)
+
+        self.assertIsNone(codec.encode_mp3(np.zeros(10, dtype=np.int16)))
+        self.assertFalse(codec.cut("in.mp3", 0.0, 1.0, "out.mp3"))
+
+    @patch("radios.analysis.audio_codec.CODEC_MAX_FAILURES", 2)
+    def test_backend_disabled_then_restored_after_health_check(self):
+        codec = self._codec(primary_fails=True)
+        pcm = np.zeros(10, dtype=np.int16)
+        codec.encode_mp3(pcm)
+        codec.encode_mp3(pcm)
+
+        self.assertEqual(codec.backend, "ffmpeg")
+        codec.encode_mp3(pcm)
+        self.assertEqual(codec._primary.calls, 2)   # not tried while disabled
+
+        # Restart interval elapsed and the backend recovered
+        codec._primary.fail = False
+        codec._disabled_until = 1.0
+        self.assertEqual(codec.encode_mp3(pcm), b"pyav")
+        self.assertEqual(codec.health()["consecutive_failures"], 0)
+
+
+class SplitSegmentsTest(django.test.SimpleTestCase):
+    """_save_segments_to_disk cuts every segment from a single split pass."""
+
+    def _segments(self):
+        from radios.analysis.segmenter import AudioSegment
+
+        return [
+            AudioSegment(start=0.0, end=10.0, segment_type="speech"),
+            AudioSegment(start=12.0, end=30.0, segment_type="music"),
+        ]
+
+    def _fake_split(self, src, cuts, out_dir, ext):
+        pieces = []
+        for k in range(len(cuts) + 1):
+            path = os.path.join(out_dir, f".split_{k:04d}{ext}")
+            with open(path, "wb") as f:
+                f.write(b"piece%d" % k)
+            pieces.append(path)
+        return pieces
+
+    def test_pieces_renamed_and_gaps_discarded(self):
+        from radios.analysis import segmenter
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(segmenter.audio_codec, "split", side_effect=self._fake_split) as split, \
+                patch.object(segmenter, "_save_segment") as save_one:
+            updated = segmenter._save_segments_to_disk(self._segments(), "/x/show.mp3", tmp)
+
+            self.assertEqual(split.call_args.args[1], [10.0, 12.0, 30.0])
+            save_one.assert_not_called()
+            with open(updated[0].file_path, "rb") as f:
+                self.assertEqual(f.read(), b"piece0")
+            with open(updated[1].file_path, "rb") as f:
+                self.assertEqual(f.read(), b"piece2")
+            # The 10-12 s gap piece and the tail after 30 s are removed
+            self.assertEqual(sorted(os.listdir(os.path.join(tmp, "show"))),
+                             sorted(os.path.basename(s.file_path) for s in updated))
+
+    def test_falls_back_to_per_segment_cuts(self):
+        from radios.analysis import segmenter
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(segmenter.audio_codec, "split", return_value=None), \
+                patch.object(segmenter, "_save_segment", return_value=True) as save_one:
+            updated = segmenter._save_segments_to_disk(self._segments(), "/x/show.mp3", tmp)
+
+        self.assertEqual(save_one.call_count, 2)
+        self.assertTrue(all(s.file_path for s in updated))
+
+
+    def test_unmatched_piece_list_falls_back(self):
+        from radios.analysis import segmenter
+
+        def short_split(src, cuts, out_dir, ext):
+            pieces = self._fake_split(src, cuts, out_dir, ext)
+            os.unlink(pieces.pop())
+            return pieces
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(segmenter.audio_codec, "split", side_effect=short_split), \
+                patch.object(segmenter, "_save_segment", return_value=True) as save_one:
+            segmenter._save_segments_to_disk(self._segments(), "/x/show.mp3", tmp)
+
+            self.assertEqual(save_one.call_count, 2)
+            self.assertEqual(os.listdir(os.path.join(tmp, "show")), [])   # pieces removed
+
+    def test_ffmpeg_pieces_mapped_by_number(self):
+        from radios.analysis.audio_codec import _FFmpegBackend
+
+        def segment_muxer(cmd, **kwargs):
+            pattern = cmd[-1]
+            for k in (0, 2, 3):   # no file for interval 1
+                with open(pattern.replace("%04d", f"{k:04d}"), "wb") as f:
+                    f.write(b"piece")
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch("subprocess.run", side_effect=segment_muxer):
+            pieces = _FFmpegBackend().split("in.mp3", [10.0, 12.0, 30.0], tmp, ".mp3")
+
+        self.assertEqual([p is not None for p in pieces], [True, False, True, True])
+        self.assertTrue(pieces[2].endswith("0002.mp3"))
+
+
+@unittest.skipUnless(importlib.util.find_spec("av"), "PyAV is not installed")
+class PyAVBackendTest(django.test.SimpleTestCase):
+    """Encode, decode, probe, cut and split in-process on a real MP3."""
+
+    SR = 16000
+
+    def setUp(self):
+        from radios.analysis.audio_codec import _PyAVBackend
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.backend = _PyAVBackend()
+        t = np.arange(3 * self.SR) / self.SR
+        # One tone per second, so each piece can be told apart
+        freqs = np.repeat([300.0, 600.0, 1200.0], self.SR)
+        self.pcm = (np.sin(2 * np.pi * freqs * t) * 12000).astype(np.int16)
+        self.mp3 = os.path.join(self.tmp, "tone.mp3")
+        with open(self.mp3, "wb") as f:
+            f.write(self.backend.encode_mp3(self.pcm, self.SR, "64k"))
+
+    def _dominant_freq(self, pcm):
+        spectrum = np.abs(np.fft.rfft(pcm.astype(np.float64)))
+        return np.fft.rfftfreq(len(pcm), 1.0 / self.SR)[np.argmax(spectrum)]
+
+    def test_encoded_mp3_decodes_back(self):
+        with open(self.mp3, "rb") as f:
+            self.assertIn(f.read(3), (b"ID3", b"\xff\xfb", b"\xff\xf3"))
+        pcm = self.backend.decode_pcm(self.mp3, self.SR, None, None)
+
+        self.assertEqual(pcm.dtype, np.int16)
+        self.assertAlmostEqual(len(pcm) / self.SR, 3.0, delta=0.2)
+        self.assertAlmostEqual(self.backend.probe_duration(self.mp3), 3.0, delta=0.2)
+
+    def test_decode_range(self):
+        pcm = self.backend.decode_pcm(self.mp3, self.SR, 1.2, 1.8)
+
+        self.assertAlmostEqual(len(pcm) / self.SR, 0.6, delta=0.01)
+        self.assertAlmostEqual(self._dominant_freq(pcm), 600.0, delta=20.0)
+
+    def test_cut(self):
+        out = os.path.join(self.tmp, "cut.mp3")
+        self.backend.cut(self.mp3, 2.0, 3.0, out)
+        pcm = self.backend.decode_pcm(out, self.SR, None, None)
+
+        self.assertAlmostEqual(len(pcm) / self.SR, 1.0, delta=0.1)
+        self.assertAlmostEqual(self._dominant_freq(pcm[2000:-2000]), 1200.0, delta=20.0)
+
+    def test_split(self):
+        pieces = self.backend.split(self.mp3, [1.0, 2.0], self.tmp, ".mp3")
+
+        self.assertEqual(len(pieces), 3)
+        for piece, freq in zip(pieces, (300.0, 600.0, 1200.0)):
+            pcm = self.backend.decode_pcm(piece, self.SR, None, None)
+            self.assertAlmostEqual(len(pcm) / self.SR, 1.0, delta=0.1)
+            self.assertAlmostEqual(self._dominant_freq(pcm[2000:-2000]), freq, delta=20.0)
@@ -0,0 +1,211 @@
+"""
+Unit tests for the shared Shazam rate limiter, the concurrent
+FingerprintEngine and fingerprint_recordings' segment concurrency
+(no network, no ffmpeg, no DB).
+
+Run with:
+    python manage.py test radios.tests.test_fingerprint_engine
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import django.test
+from django.test import override_settings
+
+from radios.tests import fingerprint_result
+
+
+class SharedTokenBucketTest(django.test.SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "rate.json")
+
+    def test_burst_then_paced(self):
+        from radios.analysis.rate_limiter import SharedTokenBucket
+
+        bucket = SharedTokenBucket(self.path, rate=2.0, burst=2)
+        waits = [bucket.reserve() for _ in range(4)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.5, places=2)
+        self.assertAlmostEqual(waits[3], 1.0, places=2)
+
+    def test_state_shared_between_instances(self):
+        from radios.analysis.rate_limiter import SharedTokenBucket
+
+        a = SharedTokenBucket(self.path, rate=1.0, burst=1)
+        b = SharedTokenBucket(self.path, rate=1.0, burst=1)
+
+        self.assertEqual(a.reserve(), 0.0)
+        self.assertAlmostEqual(b.reserve(), 1.0, places=2)
+
+    def test_429_halves_rate_and_blocks_everyone(self):
+        from radios.analysis import rate_limiter
+        from radios.analysis.rate_limiter import SharedTokenBucket
+
+        a = SharedTokenBucket(self.path, rate=4.0, burst=4)
+        b = SharedTokenBucket(self.path, rate=4.0, burst=4)
+
+        self.assertEqual(a.on_rate_limited(), rate_limiter.BACKOFF_BASE)
+        self.assertEqual(a.on_rate_limited(retry_after=60), 60.0)
+        state = b.state()
+        self.assertEqual(state["rate"], 1.0)
+        self.assertEqual(state["backoff"], 2 * rate_limiter.BACKOFF_BASE)
+        self.assertGreater(b.reserve(), 59.0)
+
+        b.on_success()
+        self.assertAlmostEqual(a.state()["rate"], 1.0 + 4.0 * rate_limiter.RECOVERY_FRACTION)
+        self.assertEqual(a.state()["backoff"], 0.0)
+
+
+@override_settings(FINGERPRINT_INDEX=False, FINGERPRINT_TRACK_BOUNDARIES=False)
+class FingerprintEngineTest(django.test.SimpleTestCase):
+
+    def setUp(self):
+        self.limiter = MagicMock()
+        self.limiter.reserve.return_value = 0.0
+
+    def _engine(self, concurrency):
+        from radios.analysis.fingerprint_engine import FingerprintEngine
+
+        engine = FingerprintEngine(concurrency, limiter=self.limiter)
+        engine.start()
+        self.addCleanup(engine.stop)
+        return engine
+
+    def test_segments_run_concurrently_up_to_the_limit(self):
+        engine = self._engine(concurrency=3)
+        in_flight = []
+        peak = []
+
+        async def fake(audio, pos, clip_duration, signer=None):
+            in_flight.append(audio.source_path)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.1)
+            in_flight.remove(audio.source_path)
+            return fingerprint_result(audio.source_path)
+
+        with patch.object(engine, "_extract_and_recognize", side_effect=fake):
+            t0 = time.monotonic()
+            futures = [engine.submit(f"seg{i}.mp3", 0.0, 60.0) for i in range(6)]
+            results = [f.result(timeout=5) for f in futures]
+            elapsed = time.monotonic() - t0
+
+        self.assertEqual([[r.shazam_key for r in rs] for rs in results],
+                         [[f"seg{i}.mp3"] for i in range(6)])
+        self.assertEqual(max(peak), 3)
+        self.assertLess(elapsed, 0.5)   # sequential: 0.6s
+
+    def test_sliding_window_matches_sync_path(self):
+        from radios.analysis import fingerprinter
+
+        responses = [fingerprint_result("a"), None, fingerprint_result("b")]
+
+        async def fake(audio, pos, clip_duration, signer=None):
+            return responses.pop(0) if responses else None
+
+        engine = self._engine(concurrency=2)
+        with patch.object(engine, "_extract_and_recognize", side_effect=fake):
+            results = engine.submit("x.mp3", 0.0, 620.0).result(timeout=5)
+
+        self.assertEqual([r.shazam_key for r in results], ["a", "b"])
+        self.assertEqual(results[0].estimated_start, fingerprinter._BOUNDARY_TRIM)
+        self.assertEqual(
+            results[1].estimated_start,
+            fingerprinter._BOUNDARY_TRIM + fingerprinter._DEFAULT_TRACK_DUR + fingerprinter._FAIL_STEP,
+        )
+
+    def test_429_backs_off_then_retries(self):
+        from radios.analysis.rate_limiter import RateLimited
+
+        engine = self._engine(concurrency=1)
+        calls = []
+
+        async def request(audio_path):
+            calls.append(audio_path)
+            if len(calls) == 1:
+                raise RateLimited(retry_after=30)
+            return {"track": {"title": "T", "subtitle": "A", "key": "k"}}
+
+        with patch.object(engine, "_request", side_effect=request):
+            result = asyncio.run_coroutine_threadsafe(
+                engine._recognize("clip.wav"), engine._loop,
+            ).result(timeout=5)
+
+        self.assertEqual(result.shazam_key, "k")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.limiter.reserve.call_count, 2)
+        self.limiter.on_rate_limited.assert_called_once_with(30)
+        self.limiter.on_success.assert_called_once_with()
+
+    def test_stop_cancels_outstanding_work(self):
+        engine = self._engine(concurrency=1)
+        started = threading.Event()
+
+        async def hang(audio, pos, clip_duration, signer=None):
+            started.set()
+            await asyncio.sleep(60)
+
+        with patch.object(engine, "_extract_and_recognize", side_effect=hang):
+            future = engine.submit("x.mp3", 0.0, 60.0)
+            self.assertTrue(started.wait(5))
+            engine.stop()
+
+        self.assertTrue(future.cancelled())
+
+
+class FingerprintCommandConcurrencyTest(django.test.SimpleTestCase):
+
+    def _command(self, concurrency):
+        from radios.management.commands.fingerprint_recordings import Command
+
+        cmd = Command()
+        cmd._running = True
+        cmd._concurrency = concurrency
+        return cmd
+
+    def test_segments_processed_on_threads(self):
+        cmd = self._command(concurrency=4)
+        segments = [SimpleNamespace(pk=i) for i in range(8)]
+        threads = set()
+        barrier = threading.Barrier(4, timeout=5)
+
+        def process(segment, status_field, error_field):
+            threads.add(threading.current_thread().name)
+            if segment.pk < 4:
+                barrier.wait()   # only passes if 4 segments run at once
+
+        with patch.object(cmd, "_eligible_segments", return_value=segments), \
+                patch.object(cmd, "_process_one_segment", side_effect=process):
+            processed = cmd._process_cycle("fingerprinting_status", "fingerprinting_error", 0)
+
+        self.assertEqual(processed, 8)
+        self.assertEqual(len(threads), 4)
+
+    def test_shutdown_cancels_engine_future(self):
+        from radios.management.commands._analysis_base import _ShutdownRequested
+
+        cmd = self._command(concurrency=1)
+        future = MagicMock()
+        future.result.side_effect = concurrent.futures.TimeoutError
+        cmd._engine = MagicMock(submit=MagicMock(return_value=future))
+        checks = []
+
+        def check():
+            checks.append(1)
+            if len(checks) > 2:
+                raise _ShutdownRequested()
+
+        with self.assertRaises(_ShutdownRequested):
+            cmd.process_segment(SimpleNamespace(id=1), "x.mp3", 0.0, 120.0, check)
+
+        future.cancel.assert_called_once_with()
@@ -0,0 +1,141 @@
+"""
+Unit tests for the local landmark-hash fingerprint index (synthetic audio,
+no ffmpeg, no network).
+
+Run with:
+    python manage.py test radios.tests.test_fingerprint_index
+"""
+
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import django.test
+import numpy as np
+
+from radios.tests import fingerprint_result
+
+SR = 16000
+
+
+def _song(seed, duration=90.0):
+    """A reproducible 'song': a sequence of random three-tone notes."""
+    rng = np.random.default_rng(seed)
+    notes, total = [], 0
+    while total < duration * SR:
+        n = int(rng.uniform(0.15, 0.5) * SR)
+        t = np.arange(n) / SR
+        note = sum(np.sin(2 * np.pi * rng.uniform(150, 3500) * t) * rng.uniform(0.2, 1.0)
+                   for _ in range(3))
+        notes.append(note * np.hanning(n))
+        total += n
+    x = np.concatenate(notes)[:int(duration * SR)]
+    return (x / np.abs(x).max() * 12000).astype(np.int16)
+
+
+def _clip(song, start, end, noise=0.0, seed=0):
+    x = song[int(start * SR):int(end * SR)].astype(np.float64) * 0.5
+    if noise:
+        x += np.random.default_rng(seed).normal(0.0, noise * np.std(x), len(x))
+    return x.astype(np.int16)
+
+
+class FingerprintIndexTest(django.test.SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.songs = {key: _song(seed) for seed, key in enumerate("abcdef")}
+
+    def _index(self, path=None):
+        from radios.analysis.fingerprint_index import FingerprintIndex
+
+        index = FingerprintIndex(path)
+        for key, song in self.songs.items():
+            self.assertTrue(index.add(fingerprint_result(key), song[10 * SR:70 * SR], SR))
+        return index
+
+    def test_noisy_excerpt_matches_its_song(self):
+        index = self._index()
+        index.save()
+
+        for key in "adf":
+            result = index.lookup(_clip(self.songs[key], 23.4, 38.4, noise=0.5), SR)
+            self.assertIsNotNone(result, key)
+            self.assertEqual((result.shazam_key, result.source), (key, "local"))
+            self.assertEqual(result.genres, ["pop"])
+
+    def test_unknown_song_does_not_match(self):
+        index = self._index()
+
+        self.assertIsNone(index.lookup(_song(999, duration=15.0), SR))
+        self.assertIsNone(index.lookup(np.zeros(15 * SR, dtype=np.int16), SR))
+
+    def test_unsaved_additions_are_searchable(self):
+        from radios.analysis.fingerprint_index import FingerprintIndex
+
+        index = FingerprintIndex(None)
+        index.add(fingerprint_result("a"), self.songs["a"][10 * SR:70 * SR], SR)
+
+        self.assertEqual(index.lookup(_clip(self.songs["a"], 30, 45), SR).shazam_key, "a")
+
+    def test_refs_per_song_capped(self):
+        from radios.analysis import fingerprint_index
+
+        index = fingerprint_index.FingerprintIndex(None)
+        song = self.songs["b"]
+        added = [index.add(fingerprint_result("b"), song[k * 10 * SR:(k + 1) * 10 * SR], SR) for k in range(5)]
+
+        self.assertEqual(added.count(True), fingerprint_index.MAX_REFS_PER_SONG)
+        self.assertFalse(index.add(fingerprint_result(""), song, SR))
+
+    def test_saved_index_reloaded_and_merged(self):
+        from radios.analysis.fingerprint_index import FingerprintIndex
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index.npz")
+            first = FingerprintIndex(path)
+            second = FingerprintIndex(path)
+            first.add(fingerprint_result("a"), self.songs["a"][10 * SR:70 * SR], SR)
+            first.save()
+            second.add(fingerprint_result("c"), self.songs["c"][10 * SR:70 * SR], SR)
+            second.save()   # merges with first's save instead of overwriting it
+
+            reloaded = FingerprintIndex(path)
+            self.assertEqual(len(reloaded), 2)
+            for key in "ac":
+                self.assertEqual(reloaded.lookup(_clip(self.songs[key], 40, 55), SR).shazam_key, key)
+
+
+class LocalLookupBeforeRemoteTest(django.test.SimpleTestCase):
+
+    def test_local_match_skips_shazam(self):
+        from radios.analysis import fingerprinter
+
+        local = fingerprint_result("a")
+        local.source = "local"
+        audio = SimpleNamespace(clip=lambda pos, duration: np.zeros(10, dtype=np.int16),
+                                sample_rate=SR)
+        with patch.object(fingerprinter.fingerprint_index, "lookup", return_value=local), \
+                patch.object(fingerprinter, "_recognize_sync") as remote:
+            result = fingerprinter._extract_and_recognize(object, audio, 10.0, 15.0)
+
+        self.assertIs(result, local)
+        remote.assert_not_called()
+
+    def test_remote_matches_indexed_after_segment(self):
+        from radios.analysis import fingerprinter
+
+        remote, local = fingerprint_result("a"), fingerprint_result("b")
+        remote.estimated_start, remote.estimated_end = 13.0, 253.0
+        local.source = "local"
+        pcm = np.zeros(10, dtype=np.int16)
+
+        with patch.object(fingerprinter.fingerprint_index, "wants", return_value=True), \
+                patch("radios.analysis.audio_codec.decode_pcm", return_value=pcm) as decode, \
+                patch.object(fingerprinter.fingerprint_index, "remember") as remember:
+            fingerprinter._index_new_songs("/fake.mp3", [remote, local])
+
+        decode.assert_called_once_with("/fake.mp3", fingerprinter._CLIP_SAMPLE_RATE, 13.0, 73.0)
+        remember.assert_called_once_with(remote, pcm, fingerprinter._CLIP_SAMPLE_RATE)
@@ -19,7 +19,8 @@ from pathlib import Path
 from unittest.mock import AsyncMock, patch, MagicMock
 
 import django.test
-from django.test import tag, TestCase
+import numpy as np
+from django.test import override_settings, tag, TestCase
 from django.utils import timezone
 
 from radios.tests import fmt_dur, fmt_time, print_test_db_location
@@ -165,6 +166,7 @@ class FingerprintSingleFileTest(django.test.SimpleTestCase):
             print("Result:   No match (song may not be in the Shazam database)")
 
 
+@override_settings(FINGERPRINT_TRACK_BOUNDARIES=False)
 class SlidingWindowMockTest(django.test.SimpleTestCase):
     """Test sliding window logic with mock Shazam responses."""
 
@@ -233,6 +235,58 @@ class SlidingWindowMockTest(django.test.SimpleTestCase):
         self.assertEqual(len(results), 0)
 
 
+class SegmentAudioTest(django.test.SimpleTestCase):
+    """Window clips are sliced from one forward decode of the segment."""
+
+    SR = 16000
+
+    def _fake_decode(self, calls):
+        def decode(path, sample_rate, start, end):
+            calls.append((start, end))
+            # Sample k of the file has the value k (mod 2**15)
+            return (np.arange(round(start * sample_rate), round(end * sample_rate)) % 32768).astype(np.int16)
+        return decode
+
+    def test_each_sample_decoded_once(self):
+        from radios.analysis import fingerprinter
+
+        calls = []
+        audio = fingerprinter._SegmentAudio("/fake.mp3", 3.0, 997.0)
+        windows = [(3.0, 15.0), (11.0, 15.0), (259.0, 15.0), (295.0, 15.0), (990.0, 7.0)]
+        with patch("radios.analysis.audio_codec.decode_pcm", side_effect=self._fake_decode(calls)), \
+                patch.object(fingerprinter, "_MIN_DURATION", 5.0):
+            clips = [audio.clip(pos, dur) for pos, dur in windows]
+
+        for (pos, dur), clip in zip(windows, clips):
+            expected = np.arange(round(pos * self.SR), round((pos + dur) * self.SR)) % 32768
+            np.testing.assert_array_equal(clip, expected.astype(np.int16))
+        # Forward blocks, no overlap; 603-990s is skipped by the window and never decoded
+        self.assertEqual(calls, [(3.0, 303.0), (303.0, 603.0), (990.0, 997.0)])
+
+    def test_failed_decode_is_a_miss(self):
+        from radios.analysis import fingerprinter
+
+        audio = fingerprinter._SegmentAudio("/fake.mp3", 0.0, 100.0)
+        with patch("radios.analysis.audio_codec.decode_pcm", return_value=None) as decode:
+            self.assertIsNone(audio.clip(3.0, 15.0))
+            self.assertIsNone(audio.clip(11.0, 15.0))
+        decode.assert_called_once()
+
+    @override_settings(FINGERPRINT_INDEX=False, FINGERPRINT_SIGNATURES=False)
+    def test_clip_sent_as_wav_bytes(self):
+        from radios.analysis import fingerprinter
+
+        calls = []
+        audio = fingerprinter._SegmentAudio("/fake.mp3", 0.0, 100.0)
+        with patch("radios.analysis.audio_codec.decode_pcm", side_effect=self._fake_decode(calls)), \
+                patch.object(fingerprinter, "_recognize_sync", return_value=None) as remote:
+            fingerprinter._extract_and_recognize(MagicMock(), audio, 3.0, 15.0)
+
+        wav = remote.call_args[0][1]
+        self.assertEqual(wav[:4], b"RIFF")
+        self.assertEqual(len(wav), 44 + 2 * 15 * self.SR)
+
+
 class FingerprintResultParsingTest(django.test.SimpleTestCase):
     """Test Shazam response parsing in _recognize()."""
 
@@ -0,0 +1,208 @@
+"""
+Unit tests for segment_recordings' prefetch pipeline, batch and worker modes (no DB, no CNN).
+
+Run with:
+    python manage.py test radios.tests.test_segment_recordings
+"""
+
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import django.test
+
+
+class SegmentPipelineTest(django.test.SimpleTestCase):
+
+    def _command(self, recordings, claimable=None):
+        from radios.management.commands.segment_recordings import Command
+
+        cmd = Command()
+        cmd._running = True
+        cmd._prefetched = {}
+        cmd._batch_size = 1
+        self.events = []
+        self.decoded = {}
+        claimable = set(r.pk for r in recordings) if claimable is None else claimable
+
+        def claim(recording, status_field):
+            self.events.append(("claim", recording.pk))
+            return recording.pk in claimable
+
+        def run(recording, status_field, error_field):
+            self.events.append(("run", recording.pk))
+            self.decoded[recording.pk] = cmd._take_prefetched(recording)
+
+        def decode(recording):
+            return f"pcm-{recording.pk}"
+
+        patchers = [
+            patch.object(cmd, "_eligible_recordings", return_value=recordings),
+            patch.object(cmd, "_claim_recording", side_effect=claim),
+            patch.object(cmd, "_run_claimed", side_effect=run),
+            patch.object(cmd, "_decode", side_effect=decode),
+            patch.object(cmd, "_release_claim"),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+        return cmd
+
+    def test_next_recording_claimed_before_current_runs(self):
+        recs = [SimpleNamespace(pk=i) for i in (1, 2, 3)]
+        cmd = self._command(recs)
+
+        self.assertEqual(cmd._process_cycle("segmentation_status", "segmentation_error", 0), 3)
+
+        self.assertEqual(self.events, [
+            ("claim", 1), ("claim", 2), ("run", 1), ("claim", 3), ("run", 2), ("run", 3),
+        ])
+        self.assertEqual(self.decoded, {1: "pcm-1", 2: "pcm-2", 3: "pcm-3"})
+        cmd._release_claim.assert_not_called()
+
+    def test_recordings_claimed_elsewhere_are_skipped(self):
+        recs = [SimpleNamespace(pk=i) for i in (1, 2, 3)]
+        cmd = self._command(recs, claimable={1, 3})
+
+        self.assertEqual(cmd._process_cycle("segmentation_status", "segmentation_error", 0), 2)
+        self.assertEqual([pk for ev, pk in self.events if ev == "run"], [1, 3])
+
+    def test_claimed_ahead_recording_released_on_shutdown(self):
+        recs = [SimpleNamespace(pk=i) for i in (1, 2, 3)]
+        cmd = self._command(recs)
+
+        def run_then_stop(recording, status_field, error_field):
+            self.events.append(("run", recording.pk))
+            cmd._running = False
+
+        cmd._run_claimed.side_effect = run_then_stop
+        cmd._process_cycle("segmentation_status", "segmentation_error", 0)
+
+        self.assertEqual(self.events, [("claim", 1), ("claim", 2), ("run", 1)])
+        cmd._release_claim.assert_called_once_with(recs[1], "segmentation_status")
+        self.assertEqual(cmd._prefetched, {})
+
+
+class SegmentBatchTest(django.test.SimpleTestCase):
+
+    def _command(self, recordings, batch):
+        from radios.management.commands.segment_recordings import Command
+
+        cmd = Command()
+        cmd._running = True
+        cmd._prefetched = {}
+        cmd._batched = {}
+        cmd._batch_size = batch
+        self.batches = []
+        self.segments = {}
+
+        def segment_batch(paths):
+            self.batches.append(paths)
+            return [[f"seg-{p}"] for p in paths]
+
+        def run(recording, status_field, error_field):
+            self.segments[recording.pk] = cmd._batched.get(recording.pk)
+
+        patchers = [
+            patch.object(cmd, "_eligible_recordings", return_value=recordings),
+            patch.object(cmd, "_claim_recording", return_value=True),
+            patch.object(cmd, "_run_claimed", side_effect=run),
+            patch.object(cmd, "_recording_file_path", side_effect=lambda r: r.path),
+            patch.object(cmd, "_release_claim"),
+            patch("radios.analysis.segmenter.segment_audio_batch", side_effect=segment_batch),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+        return cmd
+
+    def test_recordings_segmented_in_batches(self):
+        recs = [SimpleNamespace(pk=i, path=f"/r/{i}.mp3") for i in range(1, 6)]
+        recs[2].path = None   # session: handled by process_one()
+        cmd = self._command(recs, batch=2)
+
+        self.assertEqual(cmd._process_cycle("segmentation_status", "segmentation_error", 0), 5)
+
+        self.assertEqual(self.batches, [["/r/1.mp3", "/r/2.mp3"], ["/r/4.mp3"], ["/r/5.mp3"]])
+        self.assertEqual(self.segments[1], ["seg-/r/1.mp3"])
+        self.assertIsNone(self.segments[3])
+        self.assertEqual(cmd._batched, {})
+
+    def test_unrun_recordings_released_on_shutdown(self):
+        recs = [SimpleNamespace(pk=i, path=f"/r/{i}.mp3") for i in (1, 2, 3)]
+        cmd = self._command(recs, batch=3)
+
+        def run_then_stop(recording, status_field, error_field):
+            cmd._running = False
+
+        cmd._run_claimed.side_effect = run_then_stop
+        self.assertEqual(cmd._process_cycle("segmentation_status", "segmentation_error", 0), 1)
+
+        self.assertEqual([c.args[0].pk for c in cmd._release_claim.call_args_list], [2, 3])
+        self.assertEqual(cmd._batched, {})
+
+
+class SegmentWorkersTest(django.test.SimpleTestCase):
+
+    def test_finished_workers_not_restarted(self):
+        from radios.analysis.sharding import ShardSupervisor
+
+        supervisor = ShardSupervisor(
+            2, lambda i: [sys.executable, "-c", "pass"],
+            restart_delay=0.0, restart_on_success=False,
+        )
+        self.addCleanup(supervisor.stop, timeout=5)
+        supervisor.start()
+        for worker in supervisor._workers:
+            worker.process.wait(timeout=10)
+
+        supervisor.poll()
+
+        self.assertTrue(supervisor.finished)
+        self.assertEqual([w["restarts"] for w in supervisor.status()], [0, 0])
+
+    def test_workers_spawned_with_worker_flag(self):
+        from radios.management.commands.segment_recordings import Command
+
+        cmds = []
+
+        class _FakeSupervisor:
+            finished = True
+
+            def __init__(self, workers, build_cmd, restart_on_success):
+                cmds.extend(build_cmd(i) for i in range(workers))
+                self.restart_on_success = restart_on_success
+
+            def start(self):
+                pass
+
+            def stop(self, timeout):
+                pass
+
+        cmd = Command()
+        with patch("radios.management.commands.segment_recordings.ShardSupervisor", _FakeSupervisor), \
+                patch.object(cmd, "_reset_claims") as reset, \
+                patch("signal.signal"):
+            cmd.handle(once=True, limit=0, retry_failed=False, retry_skipped=False,
+                       workers=3, worker=None, batch=1)
+
+        reset.assert_called_once()
+        self.assertEqual([c[c.index("--worker") + 1] for c in cmds], ["0/3", "1/3", "2/3"])
+        self.assertTrue(all("--once" in c for c in cmds))
+
+    def test_worker_skips_claim_reset(self):
+        from radios.management.commands._analysis_base import AnalysisStageCommand
+        from radios.management.commands.segment_recordings import Command
+
+        cmd = Command()
+        with patch.object(AnalysisStageCommand, "_reset_claims") as reset, \
+                patch.object(cmd, "_process_cycle", return_value=0), \
+                patch.dict("os.environ"), \
+                patch("signal.signal"):
+            cmd.handle(once=True, limit=0, retry_failed=False, retry_skipped=False,
+                       workers=1, worker="1/3", batch=1)
+            reset.assert_not_called()
+
+            cmd.handle(once=True, limit=0, retry_failed=False, retry_skipped=False,
+                       workers=1, worker=None, batch=1)
+            reset.assert_called_once()
@@ -153,3 +153,320 @@ class SegmentationTest(django.test.SimpleTestCase):
             accuracy, 0.70,
             f"Less than 70% of ground-truth segments matched the correct type ({accuracy:.0%})"
         )
+
+
+def _reference_absorb_shortest(segments, min_dur):
+    """The original list-rescan _absorb_shortest, kept as the oracle."""
+    import dataclasses
+    from radios.analysis.segmenter import _merge_adjacent
+
+    segments = _merge_adjacent(segments)
+    while len(segments) > 1:
+        idx = min(range(len(segments)), key=lambda i: segments[i].end - segments[i].start)
+        if (segments[idx].end - segments[idx].start) >= min_dur:
+            break
+        seg = segments[idx]
+        prev = segments[idx - 1] if idx > 0 else None
+        next_seg = segments[idx + 1] if idx + 1 < len(segments) else None
+        if prev and next_seg:
+            if prev.segment_type == next_seg.segment_type:
+                segments[idx - 1] = dataclasses.replace(prev, end=next_seg.end)
+                del segments[idx:idx + 2]
+            elif seg.segment_type == prev.segment_type:
+                segments[idx - 1] = dataclasses.replace(prev, end=seg.end)
+                del segments[idx]
+            elif seg.segment_type == next_seg.segment_type:
+                segments[idx + 1] = dataclasses.replace(next_seg, start=seg.start)
+                del segments[idx]
+            else:
+                if prev.end - prev.start >= next_seg.end - next_seg.start:
+                    segments[idx - 1] = dataclasses.replace(prev, end=seg.end)
+                else:
+                    segments[idx + 1] = dataclasses.replace(next_seg, start=seg.start)
+                del segments[idx]
+        elif prev:
+            segments[idx - 1] = dataclasses.replace(prev, end=seg.end)
+            del segments[idx]
+        elif next_seg:
+            segments[idx + 1] = dataclasses.replace(next_seg, start=seg.start)
+            del segments[idx]
+        else:
+            break
+        segments = _merge_adjacent(segments)
+    return segments
+
+
+class AbsorbShortestTest(django.test.SimpleTestCase):
+    """Heap-based consolidation must reproduce the original merge decisions."""
+
+    def _fragmented(self, seed):
+        """Ground-truth blocks chopped into CNN-like fragments with label flicker."""
+        import random
+        from radios.analysis.segmenter import AudioSegment
+
+        rng = random.Random(seed)
+        types = ["speech", "music", "noise", "noEnergy"]
+        out = []
+        for gt in _load_ground_truth():
+            t = gt["start"]
+            while t < gt["end"]:
+                step = round(rng.choice([0.02, 0.5, 1.0, 2.0, 3.0, 8.0, 20.0]) * rng.random() + 0.02, 2)
+                end = min(t + step, gt["end"])
+                label = gt["type"] if rng.random() < 0.7 else rng.choice(types)
+                out.append(AudioSegment(start=round(t, 2), end=round(end, 2), segment_type=label))
+                t = end
+        return out
+
+    def test_matches_reference_on_fixture(self):
+        from radios.analysis.segmenter import _absorb_shortest
+
+        if not TEST_LABELS.exists():
+            self.skipTest(f"Ground-truth labels not found: {TEST_LABELS}")
+        for seed in range(5):
+            segments = self._fragmented(seed)
+            for min_dur in (2.0, 10.0, 60.0):
+                with self.subTest(seed=seed, min_dur=min_dur):
+                    self.assertEqual(
+                        _absorb_shortest(list(segments), min_dur),
+                        _reference_absorb_shortest(list(segments), min_dur),
+                    )
+
+    def test_equal_durations_absorb_earliest_first(self):
+        from radios.analysis.segmenter import AudioSegment, _absorb_shortest
+
+        segments = [
+            AudioSegment(0.0, 1.0, "speech"),
+            AudioSegment(1.0, 2.0, "music"),
+            AudioSegment(2.0, 3.0, "noise"),
+        ]
+        self.assertEqual(
+            _absorb_shortest(list(segments), 5.0),
+            _reference_absorb_shortest(list(segments), 5.0),
+        )
+
+
+class ChunkedSegmentationTest(django.test.SimpleTestCase):
+    """Chunked classification of long files, CNN and decoder faked."""
+
+    SR = 16000
+
+    def setUp(self):
+        import numpy as np
+
+        # 95 s of noise whose level encodes the "true" label per region
+        rng = np.random.default_rng(0)
+        regions = [(0, 13, 0.05), (13, 41, 0.5), (41, 42, 0.05), (42, 77, 0.5), (77, 95, 0.05)]
+        parts = [rng.standard_normal((b - a) * self.SR) * level for a, b, level in regions]
+        self.pcm = (np.concatenate(parts) * 32767).clip(-32768, 32767).astype(np.int16)
+        self.decoded = []
+
+    def _decode(self, path, sample_rate, start=None, end=None):
+        lo = int(round((start or 0.0) * self.SR))
+        hi = len(self.pcm) if end is None else int(round(end * self.SR))
+        self.decoded.append(min(hi, len(self.pcm)) - lo)
+        return self.pcm[lo:hi]
+
+    @staticmethod
+    def _classify(samples, start_sec=0.0):
+        """Label each 0.5 s by level, merged into runs — a stand-in for the CNN."""
+        import numpy as np
+
+        hop = 8000
+        labels = []
+        for i in range(0, len(samples), hop):
+            level = float(np.sqrt(np.mean(samples[i:i + hop] ** 2)))
+            label = "music" if level > 0.2 else "speech"
+            start, end = start_sec + i / 16000, start_sec + min(i + hop, len(samples)) / 16000
+            if labels and labels[-1][0] == label:
+                labels[-1] = (label, labels[-1][1], end)
+            else:
+                labels.append((label, start, end))
+        return labels
+
+    def test_chunks_stitch_to_whole_file_result(self):
+        import numpy as np
+        from unittest.mock import patch
+        from radios.analysis import segmenter
+
+        with patch.object(segmenter.audio_codec, "decode_pcm", side_effect=self._decode), \
+                patch.object(segmenter, "classify_pcm", side_effect=self._classify):
+            whole, whole_flux, whole_dur = segmenter._classify_whole("x.mp3")
+            self.decoded.clear()
+            chunked, flux, duration = segmenter._classify_chunked("x.mp3", chunk_sec=20.0, context_sec=2.0)
+
+        self.assertEqual(
+            [(s.segment_type, s.start, s.end) for s in chunked],
+            [(s.segment_type, s.start, s.end) for s in whole],
+        )
+        self.assertEqual(duration, whole_dur)
+        # Never more than one chunk (+ context) of PCM decoded at a time
+        self.assertLessEqual(max(self.decoded), 24 * self.SR)
+        # Same flux envelope as the whole file (int16 vs. float32 scale aside)
+        np.testing.assert_allclose(flux / 32768.0, whole_flux, rtol=1e-5, atol=1e-6 * whole_flux.max())
+
+    def test_long_files_take_the_chunked_path(self):
+        from unittest.mock import patch
+        from radios.analysis import segmenter
+
+        with self.settings(SEGMENT_STREAMING_THRESHOLD=60, SEGMENT_SAVE_DIR=None, SEGMENT_CACHE=False), \
+                patch.object(segmenter, "_get_duration", return_value=95.0), \
+                patch.object(segmenter, "_classify_chunked", return_value=None) as chunked, \
+                patch.object(segmenter, "_classify_whole") as whole:
+            self.assertEqual(segmenter.segment_audio("x.mp3"), [])
+
+        chunked.assert_called_once_with("x.mp3")
+        whole.assert_not_called()
+
+    def test_small_files_not_probed(self):
+        from unittest.mock import patch
+        from radios.analysis import segmenter
+
+        with self.settings(SEGMENT_STREAMING_THRESHOLD=60), \
+                patch.object(segmenter, "_get_duration", return_value=95.0) as probe, \
+                patch("os.path.getsize", return_value=60 * segmenter.STREAMING_MIN_BITRATE // 8):
+            self.assertFalse(segmenter._use_chunked("x.mp3"))
+        probe.assert_not_called()
+
+        with self.settings(SEGMENT_STREAMING_THRESHOLD=0), \
+                patch.object(segmenter, "_get_duration") as probe:
+            self.assertFalse(segmenter._use_chunked("x.mp3"))
+        probe.assert_not_called()
+
+
+class BatchSegmentationTest(django.test.SimpleTestCase):
+    """segment_audio_batch(): one CNN call per group of files, decoder and CNN faked."""
+
+    SR = 16000
+
+    def setUp(self):
+        self.durations = {"a.mp3": 30.0, "b.mp3": 50.0, "c.mp3": 0.0, "d.mp3": 40.0}
+
+    def _load(self, path):
+        import numpy as np
+
+        rng = np.random.default_rng(len(path))
+        return rng.standard_normal(int(self.durations[path] * self.SR)).astype(np.float32) * 0.1
+
+    def _classify(self, items):
+        # One label spanning each file: features stand in for the PCM length
+        return [[("music", 0.0, feats)] for feats, _start in items]
+
+    def _run(self, paths, **kwargs):
+        from unittest.mock import patch
+        from radios.analysis import segmenter
+
+        with self.settings(SEGMENT_STREAMING_THRESHOLD=3600, SEGMENT_CACHE=False), \
+                patch.object(segmenter, "_get_duration", side_effect=self.durations.get), \
+                patch.object(segmenter, "_load_pcm", side_effect=self._load), \
+                patch.object(segmenter, "_pcm_features", side_effect=lambda pcm: len(pcm) / self.SR), \
+                patch.object(segmenter, "classify_features_batch", side_effect=self._classify) as cnn:
+            return segmenter.segment_audio_batch(paths, **kwargs), cnn
+
+    def test_one_cnn_call_for_many_files(self):
+        results, cnn = self._run(["a.mp3", "b.mp3", "c.mp3", "d.mp3"])
+
+        cnn.assert_called_once()
+        self.assertEqual(len(cnn.call_args.args[0]), 3)
+        self.assertEqual([[s.end for s in r] for r in results], [[30.0], [50.0], [], [40.0]])
+
+    def test_groups_bounded_by_audio_seconds(self):
+        results, cnn = self._run(["a.mp3", "b.mp3", "d.mp3"], max_batch_seconds=90.0)
+
+        self.assertEqual([len(c.args[0]) for c in cnn.call_args_list], [2, 1])
+        self.assertEqual([len(r) for r in results], [1, 1, 1])
+
+
+class SegmentCacheTest(django.test.SimpleTestCase):
+    """Sidecar cache of the classification: only consolidation and refinement re-run."""
+
+    def setUp(self):
+        import tempfile
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.audio = os.path.join(self.tmp, "show.mp3")
+        with open(self.audio, "wb") as f:
+            f.write(b"mp3 bytes")
+
+    def _result(self):
+        import numpy as np
+        from radios.analysis.segmenter import AudioSegment
+
+        segments = [
+            AudioSegment(0.0, 40.0, "speech", -21.3),
+            AudioSegment(40.0, 41.5, "music", -18.0),
+            AudioSegment(41.5, 120.0, "music", -15.2),
+        ]
+        flux = np.random.default_rng(0).random(480) * 100
+        return segments, flux, 120.0
+
+    def _segment(self, loaded=True, **settings_):
+        from types import SimpleNamespace
+        from unittest.mock import patch
+        from radios.analysis import segmenter
+
+        # The cache key comes from the model: a snapshot, unless *loaded* is False
+        model = SimpleNamespace(meta={"ina_version": "0.7.6", "precision": "float32"}) if loaded else None
+        with self.settings(SEGMENT_SAVE_DIR=None, SEGMENT_CACHE=True, **settings_), \
+                patch.object(segmenter, "_segmenter_instance", model), \
+                patch.object(segmenter, "_get_duration", return_value=120.0), \
+                patch.object(segmenter, "_classify_whole", return_value=self._result()) as classify:
+            return segmenter.segment_audio(self.audio), classify.call_count
+
+    def test_second_run_skips_classification(self):
+        first, calls = self._segment(SEGMENT_CACHE_DIR=None)
+        self.assertEqual(calls, 1)
+        self.assertTrue(os.path.exists(self.audio + ".seg.npz"))
+
+        second, calls = self._segment(SEGMENT_CACHE_DIR=None)
+        self.assertEqual(calls, 0)
+        self.assertEqual(second, first)
+
+    def test_changed_file_or_model_is_classified_again(self):
+        from unittest.mock import patch
+        from radios.analysis import segmenter
+
+        self._segment()
+        with open(self.audio, "ab") as f:
+            f.write(b" edited")
+        self.assertEqual(self._segment()[1], 1)
+
+        with patch.object(segmenter, "_model_version", return_value="ina-0.0.0/int8"):
+            self.assertEqual(self._segment()[1], 1)
+            self.assertEqual(self._segment()[1], 0)
+
+    def test_key_follows_the_loaded_model(self):
+        from types import SimpleNamespace
+        from unittest.mock import patch
+
+        # A float16 variant that cannot be built falls back to float32
+        fallback = SimpleNamespace(meta={"ina_version": "0.7.6", "precision": "float32"})
+        with patch("radios.analysis.segmenter_snapshot.load_snapshot", return_value=fallback) as load:
+            # Each run stands in for a new process that has not loaded the model yet
+            for expected_calls in (1, 0):
+                _segments, calls = self._segment(loaded=False, SEGMENT_MODEL_PRECISION="float16")
+                self.assertEqual(calls, expected_calls)
+        self.assertEqual(load.call_count, 2)
+
+    def test_cache_dir_setting(self):
+        from radios.analysis import segment_cache
+
+        cache_dir = os.path.join(self.tmp, "cache")
+        self._segment(SEGMENT_CACHE_DIR=cache_dir)
+
+        self.assertEqual(os.listdir(cache_dir), [segment_cache.file_digest(self.audio) + ".npz"])
+        self.assertFalse(os.path.exists(self.audio + ".seg.npz"))
+        self.assertEqual(self._segment(SEGMENT_CACHE_DIR=cache_dir)[1], 0)
+
+    def test_discard_removes_entry(self):
+        from radios.analysis import segment_cache
+
+        cache_dir = os.path.join(self.tmp, "cache")
+        self._segment(SEGMENT_CACHE_DIR=None)
+        self._segment(SEGMENT_CACHE_DIR=cache_dir)
+        with self.settings(SEGMENT_CACHE_DIR=cache_dir):
+            segment_cache.discard(self.audio)
+
+        self.assertFalse(os.path.exists(self.audio + ".seg.npz"))
+        self.assertEqual(os.listdir(cache_dir), [])
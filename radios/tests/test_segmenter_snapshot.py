@@ -0,0 +1,204 @@
+"""
+Unit tests for the ONNX segmenter snapshot and its reduced-precision
+variants (onnxruntime session faked).
+
+Run with:
+    python manage.py test radios.tests.test_segmenter_snapshot
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import django.test
+import numpy as np
+from django.conf import settings
+
+META = {
+    "format": 1, "ina_version": "0.8.0", "vad_engine": "smn",
+    "outlabels": ["speech", "music", "noise"], "inlabel": "energy",
+    "nmel": 21, "viterbi_arg": 80, "energy_ratio": 0.03,
+}
+
+
+class _FakeSession:
+    def __init__(self):
+        self.batches = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="patches")]
+
+    def run(self, outputs, feeds):
+        x = feeds["patches"]
+        self.batches.append(len(x))
+        scores = np.zeros((len(x), 3), dtype=np.float32)
+        scores[:, 1] = x.reshape(len(x), -1)[:, 0]
+        return [scores]
+
+
+class SnapshotSegmenterTest(django.test.SimpleTestCase):
+
+    def test_predict_runs_in_batches(self):
+        from radios.analysis.segmenter_snapshot import SnapshotSegmenter
+
+        session = _FakeSession()
+        seg = SnapshotSegmenter(session, META)
+        patches = np.arange(10, dtype=np.float32).reshape(10, 1, 1, 1)
+
+        scores = seg.vad.nn.predict(patches, batch_size=4, verbose=0)
+
+        self.assertEqual(session.batches, [4, 4, 2])
+        np.testing.assert_array_equal(scores[:, 1], np.arange(10))
+        self.assertEqual(seg.vad.nn.predict(patches[:0]).shape, (0, 3))
+        self.assertEqual((seg.vad.outlabels, seg.vad.nmel, seg.energy_ratio),
+                         (("speech", "music", "noise"), 21, 0.03))
+
+    def test_missing_snapshot(self):
+        from radios.analysis.segmenter_snapshot import load_snapshot
+
+        self.assertIsNone(load_snapshot(None))
+        self.assertIsNone(load_snapshot("/nonexistent/ina_smn.onnx"))
+
+    def test_get_segmenter_prefers_snapshot(self):
+        from radios.analysis import segmenter
+
+        snapshot = object()
+        with patch.object(segmenter, "_segmenter_instance", None), \
+                patch("radios.analysis.segmenter_snapshot.load_snapshot", return_value=snapshot) as load:
+            self.assertIs(segmenter._get_segmenter(), snapshot)
+            self.assertIs(segmenter._get_segmenter(), snapshot)
+
+        load.assert_called_once_with(settings.SEGMENTER_SNAPSHOT_PATH, settings.SEGMENT_MODEL_PRECISION)
+
+    def test_ina_submodule_loaded_without_package_init(self):
+        from radios.analysis import segmenter_snapshot
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pkg = os.path.join(tmp, "inaSpeechSegmenter")
+            os.mkdir(pkg)
+            with open(os.path.join(pkg, "__init__.py"), "w") as f:
+                f.write("raise ImportError('package init imports tensorflow')\n")
+            with open(os.path.join(pkg, "viterbi_utils.py"), "w") as f:
+                f.write("VALUE = 42\n")
+
+            with patch.object(sys, "path", [tmp] + sys.path), \
+                    patch.dict(sys.modules), \
+                    patch.object(segmenter_snapshot, "_ina_modules", {}):
+                sys.modules.pop("inaSpeechSegmenter", None)
+                module = segmenter_snapshot.ina_module("viterbi_utils")
+
+                self.assertEqual(module.VALUE, 42)
+                self.assertNotIn("inaSpeechSegmenter", sys.modules)
+                self.assertIs(segmenter_snapshot.ina_module("viterbi_utils"), module)
+
+
+class ReducedPrecisionTest(django.test.SimpleTestCase):
+
+    def _fake_onnxruntime(self, loaded):
+        class _Session(_FakeSession):
+            def __init__(self, path, sess_options=None, providers=None):
+                super().__init__()
+                loaded.append(path)
+                self.meta = dict(META, precision="int8" if ".int8." in path else "float32")
+
+            def get_modelmeta(self):
+                import json
+                return SimpleNamespace(custom_metadata_map={"ina_vad": json.dumps(self.meta)})
+
+        return SimpleNamespace(SessionOptions=SimpleNamespace, InferenceSession=_Session)
+
+    def test_variant_built_once_then_loaded(self):
+        from radios.analysis import segmenter_snapshot
+
+        loaded = []
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.dict(sys.modules, onnxruntime=self._fake_onnxruntime(loaded)), \
+                patch.object(segmenter_snapshot, "quantize_snapshot") as quantize:
+            base = os.path.join(tmp, "ina_smn.onnx")
+            open(base, "wb").close()
+            quantize.side_effect = lambda src, dst, precision: open(dst, "wb").close()
+
+            seg = segmenter_snapshot.load_snapshot(base, "int8")
+            segmenter_snapshot.load_snapshot(base, "int8")
+
+        quantize.assert_called_once_with(base, os.path.join(tmp, "ina_smn.int8.onnx"), "int8")
+        self.assertEqual(seg.meta["precision"], "int8")
+        self.assertEqual(loaded, [os.path.join(tmp, "ina_smn.int8.onnx")] * 2)
+
+    def test_failed_quantization_falls_back_to_float32(self):
+        from radios.analysis import segmenter_snapshot
+
+        loaded = []
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.dict(sys.modules, onnxruntime=self._fake_onnxruntime(loaded)), \
+                patch.object(segmenter_snapshot, "quantize_snapshot", side_effect=ImportError("onnx")):
+            base = os.path.join(tmp, "ina_smn.onnx")
+            open(base, "wb").close()
+            seg = segmenter_snapshot.load_snapshot(base, "float16")
+
+        self.assertEqual(loaded, [base])
+        self.assertEqual(seg.meta["precision"], "float32")
+
+    def test_unknown_precision_rejected(self):
+        from radios.analysis.segmenter_snapshot import snapshot_path
+
+        self.assertEqual(snapshot_path("/m/ina_smn.onnx", "float16"), "/m/ina_smn.float16.onnx")
+        with self.assertRaises(ValueError):
+            snapshot_path("/m/ina_smn.onnx", "int4")
+
+    def test_precision_report_measures_drift_against_float32(self):
+        from radios.analysis import segmenter as seg_mod
+        from radios.analysis import tune
+        from radios.analysis.segmenter import AudioSegment
+
+        models = {p: SimpleNamespace(meta={"precision": p}) for p in ("float32", "int8")}
+        labeled = [{"file": "a.mp3", "segments": [
+            {"start": 0.0, "end": 60.0, "type": "speech"},
+            {"start": 60.0, "end": 120.0, "type": "music"},
+        ]}]
+
+        def segment(path):
+            # A warm segmentation cache would skip the CNN under test
+            self.assertFalse(settings.SEGMENT_CACHE)
+            # int8 moves the boundary by 1.5 s
+            cut = 61.0 if seg_mod._segmenter_instance is models["float32"] else 62.5
+            return [AudioSegment(0.0, cut, "speech"), AudioSegment(cut, 120.0, "music")]
+
+        with patch("radios.analysis.segmenter_snapshot.load_snapshot",
+                   side_effect=lambda path, precision: models.get(precision)), \
+                patch.object(tune, "segment_audio", side_effect=segment), \
+                patch("builtins.print"):
+            rows = tune.compare_precisions(labeled, ["int8", "float16"])
+
+        self.assertEqual([r[0] for r in rows], ["float32", "int8"])
+        self.assertEqual(rows[0][1]["mean"], 1.0)
+        self.assertEqual(rows[1][1]["mean"], 2.5)
+        self.assertEqual(rows[1][2], [1.5])
+        self.assertIsNone(seg_mod._segmenter_instance)
+
+
+class NoTensorFlowImportTest(django.test.SimpleTestCase):
+
+    def test_management_commands_do_not_import_tensorflow(self):
+        code = (
+            "import sys, django; django.setup()\n"
+            "from django.core.management import get_commands, load_command_class\n"
+            "for name, app in get_commands().items():\n"
+            "    if app == 'radios':\n"
+            "        try:\n"
+            "            load_command_class(app, name)\n"
+            "        except ImportError:\n"
+            "            pass  # optional dependency missing here\n"
+            "import radios.analysis.segmenter, radios.analysis.stream_processor\n"
+            "print(sorted(m for m in sys.modules if m.split('.')[0] in ('tensorflow', 'keras')))\n"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE="aum.settings")
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(out.returncode, 0, out.stderr)
+        self.assertEqual(out.stdout.strip().splitlines()[-1], "[]")
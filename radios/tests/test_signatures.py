@@ -0,0 +1,237 @@
+"""
+Unit tests for locally computed Shazam signatures: batching along the
+sliding window, the per-segment signature cache and sending signatures
+instead of audio (no shazamio, no ffmpeg, no network).
+
+Run with:
+    python manage.py test radios.tests.test_signatures
+"""
+
+import asyncio
+import os
+import tempfile
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import django.test
+import numpy as np
+from django.test import override_settings
+
+SR = 16000
+
+
+def _sig(n):
+    from radios.analysis.signatures import Signature
+
+    return Signature(uri=f"data:audio/vnd.shazam.sig;base64,{n}", samplems=10000)
+
+
+def _fake_decode(calls):
+    def decode(path, sample_rate, start, end):
+        calls.append((start, end))
+        return np.zeros(round((end - start) * sample_rate), dtype=np.int16)
+    return decode
+
+
+class SignatureCacheTest(django.test.SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.source = os.path.join(tmp.name, "segment.mp3")
+        with open(self.source, "wb") as f:
+            f.write(b"audio")
+
+    def test_saved_signatures_reloaded(self):
+        from radios.analysis.signatures import SignatureCache
+
+        cache = SignatureCache(self.dir, 42, self.source)
+        cache.put(11.0, 15.0, _sig(1))
+        cache.save()
+
+        reloaded = SignatureCache(self.dir, 42, self.source)
+        self.assertEqual(reloaded.get(11.0, 15.0), _sig(1))
+        self.assertIsNone(reloaded.get(11.0, 12.0))   # other duration
+        self.assertIsNone(reloaded.get(19.0, 15.0))
+        self.assertEqual(len(SignatureCache(self.dir, 43, self.source)), 0)
+
+    def test_changed_source_invalidates(self):
+        from radios.analysis.signatures import SignatureCache
+
+        cache = SignatureCache(self.dir, 42, self.source)
+        cache.put(3.0, 15.0, _sig(1))
+        cache.save()
+        with open(self.source, "ab") as f:
+            f.write(b"more audio")
+
+        self.assertEqual(len(SignatureCache(self.dir, 42, self.source)), 0)
+
+    def test_discard_removes_file(self):
+        from radios.analysis.signatures import SignatureCache
+
+        cache = SignatureCache(self.dir, 42, self.source)
+        cache.put(3.0, 15.0, _sig(1))
+        cache.save()
+        cache.discard()
+
+        self.assertFalse(os.path.exists(cache.path))
+
+    def test_deleted_segment_drops_its_file(self):
+        from radios.analysis.signatures import SignatureCache
+        from radios.models import TranscriptionSegment
+        from radios.signals import discard_signature_cache_on_delete
+
+        cache = SignatureCache(self.dir, 42, self.source)
+        cache.put(3.0, 15.0, _sig(1))
+        cache.save()
+        with override_settings(FINGERPRINT_SIGNATURE_CACHE_DIR=self.dir):
+            discard_signature_cache_on_delete(TranscriptionSegment, TranscriptionSegment(id=42))
+
+        self.assertFalse(os.path.exists(cache.path))
+
+    @override_settings(FINGERPRINT_SIGNATURE_CACHE_DIR=None)
+    def test_no_cache_without_directory(self):
+        from radios.analysis import signatures
+
+        self.assertIsNone(signatures.get_cache(42, self.source))
+
+    def test_signature_request_shape(self):
+        request = _sig(7).request()
+
+        self.assertEqual(request.signature.uri, _sig(7).uri)
+        self.assertEqual(request.signature.samples, 10000)
+        self.assertIsInstance(request.timestamp, int)
+
+
+class SignTest(django.test.SimpleTestCase):
+
+    def test_sign_inside_running_loop(self):
+        from radios.analysis import signatures
+
+        recognizer = MagicMock()
+        recognizer.recognize_bytes = AsyncMock(return_value=MagicMock(
+            signature=MagicMock(uri=_sig(1).uri, samples=10000),
+        ))
+
+        async def caller():
+            return signatures.sign([np.zeros(SR, dtype=np.int16)], SR)
+
+        with patch.object(signatures, "_get_recognizer", return_value=recognizer):
+            self.assertEqual(asyncio.run(caller()), [_sig(1)])
+            self.assertEqual(signatures.sign([np.zeros(SR, dtype=np.int16)], SR), [_sig(1)])
+
+
+class WindowSignerTest(django.test.SimpleTestCase):
+
+    def _signer(self, cache=None):
+        from radios.analysis import fingerprinter
+
+        audio = fingerprinter._SegmentAudio("/fake.mp3", 3.0, 617.0)
+        window = fingerprinter._SlidingWindow(0.0, 620.0)
+        return audio, fingerprinter._WindowSigner(audio, window, cache)
+
+    def test_next_misses_signed_in_one_batch(self):
+        from radios.analysis import fingerprinter
+
+        audio, signer = self._signer()
+        signed = []
+
+        def sign(clips, sample_rate):
+            signed.append([len(c) for c in clips])
+            return [_sig(len(signed) * 10 + k) for k in range(len(clips))]
+
+        with patch("radios.analysis.audio_codec.decode_pcm", side_effect=_fake_decode([])), \
+                patch.object(fingerprinter.signatures, "sign", side_effect=sign):
+            sigs = []
+            for k in range(fingerprinter._SIGNATURE_BATCH + 1):
+                pos = 3.0 + k * fingerprinter._FAIL_STEP
+                sigs.append(signer.signature_sync(pos, 15.0, audio.clip(pos, 15.0)))
+
+        self.assertEqual(signed, [[15 * SR] * fingerprinter._SIGNATURE_BATCH, [15 * SR] * 4])
+        self.assertEqual(sigs, [_sig(10), _sig(11), _sig(12), _sig(13), _sig(20)])
+
+    def test_lookahead_stops_at_undecoded_audio(self):
+        from radios.analysis import fingerprinter
+
+        audio, signer = self._signer()
+        with patch("radios.analysis.audio_codec.decode_pcm", side_effect=_fake_decode([])):
+            audio.clip(3.0, 15.0)           # first decode block: 3-303s
+            pcm = audio.clip(290.0, 10.0)
+            jobs = signer.batch(290.0, 10.0, pcm)
+
+        self.assertEqual([pos for pos, _d, _pcm in jobs], [290.0])
+
+    def test_cached_windows_not_signed_again(self):
+        from radios.analysis import fingerprinter
+
+        cache = MagicMock()
+        cache.get.side_effect = lambda pos, duration: _sig(int(pos))
+        audio, signer = self._signer(cache)
+        with patch.object(fingerprinter.signatures, "sign") as sign:
+            sig = signer.signature_sync(3.0, 15.0, np.zeros(15 * SR, dtype=np.int16))
+
+        self.assertEqual(sig, _sig(3))
+        sign.assert_not_called()
+
+    def test_cache_dropped_once_songs_found(self):
+        cache = MagicMock()
+        _audio, signer = self._signer(cache)
+
+        signer.finish([])
+        cache.save.assert_called_once_with()
+        signer.finish([object()])
+        cache.discard.assert_called_once_with()
+
+
+@override_settings(FINGERPRINT_INDEX=False)
+class SignatureSentInsteadOfAudioTest(django.test.SimpleTestCase):
+
+    def _audio(self):
+        from radios.analysis import fingerprinter
+
+        return fingerprinter._SegmentAudio("/fake.mp3", 0.0, 100.0)
+
+    def test_signature_sent(self):
+        from radios.analysis import fingerprinter
+
+        audio = self._audio()
+        signer = fingerprinter._WindowSigner(audio, fingerprinter._SlidingWindow(0.0, 103.0))
+
+        def sign(clips, sample_rate):
+            return [_sig(1)] * len(clips)
+
+        with patch("radios.analysis.audio_codec.decode_pcm", side_effect=_fake_decode([])), \
+                patch.object(fingerprinter.signatures, "sign", side_effect=sign), \
+                patch.object(fingerprinter, "_recognize_sync", return_value=None) as remote:
+            fingerprinter._extract_and_recognize(MagicMock(), audio, 3.0, 15.0, signer)
+
+        self.assertEqual(remote.call_args[0][1], _sig(1))
+
+    def test_failed_signing_falls_back_to_upload(self):
+        from radios.analysis import fingerprinter
+
+        audio = self._audio()
+        signer = fingerprinter._WindowSigner(audio, fingerprinter._SlidingWindow(0.0, 103.0))
+
+        def sign(clips, sample_rate):
+            return [None] * len(clips)
+
+        with patch("radios.analysis.audio_codec.decode_pcm", side_effect=_fake_decode([])), \
+                patch.object(fingerprinter.signatures, "sign", side_effect=sign), \
+                patch.object(fingerprinter, "_recognize_sync", return_value=None) as remote:
+            fingerprinter._extract_and_recognize(MagicMock(), audio, 3.0, 15.0, signer)
+
+        self.assertEqual(remote.call_args[0][1][:4], b"RIFF")
+
+    def test_engine_posts_signature(self):
+        from radios.analysis.fingerprint_engine import FingerprintEngine
+
+        engine = FingerprintEngine(1)
+        shazam = MagicMock()
+        shazam.send_recognize_request_v2 = AsyncMock(return_value={"track": {}})
+        with patch.object(engine, "_get_shazam", AsyncMock(return_value=shazam)):
+            asyncio.run(engine._request(_sig(1)))
+
+        request = shazam.send_recognize_request_v2.call_args[0][0]
+        self.assertEqual(request.signature.uri, _sig(1).uri)
+        shazam.recognize.assert_not_called()
@@ -0,0 +1,126 @@
+"""
+Spectral flux: batched implementation vs. the original frame-by-frame loop.
+
+Run with:
+    python manage.py test radios.tests.test_spectral_flux
+
+The micro-benchmark (a full 20-minute chunk) is tagged slow:
+    python manage.py test radios.tests.test_spectral_flux --tag=slow
+"""
+
+import time
+
+import django.test
+import numpy as np
+from django.test import tag
+
+from radios.analysis.segmenter import (
+    FLUX_HOP_SEC,
+    FLUX_SMOOTH_SEC,
+    FLUX_WIN_SEC,
+    SAMPLE_RATE,
+    IncrementalSpectralFlux,
+    _refine_boundary,
+    _spectral_flux,
+)
+
+CHUNK_SECONDS = 20 * 60
+
+
+def _reference_flux(samples):
+    """The original one-rfft-per-frame implementation."""
+    hop_n = int(FLUX_HOP_SEC * SAMPLE_RATE)
+    win_n = int(FLUX_WIN_SEC * SAMPLE_RATE)
+    n_frames = max(0, (len(samples) - win_n) // hop_n + 1)
+    if n_frames < 2:
+        return np.zeros(0)
+
+    flux = np.zeros(n_frames)
+    prev_mag = None
+    for f in range(n_frames):
+        lo = f * hop_n
+        mag = np.abs(np.fft.rfft(samples[lo:lo + win_n]))
+        if prev_mag is not None:
+            flux[f] = np.sum(np.maximum(mag - prev_mag, 0.0))
+        prev_mag = mag
+
+    smooth_frames = max(1, int(FLUX_SMOOTH_SEC / FLUX_HOP_SEC))
+    kernel = np.ones(smooth_frames, dtype=np.float32) / smooth_frames
+    return np.convolve(flux, kernel, mode="same")
+
+
+def _pcm(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(int(seconds * SAMPLE_RATE)) * 3000).astype(np.int16)
+
+
+class SpectralFluxTest(django.test.SimpleTestCase):
+
+    def test_identical_to_frame_loop(self):
+        # Odd length: spans several FFT blocks plus a partial one
+        samples = _pcm(47.3)
+        np.testing.assert_array_equal(_spectral_flux(samples), _reference_flux(samples))
+
+    def test_float32_close_to_float64(self):
+        samples = _pcm(30)
+        ref = _reference_flux(samples)
+        fast = _spectral_flux(samples, dtype=np.float32)
+        np.testing.assert_allclose(fast, ref, rtol=1e-4, atol=1e-3 * ref.max())
+
+    def test_too_short(self):
+        self.assertEqual(len(_spectral_flux(_pcm(0.6))), 0)
+
+    def test_incremental_matches_whole_signal(self):
+        samples = _pcm(120, seed=1)
+        flux = _spectral_flux(samples)
+        inc = IncrementalSpectralFlux()
+        rng = np.random.default_rng(2)
+        pos = 0
+        while pos < len(samples):
+            pos = min(len(samples), pos + int(rng.integers(1_000, 40_000)))
+            inc.update(pos, lambda lo, hi: samples[lo:hi])
+
+        for boundary in (20.0, 61.3, 100.0):
+            lo, hi = boundary - 10.0, boundary + 10.0
+            self.assertEqual(inc.refine(boundary, lo, hi), _refine_boundary(flux, boundary, lo, hi))
+
+    def test_incremental_forgets_old_frames(self):
+        samples = _pcm(60)
+        inc = IncrementalSpectralFlux(history=10.0)
+        inc.update(len(samples), lambda lo, hi: samples[lo:hi])
+
+        self.assertIsNone(inc.refine(5.0, 1.0, 9.0))
+        self.assertIsNotNone(inc.refine(55.0, 52.0, 58.0))
+
+    def test_incremental_restarts_after_lost_audio(self):
+        inc = IncrementalSpectralFlux()
+        inc.update(10 * SAMPLE_RATE, lambda lo, hi: None)
+        self.assertIsNone(inc.refine(5.0, 1.0, 9.0))
+
+        samples = _pcm(30)
+        inc.update(len(samples), lambda lo, hi: samples[lo:hi])
+        self.assertIsNotNone(inc.refine(20.0, 12.0, 28.0))
+
+    @tag("slow")
+    def test_benchmark_full_chunk(self):
+        samples = _pcm(CHUNK_SECONDS)
+
+        def best_of(fn, runs=3):
+            best = float("inf")
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - t0)
+            return best
+
+        t_ref = best_of(lambda: _reference_flux(samples), runs=1)
+        t_64 = best_of(lambda: _spectral_flux(samples))
+        t_32 = best_of(lambda: _spectral_flux(samples, dtype=np.float32))
+
+        print(
+            f"\n  spectral flux, {CHUNK_SECONDS // 60} min chunk:"
+            f"\n    frame loop      {t_ref * 1000:8.1f} ms"
+            f"\n    batched float64 {t_64 * 1000:8.1f} ms  ({t_ref / t_64:.1f}x)"
+            f"\n    batched float32 {t_32 * 1000:8.1f} ms  ({t_ref / t_32:.1f}x)"
+        )
+        self.assertLess(t_64, t_ref)
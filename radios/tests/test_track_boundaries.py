@@ -0,0 +1,250 @@
+"""
+Unit tests for track-boundary prediction in music segments and the
+one-window-per-predicted-track walk built on it (synthetic audio, no
+ffmpeg, no network).
+
+Run with:
+    python manage.py test radios.tests.test_track_boundaries
+"""
+
+from unittest.mock import patch
+
+import django.test
+import numpy as np
+from django.test import override_settings
+
+from radios.tests import fingerprint_result
+
+SR = 8000
+
+
+def _song(seed, duration):
+    """A reproducible 'song': a 4-chord loop in its own key, register, timbre and tempo."""
+    rng = np.random.default_rng(seed)
+    scale = (rng.integers(0, 12) + np.array([0, 2, 4, 5, 7, 9, 11])) % 12
+    harmonics = rng.uniform(0.1, 1.0, 6) * np.array([1, 0.7, 0.5, 0.35, 0.25, 0.15])
+    beat = 60.0 / rng.uniform(80, 150)
+    progression = [scale[rng.choice(7, 3, replace=False)] for _ in range(4)]
+    octave = rng.integers(3, 5)
+    hit = rng.uniform(0.05, 0.9)
+
+    n_bar = int(4 * beat * SR)
+    t = np.arange(n_bar) / SR
+    envelope = 0.5 + 0.5 * np.exp(-3 * (t % beat) / beat)
+    bars = []
+    for chord in progression:
+        bar = sum(
+            a * np.sin(2 * np.pi * 440 * 2 ** ((pc - 9) / 12 + octave - 4) * (h + 1) * t)
+            for pc in chord for h, a in enumerate(harmonics)
+        ) * envelope
+        bar += hit * rng.normal(0, 1, n_bar) * np.exp(-30 * (t % beat))
+        bars.append(bar)
+    n = int(duration * SR)
+    x = np.tile(np.concatenate(bars), n // (4 * n_bar) + 1)[:n]
+    return x / np.abs(x).max()
+
+
+def _mix(durations, seed=0, crossfade=3.0):
+    """Songs back to back with crossfades; returns (int16 pcm, true boundaries)."""
+    out, boundaries = _song(seed, durations[0]), []
+    for k, duration in enumerate(durations[1:], 1):
+        song = _song(seed + k, duration)
+        n = int(crossfade * SR)
+        ramp = np.linspace(0, 1, n)
+        boundaries.append(len(out) / SR - crossfade / 2)
+        out = np.concatenate([out[:-n], out[-n:] * (1 - ramp) + song[:n] * ramp, song[n:]])
+    out += np.random.default_rng(99).normal(0, 0.02, len(out))
+    return (out / np.abs(out).max() * 12000).astype(np.int16), boundaries
+
+
+class TrackBoundariesTest(django.test.SimpleTestCase):
+
+    def test_song_changes_found(self):
+        from radios.analysis.track_boundaries import boundaries_from_pcm
+
+        pcm, truth = _mix([230, 140, 80, 320, 220, 270])
+        found = boundaries_from_pcm(pcm, SR)
+
+        self.assertEqual(len(found), len(truth))
+        for got, expected in zip(found, truth):
+            self.assertAlmostEqual(got, expected, delta=3.0)
+
+    def test_single_song_not_split(self):
+        from radios.analysis.track_boundaries import boundaries_from_pcm
+
+        pcm, _ = _mix([600], seed=77)
+        self.assertEqual(boundaries_from_pcm(pcm, SR), [])
+
+    def test_segment_read_in_blocks(self):
+        from radios.analysis import track_boundaries
+
+        pcm, truth = _mix([230, 140, 80, 320, 220, 270])
+        cuts = [0, int(299.7 * SR), int(600.2 * SR), int(901.1 * SR), len(pcm)]
+        blocks = (pcm[a:b] for a, b in zip(cuts, cuts[1:]))
+        found = track_boundaries.find_track_boundaries(blocks, SR, 1000.0)
+
+        self.assertEqual(found, [1000.0 + t for t in track_boundaries.boundaries_from_pcm(pcm, SR)])
+        self.assertEqual(len(found), len(truth))
+
+    def test_undecodable_or_short_segment(self):
+        from radios.analysis import track_boundaries
+
+        self.assertIsNone(track_boundaries.find_track_boundaries(iter([]), SR, 0.0))
+        short = np.zeros(100 * SR, dtype=np.int16)
+        self.assertEqual(track_boundaries.find_track_boundaries(iter([short]), SR, 0.0), [])
+
+    @override_settings(FINGERPRINT_INDEX=True)
+    def test_segment_decoded_once(self):
+        from radios.analysis import fingerprinter
+
+        pcm, truth = _mix([230, 140, 80, 320, 220, 270])
+        pcm = np.repeat(pcm, fingerprinter._CLIP_SAMPLE_RATE // SR)   # 16 kHz, like the windows
+        sr = fingerprinter._CLIP_SAMPLE_RATE
+        calls = []
+
+        def decode(path, sample_rate, start, end):
+            calls.append((start, end))
+            return pcm[int(round((start - 1000.0) * sr)):int(round((end - 1000.0) * sr))]
+
+        with patch("radios.analysis.audio_codec.decode_pcm", side_effect=decode), \
+                patch.object(fingerprinter.fingerprint_index, "wants", return_value=True), \
+                patch.object(fingerprinter.fingerprint_index, "remember") as remember:
+            audio, window = fingerprinter._plan_windows("/fake.mp3", 997.0, 2203.0)
+            self.assertEqual(calls, [(1000.0, 1300.0), (1300.0, 1600.0), (1600.0, 1900.0),
+                                     (1900.0, 2200.0)])
+            while (step := window.next_window()) is not None:
+                self.assertIsNotNone(audio.clip(*step))
+                window.record(fingerprint_result(str(len(window.results))))
+            fingerprinter._index_new_songs("/fake.mp3", window.results, audio)
+
+        self.assertEqual(len(calls), 4)   # windows and index clips sliced from the scan
+        self.assertEqual(len(window.tracks), len(truth) + 1)
+        self.assertEqual(remember.call_count, len(truth) + 1)
+
+
+class TrackWindowsTest(django.test.SimpleTestCase):
+
+    def _walk(self, window, recognize):
+        requests = []
+        while (step := window.next_window()) is not None:
+            requests.append(step)
+            window.record(recognize(*step))
+        return requests
+
+    def test_one_window_per_track_when_matched(self):
+        from radios.analysis import fingerprinter
+
+        window = fingerprinter._TrackWindows(0.0, 700.0, [200.0, 290.0, 500.0])
+        requests = self._walk(window, lambda pos, dur: fingerprint_result(str(int(pos // 100))))
+
+        self.assertEqual(len(requests), 4)
+        self.assertEqual(
+            [(r.estimated_start, r.estimated_end) for r in window.results],
+            [(3.0, 200.0), (200.0, 290.0), (290.0, 500.0), (500.0, 697.0)],
+        )
+        self.assertEqual(requests[0], (3.0 + fingerprinter._PROBE_OFFSET, fingerprinter._WINDOW))
+
+    def test_missed_track_probed_again_then_skipped(self):
+        from radios.analysis import fingerprinter
+
+        window = fingerprinter._TrackWindows(0.0, 403.0, [200.0])
+        requests = self._walk(window, lambda pos, dur: fingerprint_result("b") if pos > 200 else None)
+
+        self.assertEqual(len(requests), fingerprinter._PROBES_PER_TRACK + 1)
+        self.assertTrue(all(3.0 <= pos and pos + dur <= 200.0 for pos, dur in requests[:-1]))
+        self.assertEqual([r.shazam_key for r in window.results], ["b"])
+
+    def test_song_indexed_from_the_matching_window(self):
+        from radios.analysis import fingerprinter
+
+        window = fingerprinter._TrackWindows(0.0, 406.0, [])
+        requests = self._walk(window, lambda pos, dur: fingerprint_result("a") if pos > 100 else None)
+        matched_pos = requests[1][0]
+        self.assertGreater(matched_pos, 100.0)
+        self.assertEqual(window.results[0].estimated_start, 3.0)
+
+        with patch.object(fingerprinter.fingerprint_index, "enabled", return_value=True), \
+                patch.object(fingerprinter.fingerprint_index, "wants", return_value=True), \
+                patch.object(fingerprinter.fingerprint_index, "remember"), \
+                patch("radios.analysis.audio_codec.decode_pcm", return_value=None) as decode:
+            fingerprinter._index_new_songs("/fake.mp3", window.results)
+            window.results[0].matched_at = 380.0   # near the end: clamped to the track
+            fingerprinter._index_new_songs("/fake.mp3", window.results)
+
+        span = fingerprinter.fingerprint_index.INDEX_SPAN
+        self.assertEqual(decode.call_args_list[0][0][2:], (matched_pos, matched_pos + span))
+        self.assertEqual(decode.call_args_list[1][0][2:], (403.0 - span, 403.0))
+
+    def test_boundary_inside_a_song_merged(self):
+        from radios.analysis import fingerprinter
+
+        window = fingerprinter._TrackWindows(0.0, 603.0, [200.0, 400.0])
+        self._walk(window, lambda pos, dur: fingerprint_result("a" if pos < 400 else "c"))
+
+        self.assertEqual(
+            [(r.shazam_key, r.estimated_start, r.estimated_end) for r in window.results],
+            [("a", 3.0, 400.0), ("c", 400.0, 600.0)],
+        )
+
+    def test_retries_never_starve_later_tracks(self):
+        from radios.analysis import fingerprinter
+
+        boundaries = [100.0 + 80.0 * k for k in range(29)]   # 30 tracks
+        window = fingerprinter._TrackWindows(0.0, 2500.0, boundaries)
+        requests = self._walk(window, lambda pos, dur: None)
+
+        probed_tracks = {int((pos - 20.0) // 80.0) for pos, _dur in requests}
+        self.assertEqual(len(requests), 30)
+        self.assertEqual(len(probed_tracks), 30)
+
+    def test_long_track_split(self):
+        from radios.analysis import fingerprinter
+
+        window = fingerprinter._TrackWindows(0.0, 1006.0, [])
+        self.assertEqual(len(window.tracks), 5)   # 1000s without a boundary
+
+    def test_mixtape_fewer_requests_better_recall(self):
+        from radios.analysis import fingerprinter
+
+        durations = [100.0, 300.0, 90.0, 150.0, 260.0, 95.0, 200.0]
+        edges = np.cumsum([0.0] + durations)
+
+        def recognize(pos, dur):
+            track = int(np.searchsorted(edges, pos + dur / 2) - 1)
+            return None if track == 1 else fingerprint_result(str(track))   # track 1 is unknown to Shazam
+
+        tracks = fingerprinter._TrackWindows(0.0, edges[-1], list(edges[1:-1]))
+        sliding = fingerprinter._SlidingWindow(0.0, edges[-1])
+        track_requests = self._walk(tracks, recognize)
+        sliding_requests = self._walk(sliding, recognize)
+
+        self.assertEqual(len(tracks.results), len(durations) - 1)
+        self.assertEqual(len(track_requests), len(durations) - 1 + fingerprinter._PROBES_PER_TRACK)
+        # The fixed walk spends its whole attempt budget stepping through track 1
+        self.assertEqual(len(sliding_requests), fingerprinter._MAX_ATTEMPTS)
+        self.assertEqual(len(sliding.results), 1)
+
+    def test_upcoming_follows_the_plan(self):
+        from radios.analysis import fingerprinter
+
+        window = fingerprinter._TrackWindows(0.0, 403.0, [200.0])
+        first = window.next_window()
+        upcoming = window.upcoming(first[0], 4)
+
+        self.assertEqual(upcoming, (fingerprinter._track_probes(3.0, 200.0)[1:]
+                                    + fingerprinter._track_probes(200.0, 400.0))[:4])
+
+    def test_plan_falls_back_to_sliding_window(self):
+        from radios.analysis import fingerprinter
+
+        with patch("radios.analysis.audio_codec.decode_pcm", return_value=None):
+            _audio, plan = fingerprinter._plan_windows("/fake.mp3", 0.0, 600.0)
+        self.assertIsInstance(plan, fingerprinter._SlidingWindow)
+        with override_settings(FINGERPRINT_TRACK_BOUNDARIES=False):
+            _audio, plan = fingerprinter._plan_windows("/fake.mp3", 0.0, 600.0)
+        self.assertIsInstance(plan, fingerprinter._SlidingWindow)
+        with patch.object(fingerprinter.track_boundaries, "find_track_boundaries",
+                          return_value=[300.0]):
+            audio, plan = fingerprinter._plan_windows("/fake.mp3", 0.0, 600.0)
+        self.assertEqual(plan.tracks, [(3.0, 300.0), (300.0, 597.0)])
+        self.assertEqual((audio.start, audio.sample_rate), (3.0, fingerprinter._CLIP_SAMPLE_RATE))
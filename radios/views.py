@@ -447,6 +447,9 @@ def recording_delete(request, slug, recording_id):
         file_path = recording.file.path if recording.file else None
         recording.delete()  # cascades to segments, summaries, etc.
         if file_path and os.path.isfile(file_path):
+            from radios.analysis import segment_cache
+
+            segment_cache.discard(file_path)
             os.remove(file_path)
         messages.success(request, "Recording deleted.")
         return redirect("radio_recordings", slug=slug)